@@ -0,0 +1,149 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+import braintree
+from mock import patch
+
+from silver_braintree.models import BraintreePaymentMethod
+
+
+class FakeDetails(object):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeTransaction(object):
+    """
+    Carries the attributes of a braintreeSDK Transaction which are read by the payment
+    processors.
+    """
+
+    def __init__(self, id, amount, status=braintree.Transaction.Status.Settled, order_id=None,
+                 token='kento', customer_id='braintree-customer'):
+        self.id = id
+        self.amount = amount
+        self.status = status
+        self.order_id = order_id
+        self.created_at = datetime.utcnow()
+        self.processor_response_code = '1000'
+        self.payment_instrument_type = BraintreePaymentMethod.Types.CreditCard
+
+        self.credit_card_details = FakeDetails(image_url='image_url', card_type='Visa',
+                                               last_4='1234', token=token)
+        self.paypal_details = FakeDetails(image_url=None, payer_email=None, token=None)
+        self.customer_details = FakeDetails(id=customer_id)
+
+
+class FakeResult(object):
+    def __init__(self, transaction):
+        self.is_success = True
+        self.transaction = transaction
+        self.errors = None
+        self.message = None
+        self.credit_card_verification = None
+
+
+class FakeSearchResult(object):
+    def __init__(self, transactions):
+        self._transactions = transactions
+
+    @property
+    def ids(self):
+        return [transaction.id for transaction in self._transactions]
+
+    @property
+    def items(self):
+        return iter(self._transactions)
+
+
+class FakeGateway(object):
+    """
+    An in-memory stand-in for the Braintree API, answering the braintreeSDK calls made by the
+    payment processors without any network or serialization work, so that benchmarks measure
+    the processors' own overhead.
+    """
+
+    def __init__(self):
+        self.transactions = {}
+        self.calls = 0
+
+        self._ids = itertools.count(1)
+
+    def add_transaction(self, amount, **kwargs):
+        transaction = FakeTransaction('bt-{}'.format(next(self._ids)), amount, **kwargs)
+        self.transactions[transaction.id] = transaction
+
+        return transaction
+
+    def sale(self, payload):
+        self.calls += 1
+
+        return FakeResult(self.add_transaction(payload['amount'],
+                                               order_id=payload.get('order_id')))
+
+    def find(self, braintree_id):
+        self.calls += 1
+
+        try:
+            return self.transactions[braintree_id]
+        except KeyError:
+            raise braintree.exceptions.NotFoundError()
+
+    def search(self, *nodes):
+        self.calls += 1
+
+        transactions = list(self.transactions.values())
+        for node in nodes:
+            if node.name == 'ids':
+                ids = set(node.dict)
+                transactions = [transaction for transaction in transactions
+                                if transaction.id in ids]
+            elif node.name == 'order_id':
+                transactions = [transaction for transaction in transactions
+                                if transaction.order_id == node.dict['is']]
+
+        return FakeSearchResult(transactions)
+
+    def fetch(self, query, braintree_ids):
+        self.calls += 1
+
+        return [self.transactions[braintree_id] for braintree_id in braintree_ids
+                if braintree_id in self.transactions]
+
+    def generate_client_token(self, params=None):
+        self.calls += 1
+
+        return 'client-token-{}'.format(self.calls)
+
+    @contextmanager
+    def patched(self):
+        """
+        Replaces the braintreeSDK calls with the fake gateway's within the block.
+        """
+        with ExitStack() as stack:
+            stack.enter_context(patch.multiple(
+                'braintree.transaction_gateway.TransactionGateway',
+                sale=self.sale, find=self.find, search=self.search,
+                _TransactionGateway__fetch=self.fetch
+            ))
+            stack.enter_context(patch(
+                'braintree.client_token_gateway.ClientTokenGateway.generate',
+                self.generate_client_token
+            ))
+
+            yield self
@@ -0,0 +1,653 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A local stand-in for the Braintree gateway, speaking enough of its XML API for the payment
+processors to be load tested without the Braintree sandbox:
+
+    python -m benchmarks.simulator --port 3000 --latency lognormal:0.05,0.5 \
+        --server-error-rate 0.01 --decline-rate 0.05 --rate-limit 1000
+
+Supported calls: transaction sale, find and search, client token generation, customer and
+payment method creation. Unknown customers and payment method tokens are accepted as if they
+were vaulted, so that existing Silver data can be charged as is.
+
+Like the Braintree sandbox, sales of amounts between 2000.00 and 2999.99 are processor
+declined, with the amount's integer part as the processor response code.
+"""
+
+import argparse
+import itertools
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from base64 import b64encode
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import braintree
+from braintree.util.xml_util import XmlUtil
+
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+SEARCH_PAGE_SIZE = 50
+
+
+def fixed_latency(seconds):
+    return lambda rng: seconds
+
+
+def uniform_latency(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(median, sigma):
+    """
+    A long tailed latency distribution: half the requests are faster than the median.
+    """
+    if median <= 0:
+        return fixed_latency(0)
+
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+LATENCY_DISTRIBUTIONS = {
+    'fixed': fixed_latency,
+    'uniform': uniform_latency,
+    'lognormal': lognormal_latency,
+}
+
+
+def parse_latency(spec):
+    """
+    :param spec: A latency distribution and its parameters, in seconds, e.g. `fixed:0.1`,
+                 `uniform:0.05,0.2` or `lognormal:0.1,0.5`.
+    :return: A callable receiving a random.Random and returning a latency.
+    """
+    name, _, parameters = spec.partition(':')
+
+    try:
+        distribution = LATENCY_DISTRIBUTIONS[name]
+        return distribution(*[float(parameter) for parameter in parameters.split(',')])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Invalid latency distribution: {}'.format(spec))
+
+
+class RateLimiter(object):
+    """
+    A token bucket allowing `rate` requests per second, with bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            if self._tokens < 1:
+                return False
+
+            self._tokens -= 1
+            return True
+
+
+class NotFound(Exception):
+    pass
+
+
+class SimulatedGateway(object):
+    """
+    The in-memory state of the simulator: the transactions, customers and vaulted payment
+    methods, along with the handling of the gateway calls. The handlers receive the parsed XML
+    request and return the status and the body of the response.
+    """
+
+    def __init__(self, decline_rate=0, decline_codes=(2000, ), settlement_delay=None, rng=None):
+        self.decline_rate = decline_rate
+        self.decline_codes = list(decline_codes)
+        self.settlement_delay = settlement_delay
+        self.rng = rng or random.Random()
+
+        self.transactions = {}
+        self.customers = {}
+        self.payment_methods = {}
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _next_id(self, prefix):
+        return '{}{:07x}'.format(prefix, next(self._ids))
+
+    def _get_customer(self, customer_id=None, details=None):
+        with self._lock:
+            if customer_id is None:
+                customer_id = self._next_id('c')
+
+            customer = self.customers.get(customer_id)
+            if customer is None:
+                details = details or {}
+                customer = {
+                    'id': customer_id,
+                    'first_name': details.get('first_name') or None,
+                    'last_name': details.get('last_name') or None,
+                }
+                self.customers[customer_id] = customer
+
+            return customer
+
+    def _get_payment_method(self, token=None, nonce=None, customer_id=None, vault=True):
+        """
+        :return: The payment method of a token, or the one described by a nonce; nonces
+                 containing `paypal` describe PayPal accounts, the others credit cards.
+        """
+        with self._lock:
+            payment_method = self.payment_methods.get(token)
+            if payment_method is not None:
+                return payment_method
+
+            if nonce and 'paypal' in nonce:
+                payment_method = {
+                    'type': braintree.PaymentInstrumentType.PayPalAccount,
+                    'token': None,
+                    'payer_email': 'payer@example.com',
+                    'image_url': 'https://assets.braintreegateway.com/payment_method_logo/'
+                                 'paypal.png',
+                }
+            else:
+                payment_method = {
+                    'type': braintree.PaymentInstrumentType.CreditCard,
+                    'token': None,
+                    'bin': '411111',
+                    'last_4': '1111',
+                    'card_type': 'Visa',
+                    'expiration_month': '12',
+                    'expiration_year': str(datetime.utcnow().year + 5),
+                    'expired': False,
+                    'image_url': 'https://assets.braintreegateway.com/payment_method_logo/'
+                                 'visa.png',
+                }
+
+            payment_method['customer_id'] = customer_id
+
+            if vault:
+                payment_method['token'] = token or self._next_id('t')
+                self.payment_methods[payment_method['token']] = payment_method
+
+            return payment_method
+
+    def _serialize_payment_method(self, payment_method):
+        return {
+            key: value for key, value in payment_method.items() if key != 'type'
+        }
+
+    def _serialize_transaction(self, transaction):
+        self._settle(transaction)
+
+        payment_method = transaction['payment_method']
+        serialized = {
+            key: value for key, value in transaction.items()
+            if key not in ('payment_method', 'customer', 'amount')
+        }
+        serialized.update({
+            'amount': str(transaction['amount']),
+            'payment_instrument_type': payment_method['type'],
+            'customer': transaction['customer'],
+        })
+
+        if payment_method['type'] == braintree.PaymentInstrumentType.PayPalAccount:
+            serialized['paypal'] = self._serialize_payment_method(payment_method)
+        else:
+            serialized['credit_card'] = self._serialize_payment_method(payment_method)
+
+        return serialized
+
+    def _settle(self, transaction):
+        if (self.settlement_delay is not None and
+                transaction['status'] == braintree.Transaction.Status.SubmittedForSettlement and
+                datetime.utcnow() - transaction['created_at'] >=
+                timedelta(seconds=self.settlement_delay)):
+            transaction['status'] = braintree.Transaction.Status.Settled
+            transaction['updated_at'] = datetime.utcnow()
+
+    def _get_decline_code(self, amount):
+        if Decimal(2000) <= amount < Decimal(3000):
+            return int(amount)
+
+        if self.decline_rate and self.rng.random() < self.decline_rate:
+            return self.rng.choice(self.decline_codes)
+
+    def sale(self, request):
+        params = request.get('transaction') or {}
+        options = params.get('options') or {}
+
+        try:
+            amount = Decimal(params.get('amount'))
+        except (InvalidOperation, TypeError):
+            return 422, {'api_error_response': {
+                'message': 'Amount is an invalid format.',
+                'errors': {'transaction': {'errors': [{
+                    'attribute': 'amount', 'code': '81503',
+                    'message': 'Amount is an invalid format.'
+                }]}},
+            }}
+
+        customer = self._get_customer(params.get('customer_id') or None,
+                                      params.get('customer'))
+        payment_method = self._get_payment_method(
+            token=params.get('payment_method_token') or None,
+            nonce=params.get('payment_method_nonce'),
+            customer_id=customer['id'],
+            vault=bool(params.get('payment_method_token') or options.get('store_in_vault'))
+        )
+
+        now = datetime.utcnow()
+        transaction = {
+            'id': self._next_id(''),
+            'type': 'sale',
+            'amount': amount,
+            'currency_iso_code': 'USD',
+            'order_id': params.get('order_id') or None,
+            'created_at': now,
+            'updated_at': now,
+            'customer': customer,
+            'payment_method': payment_method,
+        }
+
+        decline_code = self._get_decline_code(amount)
+        if decline_code:
+            transaction.update({
+                'status': braintree.Transaction.Status.ProcessorDeclined,
+                'processor_response_code': str(decline_code),
+                'processor_response_text': 'Declined',
+            })
+        else:
+            transaction.update({
+                'status': (braintree.Transaction.Status.SubmittedForSettlement
+                           if options.get('submit_for_settlement')
+                           else braintree.Transaction.Status.Authorized),
+                'processor_response_code': '1000',
+                'processor_response_text': 'Approved',
+            })
+
+        with self._lock:
+            self.transactions[transaction['id']] = transaction
+
+        if decline_code:
+            return 422, {'api_error_response': {
+                'message': 'Declined',
+                'errors': {'errors': []},
+                'transaction': self._serialize_transaction(transaction),
+            }}
+
+        return 201, {'transaction': self._serialize_transaction(transaction)}
+
+    def find(self, transaction_id):
+        transaction = self.transactions.get(transaction_id)
+        if transaction is None:
+            raise NotFound()
+
+        return 200, {'transaction': self._serialize_transaction(transaction)}
+
+    # transaction search criteria, and the values they are matched against
+    SEARCH_FIELDS = {
+        'ids': lambda transaction: transaction['id'],
+        'order_id': lambda transaction: transaction['order_id'],
+        'amount': lambda transaction: transaction['amount'],
+        'created_at': lambda transaction: transaction['created_at'],
+        'status': lambda transaction: transaction['status'],
+        'customer_id': lambda transaction: transaction['customer']['id'],
+        'payment_method_token': lambda transaction: transaction['payment_method']['token'],
+    }
+
+    def _matches(self, value, condition):
+        if isinstance(condition, list):
+            return value in condition
+
+        if not isinstance(condition, dict):
+            return value == condition
+
+        if isinstance(value, Decimal):
+            condition = {operator: Decimal(operand) for operator, operand in condition.items()}
+
+        for operator, operand in condition.items():
+            if operator == 'is' and value != operand:
+                return False
+            elif operator == 'is_not' and value == operand:
+                return False
+            elif operator == 'min' and (value is None or value < operand):
+                return False
+            elif operator == 'max' and (value is None or value > operand):
+                return False
+            elif operator == 'starts_with' and not (value or '').startswith(operand):
+                return False
+            elif operator == 'ends_with' and not (value or '').endswith(operand):
+                return False
+            elif operator == 'contains' and operand not in (value or ''):
+                return False
+
+        return True
+
+    def _search(self, criteria):
+        """
+        Criteria which aren't in SEARCH_FIELDS are ignored.
+        """
+        if isinstance(criteria.get('ids'), list):
+            transactions = [self.transactions[transaction_id] for transaction_id in criteria['ids']
+                            if transaction_id in self.transactions]
+        else:
+            transactions = list(self.transactions.values())
+
+        criteria = [
+            (self.SEARCH_FIELDS[name], condition) for name, condition in criteria.items()
+            if name in self.SEARCH_FIELDS
+        ]
+
+        for transaction in transactions:
+            self._settle(transaction)
+
+        return [
+            transaction for transaction in transactions
+            if all(self._matches(get_value(transaction), condition)
+                   for get_value, condition in criteria)
+        ]
+
+    def search_ids(self, request):
+        transactions = self._search(request.get('search') or {})
+
+        return 200, {'search_results': {
+            'page_size': SEARCH_PAGE_SIZE,
+            'ids': [transaction['id'] for transaction in transactions],
+        }}
+
+    def search(self, request):
+        transactions = self._search(request.get('search') or {})
+
+        # the SDK expects repeated <transaction> elements, which XmlUtil can't generate
+        return 200, (
+            '<credit-card-transactions type="collection">' +
+            ''.join(XmlUtil.xml_from_dict({
+                'transaction': self._serialize_transaction(transaction)
+            }) for transaction in transactions) +
+            '</credit-card-transactions>'
+        )
+
+    def generate_client_token(self, request):
+        params = request.get('client_token') or {}
+
+        token = b64encode('{{"version":2,"customerId":"{}","authorizationFingerprint":"{}"}}'
+                          .format(params.get('customer_id') or '', uuid.uuid4().hex)
+                          .encode('utf-8'))
+
+        return 201, {'client_token': {'value': token.decode('ascii')}}
+
+    def create_customer(self, request):
+        params = request.get('customer') or {}
+
+        customer = self._get_customer(params.get('id') or None, params)
+        response = dict(customer, credit_cards=[], paypal_accounts=[])
+
+        nonce = params.get('payment_method_nonce')
+        if nonce:
+            payment_method = self._get_payment_method(nonce=nonce, customer_id=customer['id'])
+            key = ('paypal_accounts'
+                   if payment_method['type'] == braintree.PaymentInstrumentType.PayPalAccount
+                   else 'credit_cards')
+            response[key].append(self._serialize_payment_method(payment_method))
+
+        return 201, {'customer': response}
+
+    def create_payment_method(self, request):
+        params = request.get('payment_method') or {}
+
+        customer = self._get_customer(params.get('customer_id') or None)
+        payment_method = self._get_payment_method(
+            token=params.get('token') or None, nonce=params.get('payment_method_nonce'),
+            customer_id=customer['id']
+        )
+
+        key = ('paypal_account'
+               if payment_method['type'] == braintree.PaymentInstrumentType.PayPalAccount
+               else 'credit_card')
+
+        return 201, {key: self._serialize_payment_method(payment_method)}
+
+
+class SimulatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are buffered and sent together, without Nagle's delay
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    # (method, path pattern, SimulatedGateway handler name)
+    routes = [
+        ('POST', re.compile(r'^/merchants/[^/]+/transactions$'), 'sale'),
+        ('GET', re.compile(r'^/merchants/[^/]+/transactions/(?P<transaction_id>[^/]+)$'),
+         'find'),
+        ('POST', re.compile(r'^/merchants/[^/]+/transactions/advanced_search_ids$'),
+         'search_ids'),
+        ('POST', re.compile(r'^/merchants/[^/]+/transactions/advanced_search$'), 'search'),
+        ('POST', re.compile(r'^/merchants/[^/]+/client_token$'), 'generate_client_token'),
+        ('POST', re.compile(r'^/merchants/[^/]+/customers$'), 'create_customer'),
+        ('POST', re.compile(r'^/merchants/[^/]+/payment_methods$'), 'create_payment_method'),
+    ]
+
+    def _respond(self, status, body=None):
+        if isinstance(body, dict):
+            body = XmlUtil.xml_from_dict(body)
+        body = (XML_HEADER + body).encode('utf-8') if body else b''
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        simulator = self.server.simulator
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        for route_method, pattern, handler_name in self.routes:
+            match = pattern.match(self.path.split('?')[0])
+            if route_method == method and match:
+                break
+        else:
+            return self._respond(404)
+
+        status = simulator.inject(handler_name)
+        if status:
+            return self._respond(status)
+
+        gateway = simulator.gateway
+        try:
+            if match.groupdict():
+                status, response = getattr(gateway, handler_name)(**match.groupdict())
+            else:
+                request = XmlUtil.dict_from_xml(body) if body.strip() else {}
+                status, response = getattr(gateway, handler_name)(request)
+        except NotFound:
+            return self._respond(404)
+
+        simulator.count(handler_name, status)
+        self._respond(status, response)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def log_message(self, *args):
+        pass
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class GatewaySimulator(object):
+    """
+    Serves a SimulatedGateway over HTTP, on a background thread.
+
+        with GatewaySimulator(latency=lognormal_latency(0.05, 0.5)) as simulator:
+            gateway = simulator.get_gateway()
+
+    :param latency: A callable receiving a random.Random and returning the seconds each
+                    request is delayed by; see parse_latency.
+    :param server_error_rate: The share of requests failing with a ServerError (HTTP 500).
+    :param maintenance_rate: The share of requests failing with a DownForMaintenanceError
+                             (HTTP 503).
+    :param decline_rate: The share of sales which are processor declined, with one of the
+                         decline_codes.
+    :param rate_limit: The requests per second served before failing with a
+                       TooManyRequestsError (HTTP 429).
+    :param settlement_delay: Seconds after which submitted transactions become settled; they
+                             are never settled if None.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, server_error_rate=0,
+                 maintenance_rate=0, decline_rate=0, decline_codes=(2000, ), rate_limit=None,
+                 rate_limit_burst=None, settlement_delay=None, seed=None):
+        self.rng = random.Random(seed)
+
+        self.latency = latency
+        self.server_error_rate = server_error_rate
+        self.maintenance_rate = maintenance_rate
+        self.rate_limiter = RateLimiter(rate_limit, rate_limit_burst) if rate_limit else None
+
+        self.gateway = SimulatedGateway(decline_rate, decline_codes, settlement_delay, self.rng)
+
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+        self.server = SimulatorServer((host, port), SimulatorRequestHandler)
+        self.server.simulator = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def environment(self):
+        return braintree.Environment('simulator', self.server.server_address[0],
+                                     str(self.port), 'http://127.0.0.1', False, None)
+
+    def get_gateway(self, **kwargs):
+        """
+        :param kwargs: Extra braintree.Configuration options, e.g. http_strategy.
+        :return: A braintree.BraintreeGateway sending its requests to the simulator.
+        """
+        return braintree.BraintreeGateway(braintree.Configuration(
+            self.environment, 'merchant-id', 'public-key', 'private-key', **kwargs
+        ))
+
+    def count(self, call, outcome):
+        with self._stats_lock:
+            key = '{}:{}'.format(call, outcome)
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def inject(self, call):
+        """
+        Applies the latency, the rate limit and the errors configured for the requests.
+
+        :return: The HTTP status of the injected failure, if any.
+        """
+        if self.latency:
+            time.sleep(max(self.latency(self.rng), 0))
+
+        if self.rate_limiter and not self.rate_limiter.acquire():
+            status = 429
+        elif self.server_error_rate and self.rng.random() < self.server_error_rate:
+            status = 500
+        elif self.maintenance_rate and self.rng.random() < self.maintenance_rate:
+            status = 503
+        else:
+            return None
+
+        self.count(call, status)
+        return status
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name='braintree-simulator', daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Simulates the Braintree gateway locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--latency', type=parse_latency, default=None,
+                        help='e.g. fixed:0.1, uniform:0.05,0.2 or lognormal:0.1,0.5')
+    parser.add_argument('--server-error-rate', type=float, default=0)
+    parser.add_argument('--maintenance-rate', type=float, default=0)
+    parser.add_argument('--decline-rate', type=float, default=0)
+    parser.add_argument('--decline-codes', default='2000',
+                        type=lambda codes: [int(code) for code in codes.split(',')])
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='requests per second')
+    parser.add_argument('--rate-limit-burst', type=float, default=None)
+    parser.add_argument('--settlement-delay', type=float, default=None,
+                        help='seconds after which submitted transactions are settled')
+    parser.add_argument('--seed', type=int, default=None)
+    options = parser.parse_args(args)
+
+    simulator = GatewaySimulator(
+        options.host, options.port, latency=options.latency,
+        server_error_rate=options.server_error_rate, maintenance_rate=options.maintenance_rate,
+        decline_rate=options.decline_rate, decline_codes=options.decline_codes,
+        rate_limit=options.rate_limit, rate_limit_burst=options.rate_limit_burst,
+        settlement_delay=options.settlement_delay, seed=options.seed
+    )
+
+    print('Simulating the Braintree gateway on http://{}:{}'.format(options.host,
+                                                                    simulator.port))
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
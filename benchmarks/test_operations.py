@@ -0,0 +1,200 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tracemalloc
+from datetime import datetime
+
+import pytest
+
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.models import CustomerData, count_decryptions
+from tests.factories import (BraintreePaymentMethodFactory,
+                             BraintreeRecurringPaymentMethodFactory,
+                             BraintreeTransactionFactory)
+
+
+pytest.importorskip('pytest_benchmark')
+
+ROUNDS = 50
+
+# transactions updated by each fetch_transactions_status call
+SWEEP_SIZE = 100
+
+
+def profile(operation, *args):
+    """
+    Calls the operation once, returning the queries it made, the payment method decryptions, the
+    peak memory it allocated and the memory it retained, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries, count_decryptions() as decryptions:
+            operation(*args)
+
+        retained, allocated = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'queries': len(queries.captured_queries),
+        'decryptions': decryptions.count,
+        'allocated_bytes': allocated,
+        'retained_bytes': retained,
+    }
+
+
+def run_benchmark(benchmark, operation, setup, rounds=ROUNDS):
+    """
+    :param operation: The measured callable.
+    :param setup: A callable returning the operation's arguments. It's called before every
+                  round and isn't measured.
+    """
+    benchmark.extra_info.update(profile(operation, *setup()))
+
+    return benchmark.pedantic(operation, setup=lambda: (setup(), {}), rounds=rounds)
+
+
+def reload(transaction):
+    # a fresh instance, with nothing memoized, like the ones a billing run works with
+    return Transaction.objects.select_related('payment_method').get(pk=transaction.pk)
+
+
+def create_vaulted_payment_method():
+    payment_method = BraintreeRecurringPaymentMethodFactory.create(verified=True)
+    payment_method.token = 'kento'
+    payment_method.save()
+
+    CustomerData.objects.create(customer=payment_method.customer,
+                                data={'id': 'braintree-customer'})
+
+    return payment_method
+
+
+@pytest.mark.django_db
+def test_execute_transaction(benchmark, gateway):
+    payment_method = create_vaulted_payment_method()
+    payment_processor = get_instance(payment_method.payment_processor)
+
+    def setup():
+        return reload(BraintreeTransactionFactory.create(payment_method=payment_method,
+                                                         state=Transaction.States.Pending)),
+
+    assert run_benchmark(benchmark, payment_processor.execute_transaction, setup)
+
+
+@pytest.mark.django_db
+def test_fetch_transaction_status(benchmark, gateway):
+    payment_method = create_vaulted_payment_method()
+    payment_processor = get_instance(payment_method.payment_processor)
+
+    def setup():
+        result_transaction = gateway.add_transaction(100)
+
+        return reload(BraintreeTransactionFactory.create(
+            payment_method=payment_method, state=Transaction.States.Pending,
+            external_reference=result_transaction.id,
+            data={'braintree_id': result_transaction.id}
+        )),
+
+    assert run_benchmark(benchmark, payment_processor.fetch_transaction_status, setup)
+
+
+@pytest.mark.django_db
+def test_fetch_transactions_status(benchmark, gateway):
+    payment_method = create_vaulted_payment_method()
+    payment_processor = get_instance(payment_method.payment_processor)
+
+    def setup():
+        transaction_ids = []
+        for _ in range(SWEEP_SIZE):
+            result_transaction = gateway.add_transaction(100)
+            transaction_ids.append(BraintreeTransactionFactory.create(
+                payment_method=payment_method, state=Transaction.States.Pending,
+                external_reference=result_transaction.id,
+                data={'braintree_id': result_transaction.id}
+            ).pk)
+
+        return Transaction.objects.filter(pk__in=transaction_ids),
+
+    benchmark.extra_info['transactions'] = SWEEP_SIZE
+    outcomes = run_benchmark(benchmark, payment_processor.fetch_transactions_status, setup,
+                             rounds=ROUNDS // 10)
+
+    assert all(outcomes.values())
+
+
+@pytest.mark.django_db
+def test_recover_lost_transaction_id(benchmark, gateway):
+    payment_method = create_vaulted_payment_method()
+    payment_processor = get_instance(payment_method.payment_processor)
+
+    def setup():
+        transaction = BraintreeTransactionFactory.create(payment_method=payment_method,
+                                                         state=Transaction.States.Pending)
+        transaction.data.update({
+            'requested_at': datetime.utcnow().isoformat(),
+            'order_id': str(transaction.uuid),
+        })
+        transaction.save()
+
+        gateway.add_transaction(transaction.amount, order_id=str(transaction.uuid))
+
+        return reload(transaction),
+
+    assert run_benchmark(benchmark, payment_processor.recover_lost_transaction_id, setup)
+
+
+@pytest.mark.django_db
+def test_client_token_cache_miss(benchmark, gateway):
+    payment_method = create_vaulted_payment_method()
+    payment_processor = get_instance(payment_method.payment_processor)
+
+    def setup():
+        payment_processor.client_tokens.clear()
+
+        return payment_method.customer,
+
+    assert run_benchmark(benchmark, payment_processor.client_token, setup)
+
+
+@pytest.mark.django_db
+def test_client_token_cache_hit(benchmark, gateway):
+    payment_method = create_vaulted_payment_method()
+    payment_processor = get_instance(payment_method.payment_processor)
+
+    payment_processor.client_token(payment_method.customer)
+
+    def setup():
+        return payment_method.customer,
+
+    assert run_benchmark(benchmark, payment_processor.client_token, setup)
+
+
+@pytest.mark.django_db
+def test_handle_transaction_response(benchmark, gateway):
+    payment_processor = get_instance('BraintreeTriggered')
+    request = RequestFactory().post('/', {'payment_method_nonce': 'some-nonce',
+                                          'postal_code': '12345'})
+
+    def setup():
+        payment_method = BraintreePaymentMethodFactory.create()
+
+        return reload(BraintreeTransactionFactory.create(payment_method=payment_method)), request
+
+    run_benchmark(benchmark, payment_processor.handle_transaction_response, setup)
@@ -0,0 +1,233 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from decimal import Decimal
+
+import braintree
+import pytest
+from braintree.exceptions import DownForMaintenanceError, ServerError, TooManyRequestsError
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.transport import HttpTransport
+from tests.factories import BraintreeRecurringPaymentMethodFactory, BraintreeTransactionFactory
+
+from benchmarks.simulator import GatewaySimulator, parse_latency
+
+
+@pytest.fixture
+def start_simulator():
+    """
+    Starts GatewaySimulators, stopping them afterwards.
+    """
+    simulators = []
+
+    def start(**kwargs):
+        simulator = GatewaySimulator(**kwargs).start()
+        simulators.append(simulator)
+
+        return simulator
+
+    yield start
+
+    for simulator in simulators:
+        simulator.stop()
+
+
+def test_sale_find_and_search(start_simulator):
+    gateway = start_simulator().get_gateway()
+
+    result = gateway.transaction.sale({
+        'amount': Decimal('10.00'),
+        'order_id': 'some-uuid',
+        'payment_method_nonce': 'fake-valid-nonce',
+        'customer': {'first_name': 'Jane', 'last_name': 'Doe'},
+        'options': {'submit_for_settlement': True, 'store_in_vault': True},
+    })
+
+    assert result.is_success
+    transaction = result.transaction
+    assert transaction.status == braintree.Transaction.Status.SubmittedForSettlement
+    assert transaction.amount == Decimal('10.00')
+    assert transaction.credit_card_details.token
+    assert transaction.customer_details.id
+
+    assert gateway.transaction.find(transaction.id).order_id == 'some-uuid'
+
+    search_result = gateway.transaction.search(
+        braintree.TransactionSearch.order_id.is_equal('some-uuid')
+    )
+    assert list(search_result.ids) == [transaction.id]
+
+    search_result = gateway.transaction.search(
+        braintree.TransactionSearch.ids.in_list([transaction.id, 'unknown'])
+    )
+    assert [item.id for item in search_result.items] == [transaction.id]
+
+    with pytest.raises(braintree.exceptions.NotFoundError):
+        gateway.transaction.find('unknown')
+
+
+def test_vault_and_client_token(start_simulator):
+    gateway = start_simulator().get_gateway()
+
+    customer = gateway.customer.create({'first_name': 'Jane'}).customer
+    payment_method = gateway.payment_method.create({
+        'customer_id': customer.id, 'payment_method_nonce': 'fake-paypal-future-nonce'
+    }).payment_method
+
+    assert isinstance(payment_method, braintree.PayPalAccount)
+    assert payment_method.token
+
+    assert gateway.client_token.generate({'customer_id': customer.id})
+
+
+def test_processor_declines(start_simulator):
+    gateway = start_simulator(decline_rate=1, decline_codes=[2001]).get_gateway()
+
+    result = gateway.transaction.sale({
+        'amount': Decimal('10.00'), 'payment_method_token': 'kento'
+    })
+
+    assert not result.is_success
+    assert result.transaction.status == braintree.Transaction.Status.ProcessorDeclined
+    assert result.transaction.processor_response_code == '2001'
+
+
+def test_amount_based_declines(start_simulator):
+    gateway = start_simulator().get_gateway()
+
+    result = gateway.transaction.sale({
+        'amount': Decimal('2004.00'), 'payment_method_token': 'kento'
+    })
+
+    assert result.transaction.processor_response_code == '2004'
+
+
+@pytest.mark.parametrize('options, exception', [
+    ({'server_error_rate': 1}, ServerError),
+    ({'maintenance_rate': 1}, DownForMaintenanceError),
+])
+def test_error_injection(start_simulator, options, exception):
+    simulator = start_simulator(**options)
+    gateway = simulator.get_gateway()
+
+    with pytest.raises(exception):
+        gateway.transaction.find('some-id')
+
+    assert sum(simulator.stats.values()) == 1
+
+
+def test_rate_limit(start_simulator):
+    gateway = start_simulator(rate_limit=1, rate_limit_burst=2).get_gateway()
+
+    gateway.client_token.generate()
+    gateway.client_token.generate()
+
+    with pytest.raises(TooManyRequestsError):
+        gateway.client_token.generate()
+
+
+def test_latency(start_simulator):
+    gateway = start_simulator(latency=parse_latency('fixed:0.05')).get_gateway()
+
+    start = time.monotonic()
+    gateway.client_token.generate()
+
+    assert time.monotonic() - start >= 0.05
+
+
+def test_settlement_delay(start_simulator):
+    gateway = start_simulator(settlement_delay=0).get_gateway()
+
+    result = gateway.transaction.sale({
+        'amount': Decimal('10.00'), 'payment_method_token': 'kento',
+        'options': {'submit_for_settlement': True}
+    })
+
+    assert (gateway.transaction.find(result.transaction.id).status ==
+            braintree.Transaction.Status.Settled)
+
+
+@pytest.mark.django_db
+def test_charge_and_poll_through_simulator(benchmark, start_simulator):
+    """
+    Drives the payment processor through the real SDK and HTTP transport.
+    """
+    pytest.importorskip('pytest_benchmark')
+    simulator = start_simulator(settlement_delay=0)
+
+    payment_method = BraintreeRecurringPaymentMethodFactory.create()
+    payment_method.token = 'kento'
+    payment_method.save()
+
+    payment_processor = get_instance(payment_method.payment_processor)
+    payment_processor.gateway = simulator.get_gateway(
+        http_strategy=payment_processor.http_transport.http_strategy
+    )
+
+    def setup():
+        return (BraintreeTransactionFactory.create(payment_method=payment_method,
+                                                   state=Transaction.States.Pending), ), {}
+
+    def charge_and_poll(transaction):
+        payment_processor.execute_transaction(transaction)
+        payment_processor.fetch_transaction_status(transaction)
+
+        return transaction
+
+    transaction = benchmark.pedantic(charge_and_poll, setup=setup, rounds=50)
+
+    assert transaction.state == Transaction.States.Settled
+
+
+def test_sdk_throughput(benchmark, start_simulator):
+    """
+    Sends concurrent sales through the SDK, reporting the requests per second in extra_info.
+    """
+    pytest.importorskip('pytest_benchmark')
+    gateway = start_simulator().get_gateway(
+        http_strategy=HttpTransport(pool_maxsize=16).http_strategy
+    )
+
+    threads_count, sales_per_thread = 8, 50
+
+    def sell():
+        for _ in range(sales_per_thread):
+            gateway.transaction.sale({
+                'amount': Decimal('10.00'), 'payment_method_token': 'kento',
+                'options': {'submit_for_settlement': True}
+            })
+
+    # timed here as well, since benchmark.stats is None under --benchmark-disable
+    durations = []
+
+    def run():
+        started_at = time.perf_counter()
+
+        threads = [threading.Thread(target=sell) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        durations.append(time.perf_counter() - started_at)
+
+    benchmark.pedantic(run, rounds=3)
+
+    benchmark.extra_info['requests_per_second'] = (
+        threads_count * sales_per_thread * len(durations) / sum(durations)
+    )
@@ -0,0 +1,41 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from tests.test_sdk import run_startup_script
+
+pytest.importorskip('pytest_benchmark')
+
+
+def test_django_startup(benchmark):
+    """
+    Starts Django with a Braintree payment processor in fresh interpreters. The Braintree SDK is
+    only imported on the first gateway use; the time it takes is reported in extra_info.
+    """
+    results = []
+
+    def start():
+        results.append(run_startup_script())
+
+    benchmark.pedantic(start, rounds=5)
+
+    assert not any(result['braintree_imported'] for result in results)
+
+    benchmark.extra_info['startup_seconds'] = (
+        sum(result['startup'] for result in results) / len(results)
+    )
+    benchmark.extra_info['deferred_sdk_import_seconds'] = (
+        sum(result['sdk_import'] for result in results) / len(results)
+    )
@@ -14,21 +14,27 @@
 
 from annoying.functions import get_object_or_None
 
+from django.http import HttpResponse
+
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import (api_view, authentication_classes,
+                                       permission_classes)
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from silver.models import Transaction
-from silver.payment_processors import get_instance
 
-from silver_braintree.models import BraintreeTriggered
+from silver_braintree.payment_processors import (BraintreeTriggered,
+                                                 BraintreeTriggeredBase)
+from silver_braintree.registry import get_payment_processor
+from silver_braintree.sdk import braintree
 
 
-@api_view('GET')
+@api_view(['GET'])
 def client_token(request, transaction_uuid=None):
     transaction = get_object_or_None(Transaction, id=transaction_uuid)
 
-    payment_processor = get_instance(transaction.payment_processor)
+    payment_processor = get_payment_processor(transaction.payment_processor)
     if not isinstance(payment_processor, BraintreeTriggered):
         return Response(
             {'detail': 'Transaction is not a Braintree transaction.'},
@@ -42,3 +48,38 @@ def client_token(request, transaction_uuid=None):
                         status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     return Response({'token': token}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET', 'POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def webhook(request, payment_processor_name):
+    """
+    Receives the webhook notifications sent by Braintree for the given payment processor.
+    """
+    try:
+        payment_processor = get_payment_processor(payment_processor_name)
+    except KeyError:
+        payment_processor = None
+
+    if not isinstance(payment_processor, BraintreeTriggeredBase):
+        return Response({'detail': 'Not a Braintree payment processor.'},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        try:
+            return HttpResponse(
+                payment_processor.verify_webhook_challenge(request.GET.get('bt_challenge', ''))
+            )
+        except braintree.exceptions.InvalidChallengeError:
+            return Response({'detail': 'Invalid challenge.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        payment_processor.process_webhook(request.data.get('bt_signature'),
+                                          request.data.get('bt_payload'))
+    except braintree.exceptions.InvalidSignatureError:
+        return Response({'detail': 'Invalid signature.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(status=status.HTTP_200_OK)
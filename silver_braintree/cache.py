@@ -0,0 +1,187 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TIMEOUT = object()
+
+_missing = object()
+
+
+class GatewayCache(object):
+    """
+    A TTL cache for Braintree gateway responses.
+
+    Entries are stored in the Django cache, so that they are shared between processes, and in a
+    bounded in-process LRU, which is checked first and which also serves as a fallback when the
+    Django cache is unavailable. An entry read from the Django cache is kept in the LRU only for
+    the rest of its lifetime.
+
+    A timeout of None means the entry never expires.
+    """
+
+    def __init__(self, prefix, timeout, max_entries=1024, shared=True):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.shared = shared
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _make_key(self, key):
+        return 'silver_braintree:{}:{}'.format(self.prefix, key)
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _missing
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return _missing
+
+            self._entries.move_to_end(key)
+            return value
+
+    def _set_local(self, key, value, timeout):
+        expires_at = None if timeout is None else time.monotonic() + timeout
+
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        value = self._get_local(key)
+
+        if value is _missing and self.shared:
+            entry = _missing
+            try:
+                entry = cache.get(self._make_key(key), _missing)
+            except Exception as e:
+                logger.warning('Couldn\'t read from the Django cache: %s', {
+                    'key': self._make_key(key),
+                    'exception': str(e)
+                })
+
+            if entry is not _missing:
+                # the local copy mustn't outlive the shared entry
+                expires_at, value = entry
+                timeout = None if expires_at is None else expires_at - time.time()
+
+                if timeout is not None and timeout <= 0:
+                    value = _missing
+                else:
+                    self._set_local(key, value, timeout)
+
+        if value is _missing:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+
+        self._set_local(key, value, timeout)
+
+        if self.shared:
+            # the shared entries carry their wall clock expiry time, which is comparable
+            # between processes
+            expires_at = None if timeout is None else time.time() + timeout
+
+            try:
+                cache.set(self._make_key(key), (expires_at, value), timeout)
+            except Exception as e:
+                logger.warning('Couldn\'t write to the Django cache: %s', {
+                    'key': self._make_key(key),
+                    'exception': str(e)
+                })
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self.shared:
+            try:
+                cache.delete(self._make_key(key))
+            except Exception as e:
+                logger.warning('Couldn\'t delete from the Django cache: %s', {
+                    'key': self._make_key(key),
+                    'exception': str(e)
+                })
+
+    def clear(self):
+        """
+        Clears the in-process entries and the hit/miss counters.
+        """
+        with self._lock:
+            self._entries.clear()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+
+_gateway_caches = {}
+_gateway_caches_lock = threading.Lock()
+
+
+def get_gateway_cache(prefix, timeout, max_entries=1024, shared=True):
+    """
+    Returns the process-wide GatewayCache with the given prefix, creating it if needed.
+    """
+    with _gateway_caches_lock:
+        gateway_cache = _gateway_caches.get(prefix)
+
+        if gateway_cache is None:
+            gateway_cache = GatewayCache(prefix, timeout, max_entries, shared)
+            _gateway_caches[prefix] = gateway_cache
+        else:
+            gateway_cache.timeout = timeout
+            gateway_cache.max_entries = max_entries
+
+        return gateway_cache
+
+
+def clear_gateway_caches():
+    with _gateway_caches_lock:
+        for gateway_cache in _gateway_caches.values():
+            gateway_cache.clear()
@@ -0,0 +1,149 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls sharing a key: while a call is in flight, the calls made with
+    the same key wait for it and share its result (or exception) instead of being made too.
+
+    Only calls which are in flight at the same time are coalesced; nothing is cached.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        :return: A (result, shared) pair, shared being True if the result is the one of a call
+                 that was already in flight.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+
+            if call.exception is not None:
+                raise call.exception
+
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+_single_flights = {}
+_single_flights_lock = threading.Lock()
+
+
+def get_single_flight(name):
+    """
+    Returns the process-wide SingleFlight with the given name, creating it if needed.
+    """
+    with _single_flights_lock:
+        single_flight = _single_flights.get(name)
+
+        if single_flight is None:
+            single_flight = SingleFlight()
+            _single_flights[name] = single_flight
+
+        return single_flight
+
+
+def clear_single_flights():
+    """
+    Forgets the process-wide SingleFlights, so that they're created again on their next use.
+    The calls in flight are still shared with the callers already waiting for them.
+    """
+    with _single_flights_lock:
+        _single_flights.clear()
+
+
+@contextmanager
+def cache_lock(key, timeout=30, wait_timeout=10, poll_interval=0.05):
+    """
+    Holds a lock shared between processes through the Django cache.
+
+    :param timeout: Seconds after which the lock is released, in case its holder died.
+    :param wait_timeout: Seconds to wait for the lock to be released by another holder.
+    :return: A context manager yielding True if the lock was acquired, False if it was still
+             held by another holder after wait_timeout, or if the Django cache is unavailable.
+             The wrapped code runs either way.
+    """
+    key = 'silver_braintree:lock:{}'.format(key)
+    deadline = time.monotonic() + wait_timeout
+    acquired = False
+
+    while True:
+        try:
+            acquired = cache.add(key, True, timeout)
+        except Exception as e:
+            logger.warning('Couldn\'t acquire a lock through the Django cache: %s', {
+                'key': key,
+                'exception': str(e)
+            })
+            break
+
+        if acquired or time.monotonic() >= deadline:
+            break
+
+        time.sleep(poll_interval)
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                cache.delete(key)
+            except Exception as e:
+                logger.warning('Couldn\'t release a lock through the Django cache: %s', {
+                    'key': key,
+                    'exception': str(e)
+                })
@@ -0,0 +1,41 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# These build on the Braintree SDK, so this module is imported on first use only, through
+# silver_braintree.sdk.errors.
+
+import requests
+from braintree.exceptions import DownForMaintenanceError, ServerError, TooManyRequestsError
+from braintree.exceptions.http.connection_error import ConnectionError as HttpConnectionError
+from braintree.exceptions.http.timeout_error import TimeoutError as HttpTimeoutError
+
+
+class CircuitOpenError(DownForMaintenanceError):
+    """
+    Raised instead of calling Braintree while the circuit breaker is open. Being a
+    DownForMaintenanceError, it's handled like any other Braintree outage.
+    """
+
+
+class ThrottledError(TooManyRequestsError):
+    """
+    Raised, without calling Braintree, when a call couldn't get through the rate limit or the
+    concurrency limit in time.
+    """
+
+
+# errors telling that Braintree is unavailable, as opposed to it rejecting a request
+OUTAGE_ERRORS = (ServerError, DownForMaintenanceError, TooManyRequestsError,
+                 HttpTimeoutError, HttpConnectionError,
+                 requests.exceptions.Timeout, requests.exceptions.ConnectionError)
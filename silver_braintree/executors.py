@@ -0,0 +1,95 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_in_lanes(items, func, lane_key, max_workers, cancel_event=None,
+                 thread_name_prefix='silver-braintree'):
+    """
+    :param items: A list of items to be processed.
+    :param func: A callable receiving a single item and returning its result.
+    :param lane_key: A callable receiving an item and returning its lane. Items sharing a lane
+                     are processed one after another, in the given order.
+    :param max_workers: The maximum number of worker threads.
+    :param cancel_event: An optional threading.Event. Once it is set, the workers finish the
+                         item they are processing and no other item is started.
+    :return: A list with the results of the given items, in the same order. Items which
+             weren't processed because of a cancel have a None result, while items whose
+             processing raised an exception have a False result.
+    :description: Processes the items across a bounded pool of worker threads. Each worker uses
+                  its own database connections, which are closed once the worker is done.
+    """
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    if cancel_event is None:
+        cancel_event = threading.Event()
+
+    lanes = OrderedDict()
+    for index, item in enumerate(items):
+        lanes.setdefault(lane_key(item), []).append(index)
+
+    lane_queue = queue.Queue()
+    for indexes in lanes.values():
+        lane_queue.put(indexes)
+
+    def worker():
+        try:
+            while not cancel_event.is_set():
+                try:
+                    indexes = lane_queue.get_nowait()
+                except queue.Empty:
+                    return
+
+                for index in indexes:
+                    if cancel_event.is_set():
+                        return
+
+                    try:
+                        results[index] = func(items[index])
+                    except Exception:
+                        logger.exception('Encountered exception while processing item %s.',
+                                         items[index])
+                        results[index] = False
+        finally:
+            connections.close_all()
+
+    workers = [
+        threading.Thread(target=worker, name='{}-{}'.format(thread_name_prefix, number))
+        for number in range(min(max_workers, len(lanes)))
+    ]
+    for thread in workers:
+        thread.start()
+
+    try:
+        for thread in workers:
+            thread.join()
+    except BaseException:
+        # e.g. KeyboardInterrupt; let the in-flight items finish before bailing out
+        cancel_event.set()
+        for thread in workers:
+            thread.join()
+        raise
+
+    return results
@@ -0,0 +1,35 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+
+import dateutil.parser
+from django.utils import timezone
+
+
+def moment(moment_str):
+    """
+    Parses a date or datetime command argument; naive values are considered UTC.
+    """
+    try:
+        value = dateutil.parser.parse(moment_str)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Not a valid date or datetime: \'{}\'.'.format(moment_str)
+        )
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+
+    return value
@@ -0,0 +1,79 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from silver_braintree.management.arguments import moment
+from silver_braintree.payment_processors import BraintreeTriggeredBase
+from silver_braintree.registry import get_payment_processor
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Imports the ids and statuses of the Braintree transactions created within a time '
+            'range into the matching Silver transactions. Interrupted runs resume from their '
+            'last checkpoint when started again with the same arguments.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processor', action='store', required=True,
+                            help='The name of the Braintree payment processor.')
+        parser.add_argument('--start', action='store', type=moment, required=True,
+                            help='The beginning of the time range (UTC, unless specified).')
+        parser.add_argument('--end', action='store', type=moment,
+                            help='The end of the time range (UTC, unless specified); '
+                                 'defaults to the beginning of today, UTC.')
+        parser.add_argument('--workers', action='store', type=int,
+                            help='How many time slices are imported concurrently.')
+
+    def handle(self, *args, **options):
+        payment_processor = get_payment_processor(options['processor'])
+        if not isinstance(payment_processor, BraintreeTriggeredBase):
+            raise CommandError('{} is not a Braintree payment processor.'.format(
+                options['processor']
+            ))
+
+        start = options['start']
+        # a stable default, which lets the command be resumed with the same arguments
+        end = options['end'] or timezone.make_aware(
+            datetime.combine(timezone.now().date(), time.min), timezone.utc
+        )
+        if start >= end:
+            raise CommandError('The start of the time range must precede its end.')
+
+        logger.info('Backfilling Braintree transactions: %s', {
+            'payment_processor': payment_processor.name,
+            'start': start,
+            'end': end
+        })
+
+        checkpoint, counts = payment_processor.backfill_transactions(
+            start, end, max_workers=options['workers']
+        )
+
+        self.stdout.write('Imported: {}'.format(', '.join(
+            '{}: {}'.format(outcome, count) for outcome, count in sorted(counts.items())
+        )))
+
+        if not checkpoint.is_complete:
+            raise CommandError(
+                'The backfill stopped at {}; run the command again to resume it.'.format(
+                    checkpoint.cursor
+                )
+            )
@@ -0,0 +1,140 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from silver.payment_processors import get_all_instances
+from silver_braintree.payment_processors import BraintreeTriggeredBase
+from silver_braintree.registry import get_payment_processor
+
+
+logger = logging.getLogger(__name__)
+
+
+def poll_shard(processor_names, shard, shards, batch_size=None):
+    """
+    Polls a shard of the pending transactions of the given payment processors. Runs within the
+    worker processes.
+
+    :return: A (shard, Counter, seconds) tuple.
+    """
+    # worker processes which aren't forked start without Django being set up
+    if not apps.ready:
+        django.setup()
+
+    started_at = time.monotonic()
+    counts = Counter()
+
+    for name in processor_names:
+        counts.update(get_payment_processor(name).poll_pending_transactions(
+            shard, shards, batch_size
+        ))
+
+    return shard, counts, time.monotonic() - started_at
+
+
+class Command(BaseCommand):
+    help = ('Fetches the statuses of the pending Braintree transactions. The transactions are '
+            'split in shards, by id, which are polled by concurrent worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processor', action='append', dest='processors',
+                            help='The name of a Braintree payment processor (by default, all).')
+        parser.add_argument('--workers', action='store', type=int, default=1,
+                            help='How many worker processes poll the transactions, each one '
+                                 'its own shard.')
+        parser.add_argument('--batch-size', action='store', type=int,
+                            help='How many transactions are claimed at once.')
+
+    def _get_processor_names(self, options):
+        if options['processors']:
+            payment_processors = [get_payment_processor(name) for name in options['processors']]
+        else:
+            payment_processors = get_all_instances()
+
+        return [
+            payment_processor.name for payment_processor in payment_processors
+            if isinstance(payment_processor, BraintreeTriggeredBase)
+        ]
+
+    def _poll(self, processor_names, workers, batch_size):
+        """
+        :return: A list of (shard, Counter, seconds) tuples, and a dict mapping the shards which
+                 failed to their exceptions.
+        """
+        if workers == 1:
+            try:
+                return [poll_shard(processor_names, 0, 1, batch_size)], {}
+            except Exception as e:
+                logger.exception('Couldn\'t poll the pending Braintree transactions.')
+                return [], {0: e}
+
+        # forked workers mustn't share the parent's database connections
+        connections.close_all()
+
+        results, errors = [], {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                shard: executor.submit(poll_shard, processor_names, shard, workers, batch_size)
+                for shard in range(workers)
+            }
+
+            for shard, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error('Couldn\'t poll the pending Braintree transactions: %s', {
+                        'shard': shard,
+                        'exception': str(e)
+                    })
+                    errors[shard] = e
+
+        return results, errors
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('There must be at least one worker.')
+
+        processor_names = self._get_processor_names(options)
+        if not processor_names:
+            raise CommandError('No matching Braintree payment processor was found.')
+
+        logger.info('Polling pending Braintree transactions: %s', {
+            'payment_processors': processor_names,
+            'workers': options['workers']
+        })
+
+        results, errors = self._poll(processor_names, options['workers'],
+                                     options['batch_size'])
+
+        for shard, counts, seconds in sorted(results, key=lambda result: result[0]):
+            self.stdout.write(
+                'Shard {}: {} polled, {} transitioned in {:.2f}s ({:.1f} transactions/s)'.format(
+                    shard, counts['polled'], counts['transitioned'], seconds,
+                    counts['polled'] / seconds if seconds else 0
+                )
+            )
+
+        if errors:
+            raise CommandError('Couldn\'t poll the shards: {}'.format(
+                ', '.join(str(shard) for shard in sorted(errors))
+            ))
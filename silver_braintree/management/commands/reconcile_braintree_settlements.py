@@ -0,0 +1,98 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from silver.payment_processors import get_all_instances
+from silver_braintree.management.arguments import moment
+from silver_braintree.payment_processors import BraintreeTriggeredBase
+from silver_braintree.reconciliation import ReconciliationReport
+from silver_braintree.registry import get_payment_processor
+
+
+logger = logging.getLogger(__name__)
+
+
+class CsvReconciliationReport(ReconciliationReport):
+    """
+    Writes the mismatches as CSV rows as soon as they are found.
+    """
+
+    def __init__(self, stream):
+        super(CsvReconciliationReport, self).__init__()
+
+        self.writer = csv.writer(stream)
+        self.writer.writerow(['kind', 'braintree_id', 'transaction_id', 'details'])
+
+    def add_mismatch(self, kind, braintree_id, transaction=None, **details):
+        self.count(kind)
+        self.writer.writerow([kind, braintree_id, transaction.id if transaction else '',
+                              json.dumps(details, default=str, sort_keys=True)])
+
+
+class Command(BaseCommand):
+    help = ('Reconciles the Silver transactions with the Braintree transactions whose status '
+            'changed within a time range (by default, yesterday), and writes the mismatches '
+            'as CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processor', action='append', dest='processors',
+                            help='The name of a Braintree payment processor (by default, all).')
+        parser.add_argument('--start', action='store', type=moment,
+                            help='The beginning of the time range (UTC, unless specified).')
+        parser.add_argument('--end', action='store', type=moment,
+                            help='The end of the time range (UTC, unless specified).')
+        parser.add_argument('--field', action='append', dest='fields',
+                            help='A Braintree search timestamp field matched against the time '
+                                 'range (by default, settled_at).')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.make_aware(
+            datetime.combine(timezone.now().date(), time.min), timezone.utc
+        )
+        start = options['start'] or end - timedelta(days=1)
+        if start >= end:
+            raise CommandError('The start of the time range must precede its end.')
+
+        if options['processors']:
+            payment_processors = [get_payment_processor(name) for name in options['processors']]
+        else:
+            payment_processors = get_all_instances()
+
+        payment_processors = [
+            payment_processor for payment_processor in payment_processors
+            if isinstance(payment_processor, BraintreeTriggeredBase)
+        ]
+        if not payment_processors:
+            raise CommandError('No matching Braintree payment processor was found.')
+
+        report = CsvReconciliationReport(self.stdout)
+        for payment_processor in payment_processors:
+            logger.info('Reconciling Braintree settlements: %s', {
+                'payment_processor': payment_processor.name,
+                'start': start,
+                'end': end
+            })
+
+            payment_processor.reconcile_settlements(
+                start, end, fields=options['fields'] or ('settled_at', ), report=report
+            )
+
+        self.stderr.write('Reconciled: {}'.format(report))
@@ -0,0 +1,138 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import csv
+import json
+import logging
+import threading
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from silver.models import Transaction
+from silver_braintree.payment_processors import BraintreeTriggeredBase
+from silver_braintree.refunds import RefundReport, RefundResult
+from silver_braintree.registry import get_payment_processor
+
+
+logger = logging.getLogger(__name__)
+
+
+class CsvRefundReport(RefundReport):
+    """
+    Writes the results as CSV rows as soon as they are known.
+    """
+
+    def __init__(self, stream):
+        super(CsvRefundReport, self).__init__()
+
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(RefundResult._fields)
+
+        self._write_lock = threading.Lock()
+
+    def write_result(self, result):
+        self.count(result.outcome)
+
+        with self._write_lock:
+            self.writer.writerow([
+                result.outcome, result.transaction_uuid, result.braintree_id or '',
+                result.refund_id or '', json.dumps(result.details, default=str, sort_keys=True)
+            ])
+            self.stream.flush()
+
+    def add_result(self, outcome, transaction, refund_id=None, **details):
+        self.write_result(RefundResult(
+            outcome, transaction.uuid, (transaction.data or {}).get('braintree_id'),
+            refund_id, details
+        ))
+
+
+class Command(BaseCommand):
+    help = ('Refunds the Braintree transactions of the Silver transactions whose UUIDs are read, '
+            'one per line, from a file, and writes the results as CSV. Transactions refunded '
+            'by a previous run are reported as already refunded, so interrupted runs can be '
+            'resumed by running the command again.')
+
+    # How many transactions are loaded through a single query
+    chunk_size = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument('transactions', type=argparse.FileType('r'),
+                            help='A file of Silver transaction UUIDs, or - for stdin.')
+        parser.add_argument('--processor', action='store', required=True,
+                            help='The name of the Braintree payment processor.')
+        parser.add_argument('--workers', action='store', type=int,
+                            help='How many transactions are refunded concurrently.')
+
+    def _read_uuids(self, stream):
+        uuids = []
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                uuids.append(uuid.UUID(line))
+            except ValueError:
+                raise CommandError('Invalid transaction UUID on line {}: {}'.format(
+                    line_number, line
+                ))
+
+        return list(dict.fromkeys(uuids))
+
+    def handle(self, *args, **options):
+        payment_processor = get_payment_processor(options['processor'])
+        if not isinstance(payment_processor, BraintreeTriggeredBase):
+            raise CommandError('{} is not a Braintree payment processor.'.format(
+                options['processor']
+            ))
+
+        uuids = self._read_uuids(options['transactions'])
+        report = CsvRefundReport(self.stdout)
+
+        logger.info('Refunding Braintree transactions: %s', {
+            'payment_processor': payment_processor.name,
+            'transactions': len(uuids)
+        })
+
+        for start in range(0, len(uuids), self.chunk_size):
+            chunk = uuids[start:start + self.chunk_size]
+
+            transactions = {
+                transaction.uuid: transaction
+                for transaction in Transaction.objects.filter(
+                    uuid__in=chunk, payment_method__payment_processor=payment_processor.name
+                ).select_related('payment_method')
+            }
+
+            for transaction_uuid in chunk:
+                if transaction_uuid not in transactions:
+                    report.write_result(RefundResult(
+                        report.SKIPPED, transaction_uuid, None, None,
+                        {'reason': 'No such transaction of this payment processor.'}
+                    ))
+
+            payment_processor.refund_transactions(
+                [transactions[transaction_uuid] for transaction_uuid in chunk
+                 if transaction_uuid in transactions],
+                max_workers=options['workers'], report=report
+            )
+
+        self.stderr.write('Refunds: {}'.format(report))
+
+        if report.has_failures:
+            raise CommandError('Some refunds failed; run the command again to retry them.')
@@ -0,0 +1,211 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class NullMetrics(object):
+    """
+    The default metrics backend, which discards everything.
+
+    Metrics backends receive timings, in seconds, and counter increments, along with a dict of
+    labels (e.g. operation, processor, outcome, fail_code).
+    """
+
+    def timing(self, name, seconds, labels):
+        pass
+
+    def increment(self, name, labels, value=1):
+        pass
+
+
+class StatsdMetrics(NullMetrics):
+    """
+    Sends the metrics to statsd, through the `statsd` package. Since statsd has no labels, their
+    values are appended to the metric names, e.g. `silver_braintree.step.gateway.success`.
+    """
+
+    def __init__(self, client=None, host='localhost', port=8125, prefix='silver_braintree'):
+        if client is None:
+            try:
+                import statsd
+            except ImportError:
+                raise ImproperlyConfigured('The statsd package is required by StatsdMetrics.')
+
+            client = statsd.StatsClient(host, port, prefix=prefix)
+
+        self.client = client
+
+    def _get_stat(self, name, labels):
+        values = [
+            re.sub(r'[^\w-]', '_', str(labels[label]) if labels[label] else 'none')
+            for label in sorted(labels)
+        ]
+
+        return '.'.join([name] + values)
+
+    def timing(self, name, seconds, labels):
+        self.client.timing(self._get_stat(name, labels), seconds * 1000)
+
+    def increment(self, name, labels, value=1):
+        self.client.incr(self._get_stat(name, labels), value)
+
+
+class PrometheusMetrics(NullMetrics):
+    """
+    Exposes the metrics through the `prometheus_client` package: timings as
+    `<namespace>_<name>_seconds` histograms and counters as `<namespace>_<name>_total`.
+    """
+
+    def __init__(self, registry=None, namespace='silver_braintree', buckets=None):
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImproperlyConfigured(
+                'The prometheus_client package is required by PrometheusMetrics.'
+            )
+
+        self.prometheus_client = prometheus_client
+        self.registry = registry or prometheus_client.REGISTRY
+        self.namespace = namespace
+        self.buckets = buckets or prometheus_client.Histogram.DEFAULT_BUCKETS
+
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_metric(self, metric_class, name, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+
+            if metric is None:
+                metric = metric_class(
+                    '{}_{}'.format(self.namespace, name), name.replace('_', ' '),
+                    labelnames=sorted(labels), registry=self.registry, **kwargs
+                )
+                self._metrics[name] = metric
+
+            return metric
+
+    def timing(self, name, seconds, labels):
+        histogram = self._get_metric(self.prometheus_client.Histogram,
+                                     '{}_seconds'.format(name), labels, buckets=self.buckets)
+        histogram.labels(**{key: value or '' for key, value in labels.items()}).observe(seconds)
+
+    def increment(self, name, labels, value=1):
+        counter = self._get_metric(self.prometheus_client.Counter, name, labels)
+        counter.labels(**{key: value or '' for key, value in labels.items()}).inc(value)
+
+
+_operations = threading.local()
+
+
+def get_current_operation():
+    stack = getattr(_operations, 'stack', None)
+
+    return stack[-1] if stack else ''
+
+
+@contextmanager
+def measure(metrics, name, **labels):
+    """
+    Times the wrapped block and reports it as `name`. The block receives the labels dict, to
+    complete it; the outcome label defaults to `success`, or to `error` if the block raises.
+    """
+    labels.setdefault('outcome', 'success')
+    start = time.perf_counter()
+
+    try:
+        yield labels
+    except BaseException:
+        labels['outcome'] = 'error'
+        raise
+    finally:
+        metrics.timing(name, time.perf_counter() - start, labels)
+
+
+def instrumented(operation):
+    """
+    Decorates a payment processor method, reporting its duration and outcome as an `operation`
+    timing and counter. If the method's first argument is a Silver transaction, its fail code
+    is reported as well.
+
+    The SDK calls and the persistence steps made within the method are labelled with the
+    operation's name.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not hasattr(_operations, 'stack'):
+                _operations.stack = []
+
+            labels = {}
+
+            _operations.stack.append(operation)
+            try:
+                with measure(self.metrics, 'operation', operation=operation,
+                             processor=self.name, fail_code='') as labels:
+                    result = method(self, *args, **kwargs)
+
+                    labels['outcome'] = 'success' if result else 'failure'
+                    if args:
+                        labels['fail_code'] = getattr(args[0], 'fail_code', None) or ''
+
+                    return result
+            finally:
+                _operations.stack.pop()
+                self.metrics.increment('operations', labels)
+
+        return wrapper
+
+    return decorator
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_metrics_backend(name, backend=None, options=None):
+    """
+    :param name: The name of the payment processor using the backend.
+    :param backend: A metrics backend class, or its dotted path; defaults to NullMetrics.
+    :param options: The keyword arguments the backend is initialized with.
+    :return: The process-wide metrics backend of the given payment processor.
+    """
+    with _backends_lock:
+        metrics = _backends.get(name)
+
+        if metrics is None:
+            if isinstance(backend, str):
+                backend = import_string(backend)
+
+            metrics = (backend or NullMetrics)(**(options or {}))
+            _backends[name] = metrics
+
+        return metrics
+
+
+def clear_metrics_backends():
+    """
+    Forgets the process-wide metrics backends, so that they're created again, with their current
+    options, on their next use.
+    """
+    with _backends_lock:
+        _backends.clear()
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver_braintree', '0002_auto_20210628_1341'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerdata',
+            name='braintree_customer_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def merge_duplicated_customer_data(apps, schema_editor):
+    """
+    Makes sure every customer has a single CustomerData row, so that the customer field can
+    become a one-to-one relation. The row holding a Braintree customer id is kept, and the data
+    of the other rows is merged into it.
+    """
+    CustomerData = apps.get_model('silver_braintree', 'CustomerData')
+
+    duplicated_customers = CustomerData.objects.values('customer').annotate(
+        rows=Count('id')
+    ).filter(rows__gt=1).values_list('customer', flat=True)
+
+    for customer_id in duplicated_customers.iterator():
+        rows = list(CustomerData.objects.filter(customer_id=customer_id).order_by('id'))
+
+        kept_row = next((row for row in rows if row.data and 'id' in row.data), rows[0])
+
+        data = {}
+        for row in rows:
+            if row is not kept_row:
+                data.update(row.data or {})
+        data.update(kept_row.data or {})
+
+        kept_row.data = data
+        kept_row.save()
+
+        CustomerData.objects.filter(customer_id=customer_id).exclude(pk=kept_row.pk).delete()
+
+
+def backfill_braintree_customer_id(apps, schema_editor):
+    CustomerData = apps.get_model('silver_braintree', 'CustomerData')
+
+    last_pk = 0
+    while True:
+        rows = list(
+            CustomerData.objects.filter(pk__gt=last_pk).order_by('pk')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not rows:
+            return
+
+        for row in rows:
+            row.braintree_customer_id = row.data.get('id') if row.data else None
+
+        CustomerData.objects.bulk_update(rows, ['braintree_customer_id'])
+
+        last_pk = rows[-1].pk
+
+
+def forwards(apps, schema_editor):
+    merge_duplicated_customer_data(apps, schema_editor)
+    backfill_braintree_customer_id(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver_braintree', '0003_customerdata_braintree_customer_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silver_braintree', '0004_backfill_braintree_customer_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customerdata',
+            name='customer',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='silver.customer'),
+        ),
+    ]
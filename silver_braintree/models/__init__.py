@@ -12,5 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .payment_methods import BraintreePaymentMethod
+from .payment_methods import BraintreePaymentMethod, count_decryptions
 from .customer_data import CustomerData
+from .backfill_checkpoint import BackfillCheckpoint
@@ -0,0 +1,24 @@
+from django.db import models
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    The progress of a Braintree transactions backfill, which imported the Braintree transactions
+    created between `start` and `cursor`.
+    """
+    payment_processor = models.CharField(max_length=255)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    cursor = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('payment_processor', 'start', 'end')
+
+    @property
+    def is_complete(self):
+        return self.cursor >= self.end
+
+    def __repr__(self):
+        return '%s Braintree backfill from %s to %s' % (self.payment_processor, self.start,
+                                                        self.end)
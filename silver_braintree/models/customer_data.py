@@ -4,11 +4,20 @@ from django.db import models
 from silver.models import Customer
 
 from django.core.exceptions import ValidationError
-from django.db.models import Model, ForeignKey, CASCADE
+from django.db.models import Model, OneToOneField, CASCADE
 
 
 class CustomerData(Model):
-    customer = ForeignKey(Customer, on_delete=CASCADE)
+    """
+        data field structure
+        {
+            'id': 'customer-id-given-by-braintree' (also stored, indexed, in
+                                                    braintree_customer_id)
+        }
+    """
+    customer = OneToOneField(Customer, on_delete=CASCADE)
+    braintree_customer_id = models.CharField(max_length=255, null=True, blank=True,
+                                             db_index=True)
     data = models.JSONField(default=dict, null=True, blank=True, encoder=DjangoJSONEncoder)
 
     def clean(self):
@@ -17,6 +26,15 @@ class CustomerData(Model):
         if not isinstance(self.data, dict):
             raise ValidationError('Field "data" must be a dict.')
 
+    def save(self, *args, **kwargs):
+        self.braintree_customer_id = self.data.get('id') if self.data else None
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'data' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'braintree_customer_id'}
+
+        super(CustomerData, self).save(*args, **kwargs)
+
     def __repr__(self):
         return '%s Braintree data' % self.customer
 
@@ -12,11 +12,43 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import braintree as sdk
-from braintree.exceptions import NotFoundError
+import threading
+from contextlib import contextmanager
 
 from silver.models import PaymentMethod
 
+from silver_braintree.registry import get_payment_processor
+from silver_braintree.sdk import braintree
+
+
+_decryption_counters = threading.local()
+
+
+class DecryptionCounter(object):
+    def __init__(self):
+        self.count = 0
+
+
+@contextmanager
+def count_decryptions():
+    """
+    Counts the payment method data decryptions made by the current thread within the block.
+
+        with count_decryptions() as counter:
+            payment_processor.execute_transaction(transaction)
+        print(counter.count)
+    """
+    counter = DecryptionCounter()
+
+    if not hasattr(_decryption_counters, 'stack'):
+        _decryption_counters.stack = []
+
+    _decryption_counters.stack.append(counter)
+    try:
+        yield counter
+    finally:
+        _decryption_counters.stack.remove(counter)
+
 
 class BraintreePaymentMethod(PaymentMethod):
     """
@@ -47,32 +79,76 @@ class BraintreePaymentMethod(PaymentMethod):
         PayPal = 'paypal_account'
         CreditCard = 'credit_card'
 
+    def get_payment_processor(self):
+        return get_payment_processor(self.payment_processor)
+
     @property
     def braintree_transaction(self):
+        payment_processor = self.get_payment_processor()
+
         try:
-            return sdk.Transaction.find(self.braintree_id)
-        except NotFoundError:
+            return payment_processor.find_braintree_transaction(self.braintree_id)
+        except braintree.exceptions.NotFoundError:
             return None
 
     @property
     def braintree_id(self):
         return self.data.get('braintree_id')
 
+    def decrypt_data(self, crypted_data):
+        if crypted_data:
+            for counter in getattr(_decryption_counters, 'stack', ()):
+                counter.count += 1
+
+        return super(BraintreePaymentMethod, self).decrypt_data(crypted_data)
+
+    def _get_decrypted(self, key):
+        # The plaintexts are memoized along with the data they were decrypted from, so that
+        # changes made directly to self.data are still picked up.
+        decrypted_data = self.__dict__.setdefault('_decrypted_data', {})
+
+        crypted_value = self.data.get(key)
+        if key in decrypted_data and decrypted_data[key][0] == crypted_value:
+            return decrypted_data[key][1]
+
+        value = self.decrypt_data(crypted_value)
+        decrypted_data[key] = (crypted_value, value)
+
+        return value
+
+    def _set_encrypted(self, key, value):
+        crypted_value = self.encrypt_data(value)
+        self.data[key] = crypted_value
+
+        self.__dict__.setdefault('_decrypted_data', {})[key] = (crypted_value, value)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.__dict__.pop('_decrypted_data', None)
+
+        super(BraintreePaymentMethod, self).refresh_from_db(*args, **kwargs)
+
+    def __getstate__(self):
+        # never let the plaintexts get pickled (e.g. into a cache)
+        state = dict(super(BraintreePaymentMethod, self).__getstate__())
+        state.pop('_decrypted_data', None)
+
+        return state
+
     @property
     def token(self):
-        return self.decrypt_data(self.data.get('token'))
+        return self._get_decrypted('token')
 
     @token.setter
     def token(self, value):
-        self.data['token'] = self.encrypt_data(value)
+        self._set_encrypted('token', value)
 
     @property
     def nonce(self):
-        return self.decrypt_data(self.data.get('nonce'))
+        return self._get_decrypted('nonce')
 
     @nonce.setter
     def nonce(self, value):
-        self.data['nonce'] = self.encrypt_data(value)
+        self._set_encrypted('nonce', value)
 
     def update_details(self, details):
         if 'details' not in self.data:
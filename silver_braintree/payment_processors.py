@@ -12,36 +12,187 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import logging
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
 
-import braintree
-from braintree.exceptions import (AuthenticationError, AuthorizationError,
-                                  DownForMaintenanceError, ServerError,
-                                  UpgradeRequiredError)
 import dateutil.parser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction as db_transaction
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Mod
+from django.utils import timezone
 from django_fsm import TransitionNotAllowed
 
 from silver.models import Transaction
-from silver.payment_processors import PaymentProcessorBase, get_instance
+from silver.payment_processors import PaymentProcessorBase
 from silver.payment_processors.forms import GenericTransactionForm
 from silver.payment_processors.mixins import TriggeredProcessorMixin
 
+from silver_braintree.cache import get_gateway_cache
+from silver_braintree.coalescing import cache_lock, get_single_flight
+from silver_braintree.executors import run_in_lanes
+from silver_braintree.metrics import (get_current_operation, get_metrics_backend,
+                                      instrumented, measure)
+from silver_braintree.models import BackfillCheckpoint
 from silver_braintree.models import BraintreePaymentMethod
 from silver_braintree.models import CustomerData
+from silver_braintree.persistence import UnitOfWork, bulk_save
+from silver_braintree.reconciliation import ReconciliationReport
+from silver_braintree.refunds import RefundReport
+from silver_braintree.registry import get_payment_processor
+from silver_braintree.resilience import RetryPolicy, get_circuit_breaker
+from silver_braintree.sdk import braintree, errors
+from silver_braintree.throttling import get_concurrency_limiter, get_rate_limiter
+from silver_braintree.transport import get_http_transport
 from silver_braintree.views import BraintreeTransactionView
 
 
 logger = logging.getLogger(__name__)
 
 
+# setup_data options configuring the HttpTransport, without their `http_` prefix
+HTTP_TRANSPORT_OPTIONS = ['pool_connections', 'pool_maxsize', 'connect_timeout',
+                          'read_timeout', 'keep_alive']
+
+# setup_data options configuring the CircuitBreaker, without their `circuit_breaker_` prefix
+CIRCUIT_BREAKER_OPTIONS = ['threshold', 'window', 'reset_timeout']
+
+# setup_data options configuring the RetryPolicy, without their `retry_` prefix
+RETRY_OPTIONS = ['attempts', 'base_delay', 'max_delay']
+
+# setup_data options configuring the AdaptiveConcurrencyLimiter, without their `concurrency_`
+# prefix; the limiter is only used when `concurrency_max_limit` is given
+CONCURRENCY_OPTIONS = ['max_limit', 'initial_limit', 'min_limit', 'latency_target', 'timeout']
+
+# Rate limit budgets: idempotent calls (finds, searches, client tokens) are reads
+RATE_LIMIT_BUDGETS = ['read', 'write']
+
+# Transaction fields written by a status update and, besides them, by the transition to each state
+STATUS_UPDATE_FIELDS = ['external_reference', 'data']
+TRANSITION_FIELDS = {
+    Transaction.States.Settled: ['state'],
+    Transaction.States.Failed: ['state', 'fail_code'],
+    Transaction.States.Canceled: ['state', 'cancel_code'],
+}
+
+
+def _pop_prefixed_options(kwargs, prefix, options):
+    return {
+        option: kwargs.pop(prefix + option)
+        for option in options if prefix + option in kwargs
+    }
+
+
+def _as_naive_utc(value):
+    if timezone.is_aware(value):
+        return timezone.make_naive(value, timezone.utc)
+
+    return value
+
+
+@lru_cache(maxsize=None)
+def _get_status_targets():
+    """
+    :return: A dict mapping the Braintree transaction statuses to the states of the Silver
+             transactions having them. The other statuses don't change the Silver state.
+    """
+    Status = braintree.Transaction.Status
+
+    status_targets = dict.fromkeys([Status.AuthorizationExpired,
+                                    Status.SettlementDeclined,
+                                    Status.Failed,
+                                    Status.GatewayRejected,
+                                    Status.ProcessorDeclined], Transaction.States.Failed)
+    status_targets[Status.Voided] = Transaction.States.Canceled
+    status_targets.update(dict.fromkeys([Status.Settling,
+                                         Status.SettlementPending,
+                                         Status.Settled], Transaction.States.Settled))
+
+    return status_targets
+
+
+@lru_cache(maxsize=None)
+def _get_final_statuses():
+    """
+    :return: The Braintree transaction statuses which don't change anymore.
+    """
+    Status = braintree.Transaction.Status
+
+    return frozenset([Status.AuthorizationExpired, Status.Failed, Status.GatewayRejected,
+                      Status.ProcessorDeclined, Status.SettlementDeclined, Status.Settled,
+                      Status.Voided])
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
     payment_method_class = BraintreePaymentMethod
     transaction_view_class = BraintreeTransactionView
     form_class = GenericTransactionForm
     template_slug = 'braintree'
 
-    _has_been_setup = False
+    # How many pending transactions have their statuses fetched and written together
+    status_search_chunk_size = 1000
+
+    # How many pending transactions are claimed at once by poll_pending_transactions
+    poll_batch_size = 500
+
+    # Braintree retries undelivered webhooks for up to 24 hours
+    webhook_deduplication_timeout = 60 * 60 * 48
+
+    # Braintree client tokens are valid for 24 hours
+    client_token_validity = 60 * 60 * 24
+    client_token_ttl = 60 * 60
+    client_token_cache_size = 1024
+
+    # Seconds a Braintree transaction whose status may still change is cached for; the ones
+    # with a final status are cached until they're evicted or invalidated
+    transaction_cache_ttl = 30
+    transaction_cache_size = 1024
+
+    # Braintree searches return at most this many transactions
+    transaction_search_limit = 50000
+    # How many Braintree transactions are fetched through a single request, like the SDK's pages
+    search_page_size = 50
+    # Longest time window searched at once by recover_lost_transaction_ids
+    recovery_window_limit = timedelta(hours=1)
+
+    # Duration of the time windows searched by reconcile_settlements
+    reconciliation_window = timedelta(hours=1)
+    # How many Braintree transactions are reconciled within a database transaction
+    reconciliation_batch_size = 500
+
+    # Duration of the time slices imported by backfill_transactions
+    backfill_window = timedelta(days=1)
+    # How many Braintree transactions are imported through a single bulk update
+    backfill_batch_size = 500
+    # Default number of time slices imported concurrently by backfill_transactions
+    max_backfill_workers = 4
+
+    # Default number of concurrent charges made by execute_transactions
+    max_charge_workers = 8
+
+    # Default number of concurrent refunds made by refund_transactions
+    max_refund_workers = 8
+    # How long a transaction being refunded is locked against other refunds
+    refund_lock_timeout = 60 * 5
 
     def is_payment_method_recurring(self, payment_method):
         raise NotImplementedError
@@ -49,24 +200,281 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
     def __init__(self, name, *args, **kwargs):
         super(BraintreeTriggeredBase, self).__init__(name)
 
-        if self._has_been_setup:
+        client_token_ttl = kwargs.pop('client_token_ttl', self.client_token_ttl)
+        if client_token_ttl >= self.client_token_validity:
+            raise ImproperlyConfigured(
+                'client_token_ttl must be lower than the client token validity '
+                '({} seconds).'.format(self.client_token_validity)
+            )
+
+        self.client_tokens = get_gateway_cache(
+            'client_token:{}'.format(name), client_token_ttl,
+            kwargs.pop('client_token_cache_size', self.client_token_cache_size)
+        )
+
+        # the SDK's transactions reference their gateway, so they're only cached in-process
+        self.braintree_transactions = get_gateway_cache(
+            'transaction:{}'.format(name),
+            kwargs.pop('transaction_cache_ttl', self.transaction_cache_ttl),
+            kwargs.pop('transaction_cache_size', self.transaction_cache_size),
+            shared=False
+        )
+
+        # identical reads made concurrently within the process share a single Braintree call;
+        # client tokens can be coalesced across processes too, through a Django cache lock
+        self.single_flight = get_single_flight(name)
+        self.cross_process_coalescing = kwargs.pop('cross_process_coalescing', False)
+        self.coalescing_timeout = kwargs.pop('coalescing_timeout', 10)
+
+        self.max_charge_workers = kwargs.pop('max_charge_workers', self.max_charge_workers)
+        self.max_refund_workers = kwargs.pop('max_refund_workers', self.max_refund_workers)
+
+        self.metrics = get_metrics_backend(name, kwargs.pop('metrics_backend', None),
+                                           kwargs.pop('metrics_options', None))
+
+        self.circuit_breaker = get_circuit_breaker(
+            name, **_pop_prefixed_options(kwargs, 'circuit_breaker_', CIRCUIT_BREAKER_OPTIONS)
+        )
+        self.retry_policy = RetryPolicy(**_pop_prefixed_options(kwargs, 'retry_', RETRY_OPTIONS))
+
+        # The rate limits are shared by the processors using the same Braintree merchant
+        rate_limit_timeout = kwargs.pop('rate_limit_timeout', 30)
+        self.rate_limiters = {}
+        for budget in RATE_LIMIT_BUDGETS:
+            rate = kwargs.pop('{}_rate_limit'.format(budget), None)
+            burst = kwargs.pop('{}_rate_burst'.format(budget), None)
+            if rate:
+                self.rate_limiters[budget] = get_rate_limiter(
+                    '{}:{}'.format(kwargs.get('merchant_id') or name, budget),
+                    rate, burst, rate_limit_timeout
+                )
+
+        concurrency_options = _pop_prefixed_options(kwargs, 'concurrency_', CONCURRENCY_OPTIONS)
+        self.concurrency_limiter = (
+            get_concurrency_limiter(name, **concurrency_options)
+            if concurrency_options.get('max_limit') else None
+        )
+
+        http_options = _pop_prefixed_options(kwargs, 'http_', HTTP_TRANSPORT_OPTIONS)
+        if 'timeout' in kwargs:
+            http_options.setdefault('read_timeout', kwargs['timeout'])
+
+        self.http_transport = get_http_transport(name, **http_options)
+
+        kwargs.setdefault('http_strategy', self.http_transport.http_strategy)
+        self._gateway_options = kwargs
+        self._gateway = None
+        self._gateway_lock = threading.Lock()
+
+    @property
+    def gateway(self):
+        """
+        The processor's own Braintree gateway (and credentials), instead of the SDK's global
+        Configuration, so that several merchant accounts can be used within a process. It's
+        created on first use, which is when the Braintree SDK gets imported.
+        """
+        if self._gateway is None:
+            with self._gateway_lock:
+                if self._gateway is None:
+                    options = dict(self._gateway_options)
+                    environment = options.pop('environment', None)
+
+                    self._gateway = braintree.BraintreeGateway(
+                        braintree.Configuration(environment, **options)
+                    )
+
+        return self._gateway
+
+    @gateway.setter
+    def gateway(self, gateway):
+        self._gateway = gateway
+
+    def _call_gateway(self, call, func, *args, idempotent=False, **kwargs):
+        """
+        :param call: The name of the Braintree SDK call, e.g. `transaction.sale`.
+        :param func: The Braintree SDK callable.
+        :param idempotent: Whether the call can be safely retried.
+        :return: The result of the SDK call.
+        :raises: CircuitOpenError, without calling Braintree, while the circuit breaker is open.
+        :raises: ThrottledError, without calling Braintree, if the call couldn't get through the
+                 rate limit or the concurrency limit in time.
+        :description: Every Braintree SDK call goes through here, to be measured, throttled and
+                      guarded by the circuit breaker. Idempotent calls failing because of a
+                      Braintree outage are retried according to the retry policy.
+        """
+        attempts = self.retry_policy.attempts if idempotent else 1
+        budget = 'read' if idempotent else 'write'
+
+        for attempt in range(attempts):
+            labels = {'call': call, 'operation': get_current_operation(),
+                      'processor': self.name}
+
+            probe = False
+            try:
+                probe = self.circuit_breaker.before_call()
+                self._acquire_capacity(budget)
+            except errors.OUTAGE_ERRORS as e:
+                # a throttled probe didn't reach Braintree, so another call may probe it
+                if probe:
+                    self.circuit_breaker.release_probe()
+
+                labels['outcome'] = (
+                    'throttled' if isinstance(e, errors.ThrottledError) else 'circuit_open'
+                )
+                self.metrics.increment('gateway_calls', labels)
+                raise
+
+            started_at = time.monotonic()
+            failed = False
+
+            try:
+                with measure(self.metrics, 'gateway_call', **labels) as labels:
+                    result = func(*args, **kwargs)
+            except errors.OUTAGE_ERRORS as e:
+                failed = True
+                self.circuit_breaker.record_failure(probe)
+
+                if attempt + 1 >= attempts or not self.retry_policy.is_retryable(e):
+                    raise
+
+                self.metrics.increment('gateway_retries', labels)
+            except Exception:
+                # Braintree answered, e.g. with a NotFoundError
+                self.circuit_breaker.record_success(probe)
+                raise
+            else:
+                self.circuit_breaker.record_success(probe)
+                return result
+            finally:
+                self._release_capacity(time.monotonic() - started_at, failed)
+                self.metrics.increment('gateway_calls', labels)
+
+            time.sleep(self.retry_policy.get_delay(attempt))
+
+    def _fetch_transactions(self, braintree_ids):
+        """
+        :param braintree_ids: The ids of at most search_page_size Braintree transactions.
+        :return: A list of the Braintree transactions found.
+        :description: Fetches a page of Braintree transactions with a single request, the way
+                      the SDK fetches the pages of its search results, by posting their ids to
+                      Braintree's advanced search.
+        """
+        # the SDK's page fetch is private, with no public equivalent
+        return self._call_gateway(
+            'transaction.fetch', self.gateway.transaction._TransactionGateway__fetch,
+            [], list(braintree_ids), idempotent=True
+        )
+
+    def _iter_search_result(self, search_result):
+        """
+        :param search_result: The ResourceCollection returned by a Braintree transaction search.
+        :return: A generator of the Braintree transactions found, fetched page by page.
+        :description: The SDK fetches the pages of a search result lazily, while iterating its
+                      items, without going through _call_gateway. The pages are fetched here
+                      instead, through _fetch_transactions.
+        """
+        for braintree_ids in _chunked(search_result.ids, self.search_page_size):
+            yield from self._fetch_transactions(braintree_ids)
+
+    def _coalesce(self, call, key, func, *args, **kwargs):
+        """
+        :param call: The name of the coalesced Braintree SDK call, e.g. `transaction.find`.
+        :param key: What identifies the call's arguments, e.g. the Braintree transaction id.
+        :return: The result of func, or the one of an identical call already in flight.
+        """
+        result, shared = self.single_flight.do((call, key), func, *args, **kwargs)
+
+        if shared:
+            self.metrics.increment('coalesced_calls', {
+                'call': call, 'operation': get_current_operation(), 'processor': self.name
+            })
+
+        return result
+
+    def _acquire_capacity(self, budget):
+        """
+        Waits for the rate limit budget and for a concurrency slot of a Braintree call.
+        """
+        rate_limiter = self.rate_limiters.get(budget)
+        if rate_limiter is None and self.concurrency_limiter is None:
             return
 
-        environment = kwargs.pop('environment', None)
-        braintree.Configuration.configure(environment, **kwargs)
+        with self._measure_step('throttling'):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+
+            if self.concurrency_limiter is not None:
+                self.concurrency_limiter.acquire()
+
+    def _release_capacity(self, latency, failed):
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.release(latency, failed)
+
+    @contextmanager
+    def _measure_step(self, step):
+        """
+        Measures a local step (persistence, decryption, transition) of the current operation.
+        """
+        with measure(self.metrics, 'step', step=step, operation=get_current_operation(),
+                     processor=self.name):
+            yield
+
+    def _save(self, instance, unit_of_work=None):
+        with self._measure_step('persistence'):
+            if unit_of_work is None:
+                instance.save()
+                return True
+
+            return unit_of_work.save(instance)
+
+    def _get_customer_data(self, customer):
+        with self._measure_step('persistence'):
+            return CustomerData.objects.get_or_create(customer=customer)[0]
+
+    def _get_client_token_cache_key(self, customer, customer_braintree_id):
+        if customer_braintree_id:
+            return customer_braintree_id
 
-        BraintreeTriggeredBase._has_been_setup = True
+        # tokens generated without a Braintree customer are cached until the customer is vaulted
+        return 'silver-customer-{}'.format(customer.pk)
 
+    def _generate_client_token(self, cache_key, customer_braintree_id):
+        lock = (
+            cache_lock('client_token:{}:{}'.format(self.name, cache_key),
+                       wait_timeout=self.coalescing_timeout)
+            if self.cross_process_coalescing else nullcontext()
+        )
+
+        with lock:
+            # another process may have generated the token while the lock was waited for
+            token = self.cross_process_coalescing and self.client_tokens.get(cache_key)
+            if token:
+                return token
+
+            token = self._call_gateway(
+                'client_token.generate', self.gateway.client_token.generate,
+                {'customer_id': customer_braintree_id}, idempotent=True
+            )
+            self.client_tokens.set(cache_key, token)
+
+            return token
+
+    @instrumented('client_token')
     def client_token(self, customer):
-        customer_data = CustomerData.objects.get_or_create(customer=customer)[0]
+        customer_data = self._get_customer_data(customer)
         customer_braintree_id = customer_data.get('id')
 
+        cache_key = self._get_client_token_cache_key(customer, customer_braintree_id)
+        token = self.client_tokens.get(cache_key)
+        if token:
+            return token
+
         try:
-            return braintree.ClientToken.generate(
-                {'customer_id': customer_braintree_id}
-            )
-        except (AuthenticationError, AuthorizationError, DownForMaintenanceError,
-                ServerError, UpgradeRequiredError) as e:
+            return self._coalesce('client_token.generate', cache_key,
+                                  self._generate_client_token, cache_key, customer_braintree_id)
+        except (braintree.exceptions.AuthenticationError,
+                braintree.exceptions.AuthorizationError,
+                braintree.exceptions.UpgradeRequiredError) + errors.OUTAGE_ERRORS as e:
             logger.warning(
                 'Couldn\'t obtain Braintree client_token %s', {
                     'customer_id': customer_braintree_id,
@@ -74,11 +482,262 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
                 }
             )
 
-    def refund_transaction(self, transaction, payment_method=None):
-        pass
+    def _cache_braintree_transaction(self, result_transaction):
+        timeout = (None if result_transaction.status in _get_final_statuses()
+                   else self.braintree_transactions.timeout)
+
+        self.braintree_transactions.set(result_transaction.id, result_transaction, timeout)
+
+    def find_braintree_transaction(self, braintree_id, use_cache=True):
+        """
+        :param braintree_id: The id of a Braintree transaction.
+        :param use_cache: Whether a cached transaction may be returned. The found transaction is
+                          cached either way.
+        :return: The braintreeSDK transaction.
+        :raises: braintree.exceptions.NotFoundError if there is no such transaction.
+        :description: Transactions with a final status are cached until evicted or invalidated,
+                      the others for transaction_cache_ttl seconds. Concurrent finds of the
+                      same transaction share a single Braintree call.
+        """
+        if use_cache:
+            result_transaction = self.braintree_transactions.get(braintree_id)
+            if result_transaction is not None:
+                return result_transaction
+
+        return self._coalesce('transaction.find', braintree_id,
+                              self._fetch_braintree_transaction, braintree_id)
+
+    def _fetch_braintree_transaction(self, braintree_id):
+        result_transaction = self._call_gateway(
+            'transaction.find', self.gateway.transaction.find, braintree_id, idempotent=True
+        )
+        self._cache_braintree_transaction(result_transaction)
+
+        return result_transaction
+
+    def invalidate_braintree_transaction(self, braintree_id):
+        """
+        Drops a Braintree transaction from the cache, e.g. once it was changed.
+        """
+        self.braintree_transactions.delete(braintree_id)
+
+    def _find_refund_id(self, braintree_id):
+        """
+        :return: The id of the latest refund of a Braintree transaction, or None.
+        """
+        result_transaction = self.find_braintree_transaction(braintree_id, use_cache=False)
+        refund_ids = getattr(result_transaction, 'refund_ids', None)
+
+        return refund_ids[-1] if refund_ids else None
+
+    def _refund_transaction(self, transaction):
+        """
+        :return: A (outcome, details) pair, the outcome being one of RefundReport's.
+        """
+        if transaction.payment_processor != self.name:
+            return RefundReport.SKIPPED, {'reason': 'Not a transaction of this processor.'}
+
+        braintree_id = (transaction.data or {}).get('braintree_id')
+        if not braintree_id:
+            return RefundReport.SKIPPED, {'reason': 'The transaction has no braintree_id.'}
+
+        # refunds of the same transaction, from any process, are made one at a time
+        lock_key = 'silver_braintree:refund:{}:{}'.format(self.name, braintree_id)
+        if not cache.add(lock_key, True, self.refund_lock_timeout):
+            return RefundReport.SKIPPED, {'reason': 'The transaction is being refunded.'}
+
+        try:
+            with self._measure_step('persistence'):
+                transaction.refresh_from_db()
+
+            if transaction.state == transaction.States.Refunded:
+                return RefundReport.ALREADY_REFUNDED, {
+                    'refund_id': transaction.data.get('refund_id')
+                }
+
+            if transaction.state != transaction.States.Settled:
+                return RefundReport.SKIPPED, {
+                    'reason': 'Only settled transactions can be refunded.'
+                }
+
+            refund_id = None
+            outcome = RefundReport.REFUNDED
+
+            if transaction.data.get('refund_requested_at'):
+                # an earlier refund may have been made without its response being received
+                refund_id = self._find_refund_id(braintree_id)
+                outcome = RefundReport.ALREADY_REFUNDED
+
+            if refund_id is None:
+                transaction.data['refund_requested_at'] = datetime.utcnow().isoformat()
+                self._save(transaction)
+
+                result = self._call_gateway('transaction.refund',
+                                            self.gateway.transaction.refund, braintree_id)
+                self.invalidate_braintree_transaction(braintree_id)
+
+                if result.is_success:
+                    refund_id = result.transaction.id
+                    outcome = RefundReport.REFUNDED
+                else:
+                    validation_errors = [error.code for error in result.errors.deep_errors]
+
+                    already_refunded = braintree.ErrorCodes.Transaction.HasAlreadyBeenRefunded
+                    if already_refunded in validation_errors:
+                        refund_id = self._find_refund_id(braintree_id)
+                        outcome = RefundReport.ALREADY_REFUNDED
+
+                    if refund_id is None:
+                        logger.warning('Couldn\'t refund Braintree transaction: %s', {
+                            'message': result.message,
+                            'errors': validation_errors,
+                            'braintree_id': braintree_id,
+                            'transaction_id': transaction.id
+                        })
+
+                        transaction.data['refund_error_codes'] = validation_errors
+                        self._save(transaction)
+
+                        return RefundReport.FAILED, {'errors': validation_errors,
+                                                     'message': result.message}
+
+            transaction.data['refund_id'] = refund_id
+            transaction.data.pop('refund_error_codes', None)
+            with self._measure_step('transition'):
+                transaction.refund(refund_reason='Refunded through Braintree.')
+            self._save(transaction)
+
+            return outcome, {'refund_id': refund_id}
+        finally:
+            cache.delete(lock_key)
 
+    @instrumented('refund_transaction')
+    def refund_transaction(self, transaction, payment_method=None, report=None):
+        """
+        :param transaction: A Silver transaction with a Braintree payment method, in Settled
+                            state.
+        :param payment_method: Must be the transaction's payment method, if given; Braintree
+                               only refunds to the charged payment method.
+        :param report: An optional RefundReport, to which the outcome is added.
+        :return: True if the transaction was refunded, now or before, False otherwise.
+        :description: Refunds the whole amount of the Braintree transaction and moves the
+                      Silver transaction to Refunded. A transaction is only refunded once: the
+                      refund is locked through the Django cache and, when a previous refund
+                      request got no response, Braintree is checked for an existing refund
+                      before making another.
+        """
+        if payment_method is not None and payment_method != transaction.payment_method:
+            outcome, details = RefundReport.SKIPPED, {
+                'reason': 'Braintree only refunds to the charged payment method.'
+            }
+        else:
+            outcome, details = self._refund_transaction(transaction)
+
+        if report is not None:
+            report.add_result(outcome, transaction, **details)
+
+        return outcome in [RefundReport.REFUNDED, RefundReport.ALREADY_REFUNDED]
+
+    def refund_transactions(self, transactions, max_workers=None, cancel_event=None,
+                            report=None):
+        """
+        :param transactions: An iterable of Silver transactions with Braintree payment methods,
+                             in Settled state.
+        :param max_workers: The maximum number of concurrent refunds; defaults to the
+                            max_refund_workers setup option.
+        :param cancel_event: An optional threading.Event. Once set, the refunds that are in
+                             progress are completed, but no other refund is started.
+        :param report: An optional RefundReport to be filled.
+        :return: The RefundReport.
+        :description: Refunds the transactions concurrently. Each refund is recorded on its
+                      transaction as soon as it's made, so refunding the same transactions
+                      again after an interruption only refunds the ones left, and reports the
+                      others as already refunded.
+        """
+        if report is None:
+            report = RefundReport()
+
+        transactions = list(transactions)
+
+        def refund(transaction):
+            try:
+                return self.refund_transaction(transaction, report=report)
+            except Exception as e:
+                report.add_result(report.FAILED, transaction, exception=str(e))
+                raise
+
+        results = run_in_lanes(
+            transactions, refund,
+            lane_key=lambda transaction: transaction.id,
+            max_workers=max_workers or self.max_refund_workers,
+            cancel_event=cancel_event,
+            thread_name_prefix='braintree-refund'
+        )
+
+        for transaction, result in zip(transactions, results):
+            if result is None:
+                report.add_result(report.CANCELED, transaction)
+
+        return report
+
+    @instrumented('void_transaction')
     def void_transaction(self, transaction, payment_method=None):
-        pass
+        """
+        :param transaction: A Silver transaction with a Braintree payment method, in Pending
+                            state.
+        :param payment_method: Must be the transaction's payment method, if given.
+        :return: True if the Braintree transaction was voided, now or before, False otherwise.
+        :description: Voids the authorized or submitted for settlement Braintree transaction and
+                      cancels the Silver transaction.
+        """
+        if payment_method is not None and payment_method != transaction.payment_method:
+            return False
+
+        if transaction.payment_processor != self.name:
+            return False
+
+        if transaction.state != transaction.States.Pending:
+            return False
+
+        if not transaction.data.get('braintree_id'):
+            if not self.recover_lost_transaction_id(transaction):
+                return False
+
+        braintree_id = transaction.data['braintree_id']
+
+        result = self._call_gateway('transaction.void', self.gateway.transaction.void,
+                                    braintree_id)
+        self.invalidate_braintree_transaction(braintree_id)
+        if result.is_success:
+            result_transaction = result.transaction
+        else:
+            validation_errors = [error.code for error in result.errors.deep_errors]
+            logger.warning('Couldn\'t void Braintree transaction: %s', {
+                'message': result.message,
+                'errors': validation_errors,
+                'braintree_id': braintree_id,
+                'transaction_id': transaction.id
+            })
+
+            # the Braintree transaction may have been voided already
+            result_transaction = None
+            if braintree.ErrorCodes.Transaction.CannotBeVoided in validation_errors:
+                result_transaction = self.find_braintree_transaction(braintree_id,
+                                                                     use_cache=False)
+
+            if (result_transaction is None or
+                    result_transaction.status != braintree.Transaction.Status.Voided):
+                transaction.data['void_error_codes'] = validation_errors
+                self._save(transaction)
+
+                return False
+
+        try:
+            self._update_transaction_status(transaction, result_transaction)
+        except TransitionNotAllowed:
+            return False
+
+        return transaction.state == transaction.States.Canceled
 
     def _update_payment_method(self, payment_method, result_details,
                                instrument_type):
@@ -89,8 +748,11 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         :param instrument_type: The type of the instrument (payment method);
                                 see BraintreePaymentMethod.Types.
         :description: Updates a given payment method's data with data from a
-                      braintreeSDK result payment method.
+                      braintreeSDK result payment method. The payment method is only
+                      saved if it changed.
         """
+        unit_of_work = UnitOfWork(payment_method)
+
         payment_method_details = {
             'type': instrument_type,
             'image_url': result_details.image_url,
@@ -109,17 +771,22 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
         if self.is_payment_method_recurring(payment_method):
             if result_details.token:
-                payment_method.token = result_details.token
+                # encrypting the same token again would still change the data
+                if payment_method.token != result_details.token:
+                    payment_method.token = result_details.token
                 payment_method.data.pop('nonce', None)
                 payment_method.verified = True
 
-        payment_method.save()
+        self._save(payment_method, unit_of_work)
 
-    def _update_transaction_status(self, transaction, result_transaction):
+    def _update_transaction_status(self, transaction, result_transaction,
+                                   unit_of_work=None):
         """
         :param transaction: A Silver transaction with a Braintree payment method.
         :param result_transaction: A transaction from a braintreeSDK
                                    result(response).
+        :param unit_of_work: An optional UnitOfWork tracking the transaction; if given,
+                             only the transaction's changed fields are saved.
         :description: Updates a given transaction's data with data from a
                       braintreeSDK result payment method.
         :returns True if transaction is on the happy path, False otherwise.
@@ -135,52 +802,119 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
             'braintree_id': result_transaction.id
         })
 
-        target_state = None
+        target_state = _get_status_targets().get(status)
         try:
-            if status in [braintree.Transaction.Status.AuthorizationExpired,
-                          braintree.Transaction.Status.SettlementDeclined,
-                          braintree.Transaction.Status.Failed,
-                          braintree.Transaction.Status.GatewayRejected,
-                          braintree.Transaction.Status.ProcessorDeclined]:
-                target_state = transaction.States.Failed
-                if transaction.state != target_state:
-                    fail_code = self._get_silver_fail_code(result_transaction)
-                    fail_reason = self._get_braintree_transaction_fail_code(result_transaction)
-                    transaction.fail(fail_code=fail_code, fail_reason=fail_reason)
-                    return False
-
-            elif status == braintree.Transaction.Status.Voided:
-                target_state = transaction.States.Canceled
-                if transaction.state != target_state:
-                    transaction.cancel()
-                    return False
-
-            elif status in [braintree.Transaction.Status.Settling,
-                            braintree.Transaction.Status.SettlementPending,
-                            braintree.Transaction.Status.Settled]:
-                target_state = transaction.States.Settled
-                if transaction.state != target_state:
-                    transaction.settle()
-                    return True
-            else:
+            if target_state is None:
                 return True
+
+            if transaction.state != target_state:
+                return self._transition(transaction, result_transaction, target_state)
         except TransitionNotAllowed as e:
-            logger.warning('Braintree Transaction couldn\'t transition locally: '
-                           '%s' % {
-                               'initial_state': transaction.state,
-                               'target_state': target_state,
-                               'transaction_id': transaction.id,
-                               'transaction_uuid': transaction.uuid
-                           })
+            self._log_transition_not_allowed(transaction, target_state)
             raise e
         finally:
-            transaction.save()
+            self._save(transaction, unit_of_work)
+
+    def _transition(self, transaction, result_transaction, target_state):
+        """
+        :return: True if the transaction is on the happy path after the transition,
+                 False otherwise.
+        :raises: TransitionNotAllowed if the transaction can't reach the target state.
+        """
+        if target_state == transaction.States.Failed:
+            fail_code = self._get_silver_fail_code(result_transaction)
+            fail_reason = self._get_braintree_transaction_fail_code(result_transaction)
+            with self._measure_step('transition'):
+                transaction.fail(fail_code=fail_code, fail_reason=fail_reason)
+            return False
+
+        with self._measure_step('transition'):
+            if target_state == transaction.States.Canceled:
+                transaction.cancel()
+                return False
+
+            transaction.settle()
+            return True
+
+    def _log_transition_not_allowed(self, transaction, target_state):
+        logger.warning('Braintree Transaction couldn\'t transition locally: '
+                       '%s' % {
+                           'initial_state': transaction.state,
+                           'target_state': target_state,
+                           'transaction_id': transaction.id,
+                           'transaction_uuid': transaction.uuid
+                       })
+
+    def _apply_transaction_statuses(self, updates):
+        """
+        :param updates: An iterable of (Silver transaction, braintreeSDK transaction) pairs.
+        :return: A dict mapping each transaction's id to True if the transaction is on the
+                 happy path, False otherwise (including when it couldn't transition).
+        :description: Bulk version of _update_transaction_status. Each transaction is
+                      transitioned through its FSM, then the changed transactions are written
+                      with a bulk update per reached state, within a database transaction.
+                      post_save is sent for the transitioned transactions, as Silver relies on
+                      it to update their documents; transactions which didn't change aren't
+                      written at all.
+        """
+        status_targets = _get_status_targets()
+        outcomes = {}
+        changed_transactions = defaultdict(list)
+
+        for transaction, result_transaction in updates:
+            initial_state = transaction.state
+            data = dict(transaction.data or {}, status=result_transaction.status,
+                        braintree_id=result_transaction.id)
+            changed = (transaction.external_reference != result_transaction.id or
+                       transaction.data != data)
+
+            transaction.external_reference = result_transaction.id
+            transaction.data = data
+
+            target_state = status_targets.get(result_transaction.status)
+            if target_state is None:
+                outcomes[transaction.id] = True
+            elif transaction.state == target_state:
+                outcomes[transaction.id] = False
+            else:
+                try:
+                    outcomes[transaction.id] = self._transition(
+                        transaction, result_transaction, target_state
+                    )
+                except TransitionNotAllowed:
+                    self._log_transition_not_allowed(transaction, target_state)
+                    outcomes[transaction.id] = False
+
+            if transaction.state != initial_state:
+                changed_transactions[transaction.state].append(transaction)
+            elif changed:
+                changed_transactions[None].append(transaction)
+
+        if changed_transactions:
+            with db_transaction.atomic(), self._measure_step('persistence'):
+                for state, transactions in changed_transactions.items():
+                    bulk_save(Transaction, transactions,
+                              STATUS_UPDATE_FIELDS + TRANSITION_FIELDS.get(state, []),
+                              send_post_save=state is not None)
+
+        return outcomes
+
+    def _update_customer(self, customer, result_details, customer_data=None):
+        """
+        :param customer: A Silver customer.
+        :param result_details: The customer details from a braintreeSDK result(response).
+        :param customer_data: The customer's CustomerData, if it was already loaded.
+        :description: Stores the Braintree customer id of a newly vaulted customer.
+        """
+        if customer_data is None:
+            customer_data = self._get_customer_data(customer)
 
-    def _update_customer(self, customer, result_details):
-        customer_data = CustomerData.objects.get_or_create(customer=customer)[0]
         if 'id' not in customer_data:
             customer_data['id'] = result_details.id
-            customer_data.save()
+            self._save(customer_data)
+
+            self.client_tokens.delete(self._get_client_token_cache_key(customer, None))
+            self.client_tokens.delete(result_details.id)
 
     def _get_errors(self, result):
         return [
@@ -192,13 +926,14 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
                 braintree.Transaction.Status.ProcessorDeclined,
                 braintree.Transaction.Status.AuthorizationExpired
         ):
-            return result_transaction.processor_response_code,
+            return getattr(result_transaction, 'processor_response_code', None),
 
         elif result_transaction.status in (
                 braintree.Transaction.Status.SettlementDeclined,
                 braintree.Transaction.Status.SettlementFailed
         ):
-            return result_transaction.processor_settlement_response_code,
+            # webhook notifications don't always include the settlement response code
+            return getattr(result_transaction, 'processor_settlement_response_code', None),
 
     def _get_silver_fail_code(self, result_transaction):
         braintree_fail_code = self._get_braintree_transaction_fail_code(result_transaction)
@@ -233,6 +968,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
         return 'default'
 
+    @instrumented('charge_transaction')
     def _charge_transaction(self, transaction):
         """
         :param transaction: The Silver transaction to be charged. Must have a usable Braintree
@@ -244,7 +980,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         if payment_method.canceled:
             try:
                 transaction.fail(fail_reason='Payment method was canceled.')
-                transaction.save()
+                self._save(transaction)
             finally:
                 return False
 
@@ -253,13 +989,17 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
             'submit_for_settlement': True,
         }
 
-        if payment_method.token:
-            payload = {'payment_method_token': payment_method.token}
-        elif payment_method.nonce:
+        with self._measure_step('decryption'):
+            token = payment_method.token
+            nonce = None if token else payment_method.nonce
+
+        if token:
+            payload = {'payment_method_token': token}
+        elif nonce:
             options.update({
                 "store_in_vault": self.is_payment_method_recurring(payment_method)
             })
-            payload = {'payment_method_nonce': payment_method.nonce}
+            payload = {'payment_method_nonce': nonce}
         else:
             logger.warning('Token or nonce not found when charging '
                            'BraintreePaymentMethod: %s', {
@@ -268,12 +1008,14 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
             try:
                 transaction.fail(fail_reason='Payment method has no token or nonce.')
-                transaction.save()
+                self._save(transaction)
             finally:
                 return False
 
         payload.update({
             'amount': transaction.amount,
+            # identifies the Braintree transaction in case its id gets lost
+            'order_id': str(transaction.uuid),
             'billing': {
                 'postal_code': payment_method.data.get('postal_code')
             },
@@ -283,7 +1025,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         })
 
         customer = transaction.customer
-        customer_data = CustomerData.objects.get_or_create(customer=customer)[0]
+        customer_data = self._get_customer_data(customer)
 
         if 'id' in customer_data:
             payload.update({
@@ -299,23 +1041,28 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
         # send transaction request
         transaction.data['requested_at'] = datetime.utcnow().isoformat()
-        transaction.save()
+        transaction.data['order_id'] = payload['order_id']
+        self._save(transaction)
+
+        # from here on, only the changed fields are written
+        unit_of_work = UnitOfWork(transaction)
 
         try:
-            result = braintree.Transaction.sale(payload)
+            result = self._call_gateway('transaction.sale', self.gateway.transaction.sale,
+                                        payload)
 
             # handle response
             if not result.is_success or not result.transaction:
-                errors = self._get_errors(result)
+                validation_errors = self._get_errors(result)
                 logger.warning('Couldn\'t charge Braintree transaction.: %s', {
                     'message': result.message,
-                    'errors': errors,
+                    'errors': validation_errors,
                     'customer_id': customer.id,
-                    'card_verification': (result.credit_card_verification if errors
-                                          else None)
+                    'card_verification': (result.credit_card_verification
+                                          if validation_errors else None)
                 })
 
-                transaction.data['error_codes'] = errors
+                transaction.data['error_codes'] = validation_errors
 
                 if result.transaction:
                     transaction.data['response_code'] = self._get_braintree_transaction_fail_code(
@@ -323,13 +1070,14 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
                     )
                 fail_code = (self._get_silver_fail_code(result.transaction) if result.transaction
                              else 'default')
-                transaction.fail(fail_code=fail_code, fail_reason=errors)
+                with self._measure_step('transition'):
+                    transaction.fail(fail_code=fail_code, fail_reason=validation_errors)
 
                 return False
         finally:
-            transaction.save()
+            self._save(transaction, unit_of_work)
 
-        self._update_customer(customer, result.transaction.customer_details)
+        self._update_customer(customer, result.transaction.customer_details, customer_data)
 
         instrument_type = result.transaction.payment_instrument_type
 
@@ -342,7 +1090,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
             try:
                 transaction.fail(fail_code='invalid_payment_method',
                                  fail_reason='Not a supported instrument_type')
-                transaction.save()
+                self._save(transaction, unit_of_work)
             finally:
                 return False
 
@@ -352,7 +1100,8 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
         try:
             return self._update_transaction_status(transaction,
-                                                   result.transaction)
+                                                   result.transaction,
+                                                   unit_of_work)
         except TransitionNotAllowed:
             # ToDo handle this
             return False
@@ -363,8 +1112,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         :return: True if the transaction was successfully sent to processing, False otherwise.
         """
 
-        payment_processor = get_instance(transaction.payment_processor)
-        if not payment_processor == self:
+        if transaction.payment_processor != self.name:
             return False
 
         if transaction.state != transaction.States.Pending:
@@ -372,6 +1120,89 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
         return self._charge_transaction(transaction)
 
+    def execute_transactions(self, transactions, max_workers=None, cancel_event=None):
+        """
+        :param transactions: An iterable of Silver transactions with Braintree payment methods,
+                             in Pending state.
+        :param max_workers: The maximum number of concurrent charges; defaults to the
+                            max_charge_workers setup option.
+        :param cancel_event: An optional threading.Event. Once set, the charges that are in
+                             progress are completed, but no other charge is started.
+        :return: A list of (transaction, result) pairs, in the given order. The result is the
+                 one of execute_transaction, or None if the transaction wasn't charged
+                 because of a cancel.
+        :description: Executes the transactions concurrently. The transactions sharing a payment
+                      method are charged one after another, in the given order.
+        """
+        transactions = list(transactions)
+
+        results = run_in_lanes(
+            transactions, self.execute_transaction,
+            lane_key=lambda transaction: transaction.payment_method_id,
+            max_workers=max_workers or self.max_charge_workers,
+            cancel_event=cancel_event,
+            thread_name_prefix='braintree-charge'
+        )
+
+        return list(zip(transactions, results))
+
+    def _get_recovery_window(self, transaction):
+        """
+        :return: The (naive, UTC) datetime interval in which the Braintree transaction of a
+                 Silver transaction must have been created, or None if the transaction was
+                 never requested from Braintree.
+        """
+        if not transaction.data.get('requested_at'):
+            logger.warning('Found lost Braintree transaction with no requested_at: %s', {
+                'transaction_id': transaction.id,
+                'transaction_uuid': transaction.uuid
+            })
+            return None
+
+        requested_at = dateutil.parser.parse(transaction.data['requested_at'])
+
+        if transaction.data.get('order_id'):
+            window_end = requested_at + timedelta(seconds=61)
+        else:
+            window_end = transaction.created_at + timedelta(seconds=61)
+
+        return (
+            _as_naive_utc(requested_at - timedelta(seconds=1)),
+            _as_naive_utc(window_end)
+        )
+
+    def _get_result_transaction_token(self, result_transaction):
+        for details in ('credit_card_details', 'paypal_details'):
+            token = getattr(getattr(result_transaction, details, None), 'token', None)
+            if token:
+                return token
+
+    def _get_tracked_braintree_ids(self, braintree_ids):
+        return set(
+            Transaction.objects.filter(
+                external_reference__in=braintree_ids
+            ).values_list('external_reference', flat=True)
+        )
+
+    def _apply_recovered_transaction_id(self, transaction, braintree_ids):
+        # there was a single match
+        if len(braintree_ids) == 1:
+            transaction.data['braintree_id'] = braintree_ids[0]
+            transaction.external_reference = braintree_ids[0]
+
+            return True
+
+        # there were no transactions that could match our transaction
+        if not braintree_ids:
+            transaction.fail(
+                fail_reason="The transaction request didn't reach Braintree."
+            )
+            self._save(transaction)
+
+        # if there are 2 or more potential matches, no action is taken
+        return False
+
+    @instrumented('recover_lost_transaction_id')
     def recover_lost_transaction_id(self, transaction):
         """
         :param transaction: A Silver transaction with a Braintree payment method.
@@ -380,51 +1211,180 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         if transaction.data.get('braintree_id'):
             return True
 
-        search_result = braintree.Transaction.search(
+        order_id = transaction.data.get('order_id')
+        if order_id:
+            search_result = self._call_gateway(
+                'transaction.search', self.gateway.transaction.search,
+                braintree.TransactionSearch.order_id.is_equal(order_id), idempotent=True
+            )
+
+            return self._apply_recovered_transaction_id(transaction, list(search_result.ids))
+
+        # transactions charged without an order_id are matched heuristically
+        window = self._get_recovery_window(transaction)
+        if window is None:
+            return False
+
+        window_start, window_end = window
+
+        search_result = self._call_gateway(
+            'transaction.search', self.gateway.transaction.search,
             braintree.TransactionSearch.amount.is_equal(transaction.amount),
             braintree.TransactionSearch.payment_method_token.is_equal(
                 transaction.payment_method.token
             ),
-            braintree.TransactionSearch.created_at.between(
-                dateutil.parser.parse(transaction.data['requested_at']) - timedelta(seconds=1),
-                transaction.created_at + timedelta(seconds=61)
-            )
+            braintree.TransactionSearch.created_at.between(window_start, window_end),
+            idempotent=True
         )
 
-        transaction_list = list(search_result.items)
+        # the ids of the matches are enough, so their details are not fetched
+        braintree_ids = list(search_result.ids)
 
         # get rid of transactions that are already tracked before trying to find a match
-        if len(transaction_list) > 1:
-            transaction_list = [
-                transaction for transaction in transaction_list
-                if not Transaction.objects.filter(external_reference=transaction.id).exists()
+        if len(braintree_ids) > 1:
+            tracked_braintree_ids = self._get_tracked_braintree_ids(braintree_ids)
+            braintree_ids = [
+                braintree_id for braintree_id in braintree_ids
+                if braintree_id not in tracked_braintree_ids
             ]
 
-        # there was a single match
-        if len(transaction_list) == 1:
-            transaction.data['braintree_id'] = transaction_list[0].id
-            transaction.external_reference = transaction_list[0].id
+        return self._apply_recovered_transaction_id(transaction, braintree_ids)
 
-            return True
+    def recover_lost_transaction_ids(self, transactions):
+        """
+        :param transactions: An iterable of Silver transactions with Braintree payment methods.
+        :return: A dict mapping each transaction's id to True if its Braintree transaction ID was
+                 recovered, False otherwise.
+        :description: Bulk version of recover_lost_transaction_id. The overlapping search
+                      windows of the transactions of a payment method token are merged,
+                      spanning at most recovery_window_limit, and a single Braintree search is
+                      made for each merged window.
+        """
+        outcomes = {}
+        # Braintree can't search for several payment method tokens at once
+        windows = defaultdict(list)
+
+        for transaction in transactions:
+            if transaction.data.get('braintree_id'):
+                outcomes[transaction.id] = True
+                continue
+
+            window = self._get_recovery_window(transaction)
+            if window is None:
+                outcomes[transaction.id] = False
+                continue
+
+            windows[transaction.payment_method.token].append(window + (transaction, ))
+
+        for token, token_windows in windows.items():
+            merged_windows = []
+            for window in sorted(token_windows, key=lambda window: window[0]):
+                if (merged_windows and window[0] <= merged_windows[-1]['end'] and
+                        window[1] - merged_windows[-1]['start'] <= self.recovery_window_limit):
+                    merged_windows[-1]['end'] = max(merged_windows[-1]['end'], window[1])
+                    merged_windows[-1]['windows'].append(window)
+                else:
+                    merged_windows.append({
+                        'start': window[0], 'end': window[1], 'windows': [window]
+                    })
+
+            for merged_window in merged_windows:
+                outcomes.update(self._recover_merged_window(merged_window['windows'], token))
+
+        return outcomes
+
+    def _recover_merged_window(self, windows, token=None):
+        """
+        :param windows: A list of (window_start, window_end, transaction) tuples, sorted by
+                        window_start, whose windows overlap.
+        :param token: The payment method token of the windows' transactions, if they have one.
+        :return: A dict mapping each transaction's id to True if its Braintree transaction ID was
+                 recovered, False otherwise.
+        :description: Searches the Braintree transactions created within the windows. A search
+                      reaching Braintree's result limit may be truncated, so its windows are
+                      split in halves instead, down to recover_lost_transaction_id's narrower
+                      search for a single transaction.
+        """
+        outcomes = {}
+        amounts = [transaction.amount for _, _, transaction in windows]
 
-        # there were no transactions that could match our transaction
-        if not transaction_list:
-            transaction.fail(
-                fail_reason="The transaction request didn't reach Braintree."
+        criteria = [
+            braintree.TransactionSearch.amount.between(min(amounts), max(amounts)),
+            braintree.TransactionSearch.created_at.between(
+                windows[0][0], max(window_end for _, window_end, _ in windows)
+            ),
+        ]
+        if token:
+            criteria.append(braintree.TransactionSearch.payment_method_token.is_equal(token))
+
+        search_result = self._call_gateway(
+            'transaction.search', self.gateway.transaction.search, *criteria, idempotent=True
+        )
+
+        if search_result.maximum_size >= self.transaction_search_limit:
+            if len(windows) == 1:
+                transaction = windows[0][2]
+                return {transaction.id: self.recover_lost_transaction_id(transaction)}
+
+            middle = len(windows) // 2
+
+            outcomes.update(self._recover_merged_window(windows[:middle], token))
+            outcomes.update(self._recover_merged_window(windows[middle:], token))
+            return outcomes
+
+        candidates = [
+            (result_transaction.id,
+             result_transaction.amount,
+             self._get_result_transaction_token(result_transaction),
+             _as_naive_utc(result_transaction.created_at),
+             getattr(result_transaction, 'order_id', None))
+            for result_transaction in self._iter_search_result(search_result)
+        ]
+
+        tracked_braintree_ids = None
+        for window_start, window_end, transaction in windows:
+            order_id = transaction.data.get('order_id')
+            if order_id:
+                outcomes[transaction.id] = self._apply_recovered_transaction_id(
+                    transaction, [candidate[0] for candidate in candidates
+                                  if candidate[4] == order_id]
+                )
+                continue
+
+            token = transaction.payment_method.token
+            braintree_ids = [
+                braintree_id for braintree_id, amount, candidate_token, created_at, _
+                in candidates
+                if (amount == transaction.amount and candidate_token == token and
+                    window_start <= created_at <= window_end)
+            ]
+
+            # get rid of transactions that are already tracked before trying to find a match
+            if len(braintree_ids) > 1:
+                if tracked_braintree_ids is None:
+                    tracked_braintree_ids = self._get_tracked_braintree_ids(
+                        [candidate[0] for candidate in candidates]
+                    )
+
+                braintree_ids = [
+                    braintree_id for braintree_id in braintree_ids
+                    if braintree_id not in tracked_braintree_ids
+                ]
+
+            outcomes[transaction.id] = self._apply_recovered_transaction_id(
+                transaction, braintree_ids
             )
-            transaction.save()
 
-        # if there are 2 or more potential matches, no action is taken
-        return False
+        return outcomes
 
+    @instrumented('fetch_transaction_status')
     def fetch_transaction_status(self, transaction):
         """
         :param transaction: A Silver transaction with a Braintree payment method, in Pending state.
         :return: True if the transaction status was updated, False otherwise.
         """
 
-        payment_processor = get_instance(transaction.payment_processor)
-        if not payment_processor == self:
+        if transaction.payment_processor != self.name:
             return False
 
         if transaction.state != transaction.States.Pending:
@@ -441,7 +1401,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
                 return False
 
         try:
-            result_transaction = braintree.Transaction.find(
+            result_transaction = self.find_braintree_transaction(
                 transaction.data['braintree_id']
             )
             return self._update_transaction_status(transaction,
@@ -458,6 +1418,498 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
             return False
             # ToDo handle this
 
+    def fetch_transactions_status(self, transactions):
+        """
+        :param transactions: An iterable (or a queryset) of Silver transactions with Braintree
+                             payment methods, in Pending state.
+        :return: A dict mapping each transaction's id to True if its status was updated,
+                 False otherwise.
+        :description: Bulk version of fetch_transaction_status. The Braintree transactions are
+                      fetched by id, with a single request for each page of search_page_size
+                      transactions, and the statuses of each chunk of status_search_chunk_size
+                      transactions are applied through _apply_transaction_statuses.
+        """
+        if isinstance(transactions, QuerySet):
+            transactions = transactions.select_related('payment_method').iterator(
+                chunk_size=self.status_search_chunk_size
+            )
+
+        outcomes = {}
+
+        for chunk in _chunked(transactions, self.status_search_chunk_size):
+            tracked_transactions = {}
+            lost_transactions = []
+
+            for transaction in chunk:
+                if (transaction.payment_processor != self.name or
+                        transaction.state != transaction.States.Pending):
+                    outcomes[transaction.id] = False
+                    continue
+
+                if not transaction.data.get('braintree_id'):
+                    lost_transactions.append(transaction)
+                    continue
+
+                tracked_transactions.setdefault(
+                    transaction.data['braintree_id'], []
+                ).append(transaction)
+
+            recovered = self.recover_lost_transaction_ids(lost_transactions)
+            for transaction in lost_transactions:
+                if not recovered[transaction.id]:
+                    logger.warning('Found pending Braintree transaction with no '
+                                   'braintree_id: %s', {
+                                        'transaction_id': transaction.id,
+                                        'transaction_uuid': transaction.uuid
+                                   })
+                    outcomes[transaction.id] = False
+                    continue
+
+                tracked_transactions.setdefault(
+                    transaction.data['braintree_id'], []
+                ).append(transaction)
+
+            if not tracked_transactions:
+                continue
+
+            updates = []
+            for braintree_ids in _chunked(list(tracked_transactions), self.search_page_size):
+                for result_transaction in self._fetch_transactions(braintree_ids):
+                    self._cache_braintree_transaction(result_transaction)
+
+                    for transaction in tracked_transactions.pop(result_transaction.id, []):
+                        updates.append((transaction, result_transaction))
+
+            outcomes.update(self._apply_transaction_statuses(updates))
+
+            for braintree_id, transactions_left in tracked_transactions.items():
+                for transaction in transactions_left:
+                    logger.warning('Couldn\'t find Braintree transaction from '
+                                   'Braintree %s', {
+                                        'braintree_id': braintree_id,
+                                        'transaction_id': transaction.id,
+                                        'transaction_uuid': transaction.uuid
+                                   })
+                    outcomes[transaction.id] = False
+
+        return outcomes
+
+    @instrumented('poll_pending_transactions')
+    def poll_pending_transactions(self, shard=0, shards=1, batch_size=None):
+        """
+        :param shard: The polled shard, from 0 to shards - 1.
+        :param shards: In how many shards the pending transactions are split, by their id.
+        :param batch_size: How many transactions are claimed at once; defaults to the
+                           poll_batch_size class attribute.
+        :return: A Counter of the polled and of the transitioned transactions.
+        :description: Fetches the statuses of the processor's pending transactions of a shard,
+                      batch by batch, in the order of their ids, so that each transaction is
+                      polled once. Where the database supports it, each batch is claimed with
+                      SELECT ... FOR UPDATE SKIP LOCKED until its statuses are applied, so that
+                      pollers running concurrently skip the transactions being polled.
+        """
+        batch_size = batch_size or self.poll_batch_size
+        features = connections[router.db_for_write(Transaction)].features
+
+        pending_transactions = Transaction.objects.filter(
+            state=Transaction.States.Pending, payment_method__payment_processor=self.name
+        ).select_related('payment_method').order_by('id')
+        if shards > 1:
+            pending_transactions = pending_transactions.annotate(
+                poll_shard=Mod('id', shards)
+            ).filter(poll_shard=shard)
+
+        counts = Counter()
+        last_id = None
+
+        while True:
+            with db_transaction.atomic():
+                batch = pending_transactions
+                if last_id is not None:
+                    batch = batch.filter(id__gt=last_id)
+                if features.has_select_for_update_skip_locked:
+                    batch = batch.select_for_update(
+                        skip_locked=True,
+                        of=('self', ) if features.has_select_for_update_of else ()
+                    )
+
+                batch = list(batch[:batch_size])
+                if not batch:
+                    return counts
+
+                last_id = batch[-1].id
+                self.fetch_transactions_status(batch)
+
+            counts['polled'] += len(batch)
+            counts['transitioned'] += sum(
+                transaction.state != transaction.States.Pending for transaction in batch
+            )
+
+    def _iter_search_windows(self, start, end, duration):
+        """
+        :return: The (naive, UTC) consecutive time windows of the given duration covering
+                 [start, end), on whole seconds, like Braintree's search criteria.
+        """
+        start = _as_naive_utc(start).replace(microsecond=0)
+        end = _as_naive_utc(end)
+        if end.microsecond:
+            end = end.replace(microsecond=0) + timedelta(seconds=1)
+
+        while start < end:
+            window_end = min(start + duration, end)
+            yield start, window_end
+            start = window_end
+
+    def _search_transactions_between(self, field, start, end):
+        """
+        :param field: A TransactionSearch timestamp field, e.g. `settled_at`.
+        :return: A generator of the Braintree transactions having the field within [start, end).
+        :description: Windows whose search reaches Braintree's result limit are split in halves.
+                      The transactions are fetched page by page, while being iterated.
+        """
+        search_result = self._call_gateway(
+            'transaction.search', self.gateway.transaction.search,
+            getattr(braintree.TransactionSearch, field).between(
+                start, end - timedelta(seconds=1)
+            ),
+            idempotent=True
+        )
+
+        if (search_result.maximum_size >= self.transaction_search_limit and
+                end - start > timedelta(seconds=1)):
+            middle = start + timedelta(seconds=(end - start).total_seconds() // 2)
+
+            yield from self._search_transactions_between(field, start, middle)
+            yield from self._search_transactions_between(field, middle, end)
+            return
+
+        yield from self._iter_search_result(search_result)
+
+    def _get_matching_transactions(self, result_transactions):
+        """
+        :return: A dict mapping the Braintree transaction ids to their Silver transactions,
+                 matched by external_reference or, for the lost ones, by order_id.
+        """
+        matches = {}
+
+        for transaction in Transaction.objects.filter(
+            external_reference__in=[result_transaction.id
+                                    for result_transaction in result_transactions],
+            payment_method__payment_processor=self.name
+        ):
+            matches.setdefault(transaction.external_reference, []).append(transaction)
+
+        lost_braintree_ids = {}
+        for result_transaction in result_transactions:
+            if result_transaction.id in matches:
+                continue
+
+            try:
+                order_id = uuid.UUID(getattr(result_transaction, 'order_id', None) or '')
+            except ValueError:
+                continue
+
+            lost_braintree_ids[order_id] = result_transaction.id
+
+        if lost_braintree_ids:
+            for transaction in Transaction.objects.filter(
+                Q(external_reference__isnull=True) | Q(external_reference=''),
+                uuid__in=list(lost_braintree_ids),
+                payment_method__payment_processor=self.name
+            ):
+                matches.setdefault(
+                    lost_braintree_ids[transaction.uuid], []
+                ).append(transaction)
+
+        return matches
+
+    def _reconcile_batch(self, result_transactions, report):
+        matches = self._get_matching_transactions(result_transactions)
+        status_targets = _get_status_targets()
+        updates = []
+
+        for result_transaction in result_transactions:
+            report.count('searched')
+
+            transactions = matches.get(result_transaction.id)
+            if not transactions:
+                report.add_mismatch(report.UNKNOWN_TRANSACTION, result_transaction.id,
+                                    status=result_transaction.status)
+                continue
+
+            for transaction in transactions:
+                report.count('matched')
+
+                amount = Decimal(str(result_transaction.amount))
+                currency = result_transaction.currency_iso_code
+                if amount != transaction.amount or currency != transaction.currency:
+                    report.add_mismatch(report.AMOUNT_MISMATCH, result_transaction.id,
+                                        transaction, braintree_amount=amount,
+                                        braintree_currency=currency,
+                                        amount=transaction.amount,
+                                        currency=transaction.currency)
+                    continue
+
+                updates.append((transaction, result_transaction, transaction.state))
+
+        self._apply_transaction_statuses(
+            (transaction, result_transaction) for transaction, result_transaction, _ in updates
+        )
+
+        for transaction, result_transaction, initial_state in updates:
+            target_state = status_targets.get(result_transaction.status)
+            if target_state is not None and transaction.state != target_state:
+                report.add_mismatch(report.STATE_MISMATCH, result_transaction.id,
+                                    transaction, status=result_transaction.status,
+                                    state=transaction.state)
+            elif transaction.state != initial_state:
+                report.count('updated')
+
+    @instrumented('reconcile_settlements')
+    def reconcile_settlements(self, start, end, fields=('settled_at', ), report=None):
+        """
+        :param start: The beginning of the reconciled time range.
+        :param end: The (excluded) end of the reconciled time range.
+        :param fields: The TransactionSearch timestamp fields matched against the time range,
+                       e.g. `settled_at`, `voided_at` or `processor_declined_at`.
+        :param report: An optional ReconciliationReport to be filled.
+        :return: The ReconciliationReport.
+        :description: Applies the statuses of the Braintree transactions whose status changed
+                      within the time range to the matching Silver transactions. The Braintree
+                      transactions are streamed window by window and reconciled in batches,
+                      each batch within a database transaction. Transactions whose amounts
+                      differ are reported, but not updated.
+        """
+        if report is None:
+            report = ReconciliationReport()
+
+        result_transactions = (
+            result_transaction
+            for field in fields
+            for window_start, window_end in self._iter_search_windows(
+                start, end, self.reconciliation_window
+            )
+            for result_transaction in self._search_transactions_between(
+                field, window_start, window_end
+            )
+        )
+
+        for batch in _chunked(result_transactions, self.reconciliation_batch_size):
+            with db_transaction.atomic():
+                self._reconcile_batch(batch, report)
+
+        return report
+
+    def _import_transactions_between(self, start, end):
+        """
+        :return: A Counter of the searched Braintree transactions and of the matched and
+                 updated Silver transactions.
+        :description: Stores the ids and statuses of the Braintree transactions created within
+                      [start, end) on the matching Silver transactions, without transitioning
+                      them.
+        """
+        counts = Counter()
+        result_transactions = self._search_transactions_between('created_at', start, end)
+
+        for batch in _chunked(result_transactions, self.backfill_batch_size):
+            matches = self._get_matching_transactions(batch)
+            changed_transactions = []
+
+            for result_transaction in batch:
+                counts['searched'] += 1
+
+                for transaction in matches.get(result_transaction.id, []):
+                    counts['matched'] += 1
+
+                    data = dict(transaction.data or {}, braintree_id=result_transaction.id,
+                                status=result_transaction.status)
+                    if (transaction.external_reference == result_transaction.id and
+                            transaction.data == data):
+                        continue
+
+                    transaction.external_reference = result_transaction.id
+                    transaction.data = data
+                    changed_transactions.append(transaction)
+
+            if changed_transactions:
+                with self._measure_step('persistence'):
+                    counts['updated'] += bulk_save(Transaction, changed_transactions,
+                                                   STATUS_UPDATE_FIELDS)
+
+        return counts
+
+    @instrumented('backfill_transactions')
+    def backfill_transactions(self, start, end, max_workers=None, cancel_event=None):
+        """
+        :param start: The beginning of the imported time range.
+        :param end: The (excluded) end of the imported time range.
+        :param max_workers: The maximum number of time slices imported concurrently; defaults
+                            to the max_backfill_workers class attribute.
+        :param cancel_event: An optional threading.Event. Once set, the slices being imported
+                             are completed, but no other slice is started.
+        :return: A (BackfillCheckpoint, Counter) pair: the checkpoint of the backfill and the
+                 counts of the searched, matched and updated transactions and of the failed
+                 slices.
+        :description: Imports the ids and statuses of the Braintree transactions created within
+                      the time range into the matching Silver transactions, slice by slice.
+                      After each slice, the checkpoint's cursor is moved past the slices
+                      imported without gaps, so that an interrupted backfill of the same time
+                      range resumes from there.
+        """
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(
+            payment_processor=self.name, start=start, end=end, defaults={'cursor': start}
+        )
+
+        windows = list(self._iter_search_windows(checkpoint.cursor, end, self.backfill_window))
+        pending_windows = deque(windows)
+        imported_windows = set()
+        counts = Counter()
+        lock = threading.Lock()
+
+        def import_window(window):
+            window_counts = self._import_transactions_between(*window)
+
+            with lock:
+                counts.update(window_counts)
+                imported_windows.add(window)
+
+                cursor = None
+                while pending_windows and pending_windows[0] in imported_windows:
+                    cursor = pending_windows.popleft()[1]
+
+                if cursor is not None:
+                    checkpoint.cursor = timezone.make_aware(cursor, timezone.utc)
+                    with self._measure_step('persistence'):
+                        checkpoint.save(update_fields=['cursor', 'updated_at'])
+
+            return True
+
+        results = run_in_lanes(
+            windows, import_window,
+            lane_key=lambda window: window,
+            max_workers=max_workers or self.max_backfill_workers,
+            cancel_event=cancel_event,
+            thread_name_prefix='braintree-backfill'
+        )
+
+        failed_slices = results.count(False)
+        if failed_slices:
+            counts['failed_slices'] = failed_slices
+
+        return checkpoint, counts
+
+    def parse_webhook_notification(self, signature, payload):
+        return self.gateway.webhook_notification.parse(signature, payload)
+
+    def verify_webhook_challenge(self, challenge):
+        return self.gateway.webhook_notification.verify(challenge)
+
+    def process_webhook(self, signature, payload):
+        """
+        :param signature: The bt_signature received from Braintree.
+        :param payload: The bt_payload received from Braintree.
+        :return: True if a Silver transaction was updated, False otherwise.
+        :description: Verifies and handles a Braintree webhook notification. Redelivered
+                      notifications are only handled once.
+        :raises: braintree.exceptions.InvalidSignatureError for unverifiable payloads.
+        """
+        notification = self.parse_webhook_notification(signature, payload)
+
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+
+        deduplication_key = 'silver_braintree:webhook:{}:{}'.format(
+            self.name, hashlib.sha256(payload).hexdigest()
+        )
+        if not cache.add(deduplication_key, True, self.webhook_deduplication_timeout):
+            logger.info('Skipped redelivered Braintree webhook notification: %s', {
+                'kind': notification.kind,
+                'timestamp': notification.timestamp
+            })
+            return False
+
+        try:
+            return self.handle_webhook_notification(notification)
+        except Exception:
+            # allow Braintree's redelivery to retry the notification
+            cache.delete(deduplication_key)
+            raise
+
+    def _get_webhook_transactions(self, braintree_ids):
+        return Transaction.objects.filter(
+            external_reference__in=braintree_ids,
+            payment_method__payment_processor=self.name
+        )
+
+    def handle_webhook_notification(self, notification):
+        """
+        :param notification: A braintreeSDK WebhookNotification.
+        :return: True if a Silver transaction was updated, False otherwise.
+        :description: Applies the state changes described by a Braintree webhook notification to
+                      the matching Silver transactions.
+        """
+        kind = notification.kind
+        Kind = braintree.WebhookNotification.Kind
+
+        if kind in [Kind.TransactionSettled,
+                    Kind.TransactionSettlementDeclined,
+                    Kind.TransactionDisbursed]:
+            result_transaction = notification.transaction
+            self.invalidate_braintree_transaction(result_transaction.id)
+
+            updated = False
+            for transaction in self._get_webhook_transactions([result_transaction.id]):
+                try:
+                    self._update_transaction_status(transaction, result_transaction)
+                    updated = True
+                except TransitionNotAllowed:
+                    pass
+
+            return updated
+
+        elif kind in [Kind.Disbursement, Kind.DisbursementException]:
+            disbursement = notification.disbursement
+
+            for braintree_id in disbursement.transaction_ids:
+                self.invalidate_braintree_transaction(braintree_id)
+
+            transactions = self._get_webhook_transactions(disbursement.transaction_ids)
+            pending_transactions = []
+            for transaction in transactions:
+                transaction.data['disbursement_id'] = disbursement.id
+                self._save(transaction)
+
+                if transaction.state == transaction.States.Pending:
+                    pending_transactions.append(transaction)
+
+            # the disbursement doesn't carry the transactions' statuses
+            self.fetch_transactions_status(pending_transactions)
+
+            return bool(transactions)
+
+        elif kind in [Kind.DisputeOpened, Kind.DisputeLost, Kind.DisputeWon]:
+            dispute = notification.dispute
+
+            self.invalidate_braintree_transaction(dispute.transaction.id)
+
+            transactions = self._get_webhook_transactions([dispute.transaction.id])
+            for transaction in transactions:
+                transaction.data['dispute'] = {
+                    'id': dispute.id,
+                    'status': dispute.status,
+                    'reason': dispute.reason,
+                    'amount': dispute.amount_disputed,
+                }
+                self._save(transaction)
+
+            return bool(transactions)
+
+        logger.info('Ignored Braintree webhook notification: %s', {
+            'kind': kind,
+            'timestamp': notification.timestamp
+        })
+        return False
+
     def handle_transaction_response(self, transaction, request):
         payment_method_nonce = request.POST.get('payment_method_nonce')
 
@@ -465,7 +1917,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         if not payment_method_nonce:
             try:
                 transaction.fail(fail_reason='payment_method_nonce was not provided.')
-                transaction.save()
+                self._save(transaction)
             except TransitionNotAllowed:
                 pass
             finally:
@@ -474,7 +1926,7 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
         if payment_method.nonce:
             try:
                 transaction.fail(fail_reason='Payment method already has a nonce.')
-                transaction.save()
+                self._save(transaction)
             except TransitionNotAllowed:
                 pass
             finally:
@@ -487,15 +1939,15 @@ class BraintreeTriggeredBase(PaymentProcessorBase, TriggeredProcessorMixin):
 
         payment_method.nonce = payment_method_nonce
         payment_method.update_details(details)
-        payment_method.save()
+        self._save(payment_method)
 
         # manage the transaction
-        payment_processor = get_instance(payment_method.payment_processor)
+        payment_processor = get_payment_processor(payment_method.payment_processor)
 
         if not payment_processor.process_transaction(transaction):
             try:
                 transaction.fail()
-                transaction.save()
+                self._save(transaction)
             except TransitionNotAllowed:
                 pass
             finally:
@@ -0,0 +1,127 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from copy import deepcopy
+
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+
+# fields refreshed on every save, which must be written along with any other change
+AUTO_UPDATED_FIELDS = ('updated_at', )
+
+
+class UnitOfWork(object):
+    """
+    Tracks the changes made to model instances during an operation, so that saving them only
+    writes the fields which actually changed (and nothing at all if none did).
+
+    Changes made in place to mutable values, like JSON fields, are tracked as well.
+    """
+
+    def __init__(self, *instances):
+        self._snapshots = {}
+
+        for instance in instances:
+            self.track(instance)
+
+    def _get_fields(self, instance):
+        return [field for field in instance._meta.concrete_fields if not field.primary_key]
+
+    def track(self, instance):
+        """
+        Considers the current state of the instance as being the persisted one.
+        """
+        self._snapshots[id(instance)] = {
+            field.name: deepcopy(getattr(instance, field.attname))
+            for field in self._get_fields(instance)
+        }
+
+    def get_dirty_fields(self, instance):
+        snapshot = self._snapshots[id(instance)]
+
+        return [
+            field.name for field in self._get_fields(instance)
+            if field.name not in AUTO_UPDATED_FIELDS and
+            getattr(instance, field.attname) != snapshot[field.name]
+        ]
+
+    def save(self, instance):
+        """
+        :return: True if the instance had changes that were written, False otherwise.
+        """
+        if id(instance) not in self._snapshots or not instance.pk:
+            instance.save()
+            self.track(instance)
+
+            return True
+
+        dirty_fields = self.get_dirty_fields(instance)
+        if not dirty_fields:
+            return False
+
+        dirty_fields.extend(
+            field.name for field in self._get_fields(instance)
+            if field.name in AUTO_UPDATED_FIELDS
+        )
+
+        instance.save(update_fields=dirty_fields)
+        self.track(instance)
+
+        return True
+
+
+def bulk_save(model, instances, fields, send_post_save=False):
+    """
+    Writes the given fields of model instances through a single bulk_update.
+
+    Unlike Model.save, bulk_update neither refreshes the auto updated fields nor sends post_save.
+    The auto updated fields are refreshed here and written along with the given ones, and
+    post_save can be sent for each instance once all of them are written. Validation is skipped,
+    so the instances must be valid already.
+
+    :return: The number of written instances.
+    """
+    if not instances:
+        return 0
+
+    fields = list(fields)
+    auto_updated_fields = [
+        field.name for field in model._meta.concrete_fields
+        if field.name in AUTO_UPDATED_FIELDS
+    ]
+    fields.extend(field for field in auto_updated_fields if field not in fields)
+
+    now = timezone.now()
+    for instance in instances:
+        for field in auto_updated_fields:
+            setattr(instance, field, now)
+
+    model.objects.bulk_update(instances, fields)
+
+    for instance in instances:
+        # silver's AutoCleanModelMixin tracks the saved values, like Model.save would
+        if hasattr(instance, 'saved_state'):
+            current_state = instance.current_state
+            instance.initial_state = current_state.copy()
+            instance.saved_state.update(
+                (field, current_state[field]) for field in fields
+            )
+
+        if send_post_save:
+            post_save.send(sender=model, instance=instance, created=False,
+                           update_fields=frozenset(fields), raw=False,
+                           using=instance._state.db)
+
+    return len(instances)
@@ -0,0 +1,57 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The Braintree SDK is imported along with this module, on the first use of an HttpTransport's
+# http_strategy.
+
+from braintree.environment import Environment
+from braintree.util.http import Http
+
+
+class PooledHttp(Http):
+    """
+    A Braintree SDK http strategy which sends the requests through the pooled session of an
+    HttpTransport, instead of opening a new connection for every request.
+    """
+
+    def __init__(self, config, environment=None, transport=None):
+        super(PooledHttp, self).__init__(config, environment)
+
+        self.transport = transport
+
+    def http_do(self, http_verb, path, headers, request_body):
+        data = request_body
+        files = None
+
+        if type(request_body) is tuple:
+            data = request_body[0]
+            files = request_body[1]
+
+        if self.config.environment == Environment.Development:
+            verify = False
+        else:
+            verify = self.environment.ssl_certificate
+
+        if not path.startswith(self.config.base_url()) and \
+                not path.startswith(self.config.graphql_base_url()):
+            path = self.config.base_url() + path
+
+        self.transport.count_request()
+
+        response = self.transport.session.request(
+            http_verb, path, headers=headers, data=data, files=files, verify=verify,
+            timeout=self.transport.timeout
+        )
+
+        return [response.status_code, response.text]
@@ -0,0 +1,59 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import Counter, namedtuple
+
+
+Mismatch = namedtuple('Mismatch', ['kind', 'braintree_id', 'transaction_id', 'details'])
+
+
+class ReconciliationReport(object):
+    """
+    Collects the outcome of a settlement reconciliation: how many Braintree transactions were
+    seen, matched and updated, and the mismatches between Braintree and Silver.
+
+    Subclasses can override `add_mismatch` to write the mismatches somewhere instead of keeping
+    them in memory.
+    """
+
+    # A Braintree transaction that no Silver transaction of the payment processor matches
+    UNKNOWN_TRANSACTION = 'unknown_transaction'
+    # The Braintree and Silver amounts (or currencies) differ
+    AMOUNT_MISMATCH = 'amount_mismatch'
+    # The Silver transaction couldn't transition to the Braintree status
+    STATE_MISMATCH = 'state_mismatch'
+
+    def __init__(self):
+        self.counts = Counter()
+        self.mismatches = []
+
+    def count(self, outcome, value=1):
+        self.counts[outcome] += value
+
+    def add_mismatch(self, kind, braintree_id, transaction=None, **details):
+        self.count(kind)
+        self.mismatches.append(Mismatch(
+            kind, braintree_id, transaction.id if transaction else None, details
+        ))
+
+    @property
+    def has_mismatches(self):
+        return any(self.counts[kind] for kind in [self.UNKNOWN_TRANSACTION,
+                                                  self.AMOUNT_MISMATCH,
+                                                  self.STATE_MISMATCH])
+
+    def __str__(self):
+        return ', '.join(
+            '{}: {}'.format(outcome, count) for outcome, count in sorted(self.counts.items())
+        )
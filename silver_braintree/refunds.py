@@ -0,0 +1,69 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import Counter, namedtuple
+
+
+RefundResult = namedtuple('RefundResult', ['outcome', 'transaction_uuid', 'braintree_id',
+                                           'refund_id', 'details'])
+
+
+class RefundReport(object):
+    """
+    Collects the outcome of bulk refunds: how many Silver transactions were refunded, had been
+    refunded before, were skipped or failed, along with a result per transaction.
+
+    Results are added concurrently by the refund workers. Subclasses can override `add_result`
+    to write the results somewhere instead of keeping them in memory.
+    """
+
+    # The Braintree transaction was refunded
+    REFUNDED = 'refunded'
+    # The Braintree transaction had already been refunded; no other refund was made
+    ALREADY_REFUNDED = 'already_refunded'
+    # The transaction can't be refunded (e.g. it isn't settled) or is being refunded elsewhere
+    SKIPPED = 'skipped'
+    # Braintree declined the refund, or the refund couldn't be made
+    FAILED = 'failed'
+    # The refund wasn't started because the bulk refund was canceled
+    CANCELED = 'canceled'
+
+    def __init__(self):
+        self.counts = Counter()
+        self.results = []
+
+        self._lock = threading.Lock()
+
+    def count(self, outcome, value=1):
+        with self._lock:
+            self.counts[outcome] += value
+
+    def add_result(self, outcome, transaction, refund_id=None, **details):
+        self.count(outcome)
+
+        with self._lock:
+            self.results.append(RefundResult(
+                outcome, transaction.uuid, (transaction.data or {}).get('braintree_id'),
+                refund_id, details
+            ))
+
+    @property
+    def has_failures(self):
+        return bool(self.counts[self.FAILED])
+
+    def __str__(self):
+        return ', '.join(
+            '{}: {}'.format(outcome, count) for outcome, count in sorted(self.counts.items())
+        )
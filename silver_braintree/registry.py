@@ -0,0 +1,77 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from django.core.signals import setting_changed
+
+from silver.payment_processors import get_instance
+
+from silver_braintree.cache import clear_gateway_caches
+from silver_braintree.coalescing import clear_single_flights
+from silver_braintree.metrics import clear_metrics_backends
+from silver_braintree.resilience import clear_circuit_breakers
+from silver_braintree.throttling import clear_limiters
+from silver_braintree.transport import clear_http_transports
+
+
+_payment_processors = {}
+_payment_processors_lock = threading.Lock()
+
+
+def get_payment_processor(name):
+    """
+    Returns the process-wide instance of the payment processor with the given name.
+
+    silver's get_instance builds a new payment processor on every call; this resolves it once
+    and then serves the same instance, so that hot paths can compare processors by identity.
+
+    :param name: The name of the payment processor, as found in PAYMENT_PROCESSORS.
+    :return: The payment processor instance.
+    :raises: KeyError if there is no payment processor with the given name.
+    """
+    payment_processor = _payment_processors.get(name)
+    if payment_processor is not None:
+        return payment_processor
+
+    with _payment_processors_lock:
+        payment_processor = _payment_processors.get(name)
+
+        if payment_processor is None:
+            payment_processor = get_instance(name)
+            _payment_processors[name] = payment_processor
+
+        return payment_processor
+
+
+def clear_payment_processors():
+    with _payment_processors_lock:
+        _payment_processors.clear()
+
+
+def _clear_payment_processors_on_setting_changed(setting, **kwargs):
+    if setting == 'PAYMENT_PROCESSORS':
+        clear_payment_processors()
+
+        # the processors' collaborators are registered by name, built from the old options
+        clear_http_transports()
+        clear_circuit_breakers()
+        clear_metrics_backends()
+        clear_limiters()
+        clear_single_flights()
+        # the cached client tokens and transactions may come from the old merchant account
+        clear_gateway_caches()
+
+
+setting_changed.connect(_clear_payment_processors_on_setting_changed)
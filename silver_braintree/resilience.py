@@ -0,0 +1,231 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import random
+import threading
+import time
+
+from django.core.cache import cache
+
+from silver_braintree.sdk import errors
+
+
+logger = logging.getLogger(__name__)
+
+
+def __getattr__(name):
+    # CircuitOpenError and OUTAGE_ERRORS build on the Braintree SDK, which is imported lazily
+    if name in ['CircuitOpenError', 'OUTAGE_ERRORS']:
+        return getattr(errors, name)
+
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+_missing = object()
+
+
+class CircuitBreaker(object):
+    """
+    Stops calling Braintree once `threshold` outage errors happened within `window` seconds.
+    While the breaker is open, calls fail fast with a CircuitOpenError. After `reset_timeout`
+    seconds, a single call is let through to probe Braintree, closing the breaker if it
+    succeeds and opening it again otherwise.
+
+    The failures and the open state are shared between processes through the Django cache, and
+    are also kept in-process, so that the breaker keeps working when the cache doesn't.
+    """
+
+    def __init__(self, name, threshold=5, window=60, reset_timeout=30):
+        self.name = name
+        self.threshold = threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+
+        self._failures = []
+        self._open_until = None
+        self._lock = threading.Lock()
+
+    def _make_key(self, key):
+        return 'silver_braintree:circuit:{}:{}'.format(self.name, key)
+
+    def _call_cache(self, method, key, *args):
+        try:
+            return getattr(cache, method)(self._make_key(key), *args)
+        except Exception as e:
+            logger.warning('Couldn\'t access the circuit breaker state in the Django cache: %s', {
+                'key': self._make_key(key),
+                'exception': str(e)
+            })
+            return _missing
+
+    def _count_shared_failure(self):
+        self._call_cache('add', 'failures', 0, self.window)
+
+        try:
+            return cache.incr(self._make_key('failures'))
+        except ValueError:
+            # the counter expired in the meantime, or the cache doesn't store anything
+            return _missing
+        except Exception as e:
+            logger.warning('Couldn\'t access the circuit breaker state in the Django cache: %s', {
+                'key': self._make_key('failures'),
+                'exception': str(e)
+            })
+            return _missing
+
+    def get_open_until(self):
+        """
+        :return: The time until which the breaker is open; once it passed, the breaker is
+                 half-open. None if the breaker is closed.
+        """
+        shared_open_until = self._call_cache('get', 'open_until')
+        if shared_open_until is _missing:
+            shared_open_until = None
+
+        open_until = [value for value in (self._open_until, shared_open_until) if value]
+
+        return max(open_until) if open_until else None
+
+    def before_call(self):
+        """
+        :return: True if the call is a probe of a half-open breaker.
+        :raises: CircuitOpenError if the call must not be made.
+        """
+        open_until = self.get_open_until()
+        if open_until is None:
+            return False
+
+        if time.time() < open_until:
+            raise errors.CircuitOpenError('The {} circuit breaker is open.'.format(self.name))
+
+        # a single probe is made, across processes
+        if not self._call_cache('add', 'probe', True, self.reset_timeout):
+            raise errors.CircuitOpenError('The {} circuit breaker is half-open.'.format(self.name))
+
+        return True
+
+    def release_probe(self):
+        """
+        Lets another call probe the half-open breaker, when the probe couldn't be made.
+        """
+        self._call_cache('delete', 'probe')
+
+    def record_success(self, probe=False):
+        if not probe:
+            return
+
+        with self._lock:
+            self._failures = []
+            self._open_until = None
+
+        for key in ('open_until', 'failures', 'probe'):
+            self._call_cache('delete', key)
+
+    def record_failure(self, probe=False):
+        if probe:
+            self.open()
+            return
+
+        now = time.time()
+        with self._lock:
+            self._failures = [failure for failure in self._failures
+                              if failure > now - self.window] + [now]
+            failures = len(self._failures)
+
+        shared_failures = self._count_shared_failure()
+        if shared_failures is not _missing:
+            failures = max(failures, shared_failures)
+
+        if failures >= self.threshold:
+            self.open()
+
+    def open(self):
+        open_until = time.time() + self.reset_timeout
+
+        with self._lock:
+            self._failures = []
+            self._open_until = open_until
+
+        # the state is kept until a probe succeeds
+        self._call_cache('set', 'open_until', open_until, None)
+        self._call_cache('delete', 'failures')
+        self._call_cache('delete', 'probe')
+
+        logger.warning('Opened the %s circuit breaker for %s seconds.', self.name,
+                       self.reset_timeout)
+
+    def reset(self):
+        """
+        Closes the breaker, in this process only.
+        """
+        with self._lock:
+            self._failures = []
+            self._open_until = None
+
+
+class RetryPolicy(object):
+    """
+    Retries idempotent calls failing because of a Braintree outage, waiting an exponentially
+    growing, fully jittered delay between the attempts.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.1, max_delay=2):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, retry):
+        """
+        :param retry: The number of the retry, starting at 0.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def is_retryable(self, exception):
+        return (isinstance(exception, errors.OUTAGE_ERRORS) and
+                not isinstance(exception, errors.CircuitOpenError))
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name, **options):
+    """
+    Returns the process-wide CircuitBreaker of the payment processor with the given name,
+    creating it if needed.
+    """
+    with _circuit_breakers_lock:
+        circuit_breaker = _circuit_breakers.get(name)
+
+        if circuit_breaker is None:
+            circuit_breaker = CircuitBreaker(name, **options)
+            _circuit_breakers[name] = circuit_breaker
+
+        return circuit_breaker
+
+
+def reset_circuit_breakers():
+    with _circuit_breakers_lock:
+        for circuit_breaker in _circuit_breakers.values():
+            circuit_breaker.reset()
+
+
+def clear_circuit_breakers():
+    """
+    Forgets the process-wide CircuitBreakers, without resetting their shared state, so that
+    they're created again, with their current options, on their next use.
+    """
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
@@ -0,0 +1,47 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+
+
+class LazyModule(object):
+    """
+    Stands in for a module, which is only imported once one of its attributes is used.
+
+        from silver_braintree.sdk import braintree
+
+        braintree.Transaction.Status.Settled  # imports the Braintree SDK
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        return '<lazy module {!r}>'.format(self._name)
+
+
+# The Braintree SDK pulls in a lot of modules, which would slow down the start of every Django
+# process, so it's imported on first use; the same goes for the modules building on it.
+braintree = LazyModule('braintree')
+errors = LazyModule('silver_braintree.errors')
@@ -0,0 +1,214 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import random
+import threading
+import time
+
+from django.core.cache import cache
+
+from silver_braintree.sdk import errors
+
+
+logger = logging.getLogger(__name__)
+
+
+def __getattr__(name):
+    # ThrottledError builds on the Braintree SDK, which is imported lazily
+    if name == 'ThrottledError':
+        return errors.ThrottledError
+
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+class RateLimiter(object):
+    """
+    A token bucket shared between processes through the Django cache. The bucket holds `burst`
+    tokens and is refilled every `burst / rate` seconds, which lets the tokens be taken with
+    the cache's atomic increments.
+
+    When the cache is unavailable, the tokens are taken from an in-process bucket instead.
+    """
+
+    def __init__(self, name, rate, burst=None, timeout=30):
+        self.name = name
+        self.rate = rate
+        self.burst = burst or rate
+        self.timeout = timeout
+
+        self.period = self.burst / float(rate)
+
+        self._local_tokens = self.burst
+        self._local_updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_shared(self, slot):
+        """
+        :return: True if a token was taken, False if the slot's tokens are exhausted and None
+                 if the cache couldn't be used.
+        """
+        key = 'silver_braintree:rate_limit:{}:{}'.format(self.name, slot)
+
+        try:
+            cache.add(key, 0, int(self.period) + 1)
+            return cache.incr(key) <= self.burst
+        except ValueError:
+            # the cache doesn't store anything, or the key was already evicted
+            return None
+        except Exception as e:
+            logger.warning('Couldn\'t access the rate limit in the Django cache: %s', {
+                'key': key,
+                'exception': str(e)
+            })
+            return None
+
+    def _take_local(self):
+        with self._lock:
+            now = time.monotonic()
+            self._local_tokens = min(
+                self.burst, self._local_tokens + (now - self._local_updated_at) * self.rate
+            )
+            self._local_updated_at = now
+
+            if self._local_tokens < 1:
+                return False
+
+            self._local_tokens -= 1
+            return True
+
+    def acquire(self, timeout=None):
+        """
+        Waits for a token.
+
+        :raises: ThrottledError if no token could be taken within the timeout.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            now = time.time()
+            slot = int(now // self.period)
+
+            taken = self._take_shared(slot)
+            if taken is None:
+                taken = self._take_local()
+            if taken:
+                return
+
+            # wait for the next slot; the jitter spreads the waiting processes
+            delay = (slot + 1) * self.period - now + random.uniform(0, self.period / 10)
+            if time.monotonic() + delay > deadline:
+                raise errors.ThrottledError('The {} rate limit was exceeded.'.format(self.name))
+
+            time.sleep(delay)
+
+
+class AdaptiveConcurrencyLimiter(object):
+    """
+    Limits the concurrent Braintree calls of a process, adjusting the limit AIMD-style: the
+    limit grows by one once a limit's worth of calls completed faster than `latency_target`
+    seconds, and is halved when a call is slower or fails because of a Braintree outage, at
+    most once every `latency_target` seconds.
+    """
+
+    def __init__(self, max_limit, initial_limit=None, min_limit=1, latency_target=2,
+                 backoff=0.5, timeout=30):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.limit = float(initial_limit or max_limit)
+        self.in_flight = 0
+
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        :raises: ThrottledError if no call slot got free within the timeout.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                raise errors.ThrottledError(
+                    'The Braintree concurrency limit ({}) was reached.'.format(int(self.limit))
+                )
+
+            self.in_flight += 1
+
+    def release(self, latency, failed=False):
+        """
+        :param latency: The duration of the call, in seconds.
+        :param failed: Whether the call failed because of a Braintree outage.
+        """
+        with self._condition:
+            self.in_flight -= 1
+
+            now = time.monotonic()
+            if failed or latency > self.latency_target:
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+
+
+_rate_limiters = {}
+_concurrency_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name, rate, burst=None, timeout=30):
+    """
+    Returns the process-wide RateLimiter with the given name, creating it if needed.
+    """
+    with _limiters_lock:
+        rate_limiter = _rate_limiters.get(name)
+
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(name, rate, burst, timeout)
+            _rate_limiters[name] = rate_limiter
+
+        return rate_limiter
+
+
+def get_concurrency_limiter(name, **options):
+    """
+    Returns the process-wide AdaptiveConcurrencyLimiter of the payment processor with the given
+    name, creating it if needed.
+    """
+    with _limiters_lock:
+        concurrency_limiter = _concurrency_limiters.get(name)
+
+        if concurrency_limiter is None:
+            concurrency_limiter = AdaptiveConcurrencyLimiter(**options)
+            _concurrency_limiters[name] = concurrency_limiter
+
+        return concurrency_limiter
+
+
+def clear_limiters():
+    """
+    Forgets the process-wide rate and concurrency limiters, without resetting the shared rate
+    limit budgets, so that they're created again, with their current options, on their next use.
+    """
+    with _limiters_lock:
+        _rate_limiters.clear()
+        _concurrency_limiters.clear()
@@ -0,0 +1,142 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter counting the connections opened by its pools.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.opened_connections = 0
+        self._lock = threading.Lock()
+
+        super(CountingHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def _count_connection(self):
+        with self._lock:
+            self.opened_connections += 1
+
+    def _get_counting_pool_class(self, pool_class):
+        adapter = self
+
+        class CountingConnection(pool_class.ConnectionCls):
+            def connect(self):
+                adapter._count_connection()
+                return super(CountingConnection, self).connect()
+
+        return type(pool_class.__name__, (pool_class, ), {'ConnectionCls': CountingConnection})
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(CountingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': self._get_counting_pool_class(HTTPConnectionPool),
+            'https': self._get_counting_pool_class(HTTPSConnectionPool),
+        }
+
+
+class HttpTransport(object):
+    """
+    Holds a pooled, keep-alive requests.Session to be used by the Braintree SDK, through the
+    http_strategy factory.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, connect_timeout=10,
+                 read_timeout=60, keep_alive=True):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        self.adapter = CountingHTTPAdapter(pool_connections=pool_connections,
+                                           pool_maxsize=pool_maxsize)
+
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def http_strategy(self, config, environment):
+        from silver_braintree.pooled_http import PooledHttp
+
+        return PooledHttp(config, environment, transport=self)
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def stats(self):
+        """
+        :return: The number of requests sent and of connections opened by the transport, and
+                 how many of the requests reused an already open connection.
+        """
+        requests_count = self.requests
+        connections_count = self.adapter.opened_connections
+
+        return {
+            'requests': requests_count,
+            'connections': connections_count,
+            'reused_connections': max(requests_count - connections_count, 0),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_http_transport(name, **options):
+    """
+    Returns the process-wide HttpTransport of the payment processor with the given name,
+    creating it if needed.
+    """
+    with _transports_lock:
+        transport = _transports.get(name)
+
+        if transport is None:
+            transport = HttpTransport(**options)
+            _transports[name] = transport
+
+        return transport
+
+
+def clear_http_transports():
+    """
+    Closes and forgets the process-wide HttpTransports, so that they're created again, with
+    their current options, on their next use.
+    """
+    with _transports_lock:
+        transports = list(_transports.values())
+        _transports.clear()
+
+    for transport in transports:
+        transport.close()
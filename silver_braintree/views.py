@@ -12,14 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from silver.payment_processors import get_instance
 from silver.payment_processors.views import GenericTransactionView
 
+from silver_braintree.registry import get_payment_processor
+
 
 class BraintreeTransactionView(GenericTransactionView):
     def get_context_data(self):
         context_data = super(BraintreeTransactionView, self).get_context_data()
-        payment_processor = get_instance(self.transaction.payment_processor)
+        payment_processor = get_payment_processor(self.transaction.payment_processor)
         context_data['client_token'] = payment_processor.client_token(
                 self.transaction.customer
         )
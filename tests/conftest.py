@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import braintree
+import pytest
 
 import django
 from django.conf import settings
+from django.test import override_settings
 
 
 settings.configure(
@@ -71,3 +73,33 @@ settings.configure(
 )
 
 django.setup()
+
+
+@pytest.fixture(autouse=True)
+def clear_gateway_caches():
+    from silver_braintree.cache import clear_gateway_caches
+    from silver_braintree.registry import clear_payment_processors
+    from silver_braintree.resilience import reset_circuit_breakers
+
+    clear_gateway_caches()
+    clear_payment_processors()
+    reset_circuit_breakers()
+
+
+@pytest.fixture
+def locmem_cache():
+    """
+    Backs the Django cache with a local memory cache, as shared between processes, instead of
+    the dummy one. The cache is cleared afterwards.
+    """
+    from django.core.cache import cache
+
+    with override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }):
+        try:
+            yield cache
+        finally:
+            cache.clear()
@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from contextlib import contextmanager
+
 import factory
+from mock import patch
 from factory.django import mute_signals, DjangoModelFactory
 
 from django.db.models import signals
@@ -44,3 +47,32 @@ class BraintreeRecurringPaymentMethodFactory(DjangoModelFactory):
 
 class BraintreeTransactionFactory(TransactionFactory):
     payment_method = factory.SubFactory(BraintreePaymentMethodFactory)
+
+
+@contextmanager
+def patch_search(side_effect=None, return_value=None, transactions=()):
+    """
+    Patches TransactionGateway.search, with the given side effect or return value, and the
+    fetching of the pages of the search results, which serves the given Braintree transactions
+    and the ones found by the searches, by id.
+
+    :return: The search and the page fetch mocks.
+    """
+    found = {transaction.id: transaction for transaction in transactions}
+
+    def search(*criteria):
+        search_result = side_effect(*criteria) if side_effect else return_value
+        found.update((item.id, item) for item in search_result.items)
+        search_result.ids = [item.id for item in search_result.items]
+
+        return search_result
+
+    def fetch(query, braintree_ids):
+        return [found[braintree_id] for braintree_id in braintree_ids
+                if braintree_id in found]
+
+    with patch('braintree.transaction_gateway.TransactionGateway.search',
+               side_effect=search) as search_mock, \
+            patch('braintree.transaction_gateway.TransactionGateway._TransactionGateway__fetch',
+                  side_effect=fetch) as fetch_mock:
+        yield search_mock, fetch_mock
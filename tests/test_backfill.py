@@ -0,0 +1,109 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timedelta
+
+import pytest
+from mock import MagicMock
+from braintree import Transaction as BraintreeTransaction
+
+from django.utils import timezone
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.models import BackfillCheckpoint
+from tests.factories import BraintreeTransactionFactory, patch_search
+
+
+START = timezone.make_aware(datetime(2026, 7, 1), timezone.utc)
+END = START + timedelta(days=3)
+
+
+class TestBackfill:
+    def search_by_day(self, result_transactions):
+        """
+        :param result_transactions: A dict mapping the day offsets (from START) to their
+                                    Braintree transactions, or to an exception to raise.
+        """
+        def search(criteria):
+            day = (timezone.make_aware(criteria.to_param()['min'], timezone.utc) - START).days
+            items = result_transactions.get(day, [])
+            if isinstance(items, Exception):
+                raise items
+
+            return MagicMock(maximum_size=len(items), items=items)
+
+        return patch_search(side_effect=search)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_backfill_transactions(self):
+        tracked_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Settled, external_reference='beertrain',
+            data={'braintree_id': 'beertrain', 'status': 'settling'}
+        )
+        lost_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Failed, external_reference=None, data={}
+        )
+
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with self.search_by_day({
+            0: [MagicMock(id='beertrain', status=BraintreeTransaction.Status.Settled)],
+            2: [MagicMock(id='losttrain', status=BraintreeTransaction.Status.Failed,
+                          order_id=str(lost_transaction.uuid)),
+                MagicMock(id='ghosttrain', order_id=None)],
+        }) as (search_mock, fetch_mock):
+            checkpoint, counts = payment_processor.backfill_transactions(START, END,
+                                                                         max_workers=2)
+
+        # a search for each day and a fetch for each page of found transactions
+        assert search_mock.call_count == 3
+        assert fetch_mock.call_count == 2
+        assert counts == {'searched': 3, 'matched': 2, 'updated': 2}
+        assert checkpoint.is_complete
+        assert BackfillCheckpoint.objects.get().cursor == END
+
+        tracked_transaction.refresh_from_db()
+        assert tracked_transaction.data['status'] == BraintreeTransaction.Status.Settled
+
+        lost_transaction.refresh_from_db()
+        assert lost_transaction.external_reference == 'losttrain'
+        assert lost_transaction.data == {'braintree_id': 'losttrain',
+                                         'status': BraintreeTransaction.Status.Failed}
+        assert lost_transaction.state == Transaction.States.Failed
+
+    @pytest.mark.django_db(transaction=True)
+    def test_backfill_resumes_from_the_checkpoint(self):
+        BackfillCheckpoint.objects.create(payment_processor='BraintreeTriggered', start=START,
+                                          end=END, cursor=START + timedelta(days=2))
+
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with self.search_by_day({}) as (search_mock, _):
+            checkpoint, _ = payment_processor.backfill_transactions(START, END)
+
+        assert search_mock.call_count == 1
+        assert checkpoint.is_complete
+
+    @pytest.mark.django_db(transaction=True)
+    def test_failed_slices_hold_the_checkpoint_back(self):
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with self.search_by_day({1: ValueError()}):
+            checkpoint, counts = payment_processor.backfill_transactions(START, END,
+                                                                         max_workers=1)
+
+        assert counts == {'failed_slices': 1}
+        assert not checkpoint.is_complete
+        assert BackfillCheckpoint.objects.get().cursor == START + timedelta(days=1)
@@ -0,0 +1,141 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+from mock import MagicMock, patch
+
+from django.conf import settings
+
+from silver.fixtures.factories import CustomerFactory
+from silver.payment_processors import get_instance
+from silver_braintree.cache import GatewayCache
+from silver_braintree.coalescing import SingleFlight, cache_lock
+from silver_braintree.payment_processors import BraintreeTriggered
+
+
+def run_concurrently(func, count):
+    results = [None] * count
+
+    def run(index):
+        results[index] = func()
+
+    threads = [threading.Thread(target=run, args=(index, )) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def blocking_call(single_flight, followers, result):
+    """
+    Returns a callable which stays in flight until the given number of calls joined it.
+    """
+    def call(*args, **kwargs):
+        while single_flight.coalesced < followers:
+            time.sleep(0.001)
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+    return MagicMock(side_effect=call)
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        call = blocking_call(single_flight, 4, 'result')
+
+        results = run_concurrently(lambda: single_flight.do('key', call), 5)
+
+        assert call.call_count == 1
+        assert sorted(results) == [('result', False)] + [('result', True)] * 4
+
+        # finished calls aren't reused
+        assert single_flight.do('key', call) == ('result', False)
+        assert call.call_count == 2
+
+    def test_exceptions_are_shared(self):
+        single_flight = SingleFlight()
+        call = blocking_call(single_flight, 2, ValueError('failed'))
+
+        def do():
+            try:
+                single_flight.do('key', call)
+            except ValueError as e:
+                return str(e)
+
+        assert run_concurrently(do, 3) == ['failed'] * 3
+        assert call.call_count == 1
+
+
+def test_concurrent_transaction_finds_are_coalesced():
+    payment_processor = get_instance('BraintreeTriggered')
+    result_transaction = MagicMock(id='beertrain')
+
+    with patch('braintree.transaction_gateway.TransactionGateway.find',
+               blocking_call(payment_processor.single_flight, 3,
+                             result_transaction)) as find_mock:
+        results = run_concurrently(
+            lambda: payment_processor.find_braintree_transaction('beertrain', use_cache=False), 4
+        )
+
+    assert find_mock.call_count == 1
+    assert results == [result_transaction] * 4
+
+
+def test_cache_lock(locmem_cache):
+    with cache_lock('resource') as acquired:
+        assert acquired
+
+        with cache_lock('resource', wait_timeout=0) as acquired_again:
+            assert not acquired_again
+
+    with cache_lock('resource', wait_timeout=0) as acquired:
+        assert acquired
+
+
+@pytest.mark.django_db
+def test_client_tokens_are_coalesced_across_processes(locmem_cache):
+    customer = CustomerFactory.create()
+    cache_key = 'silver-customer-{}'.format(customer.pk)
+
+    payment_processor = BraintreeTriggered(
+        'BraintreeTriggered', cross_process_coalescing=True,
+        **settings.PAYMENT_PROCESSORS['BraintreeTriggered']['setup_data']
+    )
+
+    with patch('braintree.client_token_gateway.ClientTokenGateway.generate') as generate_mock:
+        lock_key = 'silver_braintree:lock:client_token:BraintreeTriggered:{}'.format(cache_key)
+        locmem_cache.add(lock_key, True)
+
+        def generate_in_another_process():
+            GatewayCache(payment_processor.client_tokens.prefix, 60).set(cache_key, 'shared-token')
+            locmem_cache.delete(lock_key)
+
+        other_process = threading.Timer(0.1, generate_in_another_process)
+        other_process.start()
+
+        try:
+            assert payment_processor.client_token(customer) == 'shared-token'
+        finally:
+            other_process.join()
+
+    generate_mock.assert_not_called()
@@ -0,0 +1,142 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from mock import patch, MagicMock
+from braintree import Transaction as BraintreeTransaction
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.metrics import (NullMetrics, PrometheusMetrics, StatsdMetrics,
+                                      get_metrics_backend)
+from tests.factories import BraintreeTransactionFactory, BraintreePaymentMethodFactory
+
+
+class RecordingMetrics(NullMetrics):
+    def __init__(self):
+        self.timings = []
+        self.increments = []
+
+    def timing(self, name, seconds, labels):
+        self.timings.append((name, dict(labels)))
+
+    def increment(self, name, labels, value=1):
+        self.increments.append((name, dict(labels), value))
+
+
+@pytest.mark.django_db
+def test_charge_transaction_is_measured():
+    payment_method = BraintreePaymentMethodFactory.create(
+        payment_processor='BraintreeTriggeredRecurring'
+    )
+    payment_method.nonce = 'some-nonce'
+    payment_method.save()
+
+    transaction = BraintreeTransactionFactory.create(payment_method=payment_method)
+
+    result = MagicMock(is_success=False, errors=None)
+    result.transaction = MagicMock(status=BraintreeTransaction.Status.ProcessorDeclined,
+                                   processor_response_code='2001')
+
+    metrics = RecordingMetrics()
+
+    with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
+        sale_mock.return_value = result
+
+        payment_processor = get_instance(transaction.payment_processor)
+        payment_processor.metrics = metrics
+
+        assert payment_processor.process_transaction(transaction) is False
+
+    labels = {
+        'operation': 'charge_transaction',
+        'processor': 'BraintreeTriggeredRecurring',
+        'outcome': 'failure',
+        'fail_code': 'default',
+    }
+    assert ('operation', labels) in metrics.timings
+    assert ('operations', labels, 1) in metrics.increments
+
+    assert ('gateway_call', {
+        'call': 'transaction.sale',
+        'operation': 'charge_transaction',
+        'processor': 'BraintreeTriggeredRecurring',
+        'outcome': 'success',
+    }) in metrics.timings
+
+    steps = [labels['step'] for name, labels in metrics.timings if name == 'step']
+    assert 'decryption' in steps
+    assert 'transition' in steps
+    assert 'persistence' in steps
+
+
+@pytest.mark.django_db
+def test_failed_gateway_calls_are_measured():
+    transaction = BraintreeTransactionFactory.create(
+        state=Transaction.States.Pending, data={'braintree_id': 'beertrain'}
+    )
+
+    metrics = RecordingMetrics()
+
+    with patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock:
+        find_mock.side_effect = RuntimeError('timeout')
+
+        payment_processor = get_instance(transaction.payment_processor)
+        payment_processor.metrics = metrics
+
+        with pytest.raises(RuntimeError):
+            payment_processor.fetch_transaction_status(transaction)
+
+    assert ('gateway_call', {
+        'call': 'transaction.find',
+        'operation': 'fetch_transaction_status',
+        'processor': transaction.payment_processor,
+        'outcome': 'error',
+    }) in metrics.timings
+    assert metrics.timings[-1][0] == 'operation'
+    assert metrics.timings[-1][1]['outcome'] == 'error'
+
+
+def test_statsd_metrics_append_label_values_to_names():
+    client = MagicMock()
+    metrics = StatsdMetrics(client=client)
+
+    metrics.timing('gateway_call', 0.25, {'call': 'transaction.sale', 'outcome': 'success'})
+    metrics.increment('operations', {'operation': 'client_token', 'fail_code': ''})
+
+    client.timing.assert_called_once_with('gateway_call.transaction_sale.success', 250)
+    client.incr.assert_called_once_with('operations.none.client_token', 1)
+
+
+def test_prometheus_metrics():
+    prometheus_client = pytest.importorskip('prometheus_client')
+    registry = prometheus_client.CollectorRegistry()
+
+    metrics = PrometheusMetrics(registry=registry)
+    metrics.timing('step', 0.1, {'step': 'persistence', 'outcome': 'success'})
+    metrics.increment('operations', {'operation': 'client_token', 'fail_code': None})
+
+    assert registry.get_sample_value(
+        'silver_braintree_step_seconds_count', {'step': 'persistence', 'outcome': 'success'}
+    ) == 1
+    assert registry.get_sample_value(
+        'silver_braintree_operations_total', {'operation': 'client_token', 'fail_code': ''}
+    ) == 1
+
+
+def test_metrics_backend_from_dotted_path():
+    metrics = get_metrics_backend('metrics-test', 'tests.test_metrics.RecordingMetrics')
+
+    assert isinstance(metrics, RecordingMetrics)
+    assert get_metrics_backend('metrics-test') is metrics
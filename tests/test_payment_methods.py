@@ -0,0 +1,105 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pickle
+import time
+
+import pytest
+from mock import MagicMock, patch
+from braintree import Transaction as BraintreeTransaction
+
+from silver_braintree.models import BraintreePaymentMethod, count_decryptions
+from tests.factories import BraintreePaymentMethodFactory
+
+
+@pytest.mark.django_db
+def test_token_is_decrypted_once():
+    payment_method = BraintreePaymentMethodFactory.create()
+    payment_method.token = 'kento'
+    payment_method.save()
+
+    payment_method = BraintreePaymentMethod.objects.get(pk=payment_method.pk)
+
+    with count_decryptions() as counter:
+        assert payment_method.token == 'kento'
+        assert payment_method.token == 'kento'
+        assert not payment_method.nonce
+
+    assert counter.count == 1
+
+
+@pytest.mark.django_db
+def test_decrypted_values_follow_data_changes():
+    payment_method = BraintreePaymentMethodFactory.create()
+    payment_method.nonce = 'some-nonce'
+    payment_method.save()
+
+    with count_decryptions() as counter:
+        assert payment_method.nonce == 'some-nonce'
+    assert counter.count == 0
+
+    payment_method.data.pop('nonce')
+    assert not payment_method.nonce
+
+    payment_method.refresh_from_db()
+    assert payment_method.nonce == 'some-nonce'
+
+
+@pytest.mark.django_db
+def test_decrypted_values_are_not_pickled():
+    payment_method = BraintreePaymentMethodFactory.create()
+    payment_method.token = 'kento'
+
+    assert b'kento' not in pickle.dumps(payment_method)
+    assert pickle.loads(pickle.dumps(payment_method)).token == 'kento'
+
+
+@pytest.mark.django_db
+def test_braintree_transaction_is_cached_until_its_status_is_final():
+    payment_method = BraintreePaymentMethodFactory.create(data={'braintree_id': 'beertrain'})
+    result_transaction = MagicMock(id='beertrain',
+                                   status=BraintreeTransaction.Status.SubmittedForSettlement)
+
+    with patch('braintree.transaction_gateway.TransactionGateway.find',
+               return_value=result_transaction) as find_mock:
+        assert payment_method.braintree_transaction is result_transaction
+        assert payment_method.braintree_transaction is result_transaction
+        assert find_mock.call_count == 1
+
+        result_transaction.status = BraintreeTransaction.Status.Settled
+        with patch('silver_braintree.cache.time.monotonic',
+                   return_value=time.monotonic() + 60):
+            assert payment_method.braintree_transaction is result_transaction
+        assert find_mock.call_count == 2
+
+        # final statuses don't expire
+        with patch('silver_braintree.cache.time.monotonic',
+                   return_value=time.monotonic() + 60 * 60 * 24):
+            assert payment_method.braintree_transaction is result_transaction
+        assert find_mock.call_count == 2
+
+
+@pytest.mark.django_db
+def test_braintree_transaction_cache_invalidation():
+    payment_method = BraintreePaymentMethodFactory.create(data={'braintree_id': 'beertrain'})
+    result_transaction = MagicMock(id='beertrain', status=BraintreeTransaction.Status.Settled)
+
+    with patch('braintree.transaction_gateway.TransactionGateway.find',
+               return_value=result_transaction) as find_mock:
+        assert payment_method.braintree_transaction is result_transaction
+
+        payment_method.get_payment_processor().invalidate_braintree_transaction('beertrain')
+
+        assert payment_method.braintree_transaction is result_transaction
+        assert find_mock.call_count == 2
@@ -12,25 +12,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+import time
+
 import pytest
 from datetime import datetime
 from mock import patch, MagicMock
+import braintree
 from braintree import Transaction as BraintreeTransaction
 
-from silver.models import Transaction
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from silver.fixtures.factories import CustomerFactory
+from silver.models import PaymentMethod, Transaction
 from silver.payment_processors import get_instance
 from silver_braintree.models import CustomerData
-from silver_braintree.payment_processors import (BraintreeTriggered,
-                                                 BraintreeTriggeredRecurring)
+from silver_braintree.payment_processors import BraintreeTriggered, BraintreeTriggeredRecurring
 from tests.factories import BraintreeTransactionFactory, BraintreePaymentMethodFactory, \
-    BraintreeRecurringPaymentMethodFactory
+    BraintreeRecurringPaymentMethodFactory, patch_search
 
 
 class TestBraintreeTransactions:
     def setup_method(self):
-        BraintreeTriggered._has_been_setup = True
-        BraintreeTriggeredRecurring._has_been_setup = True
-
         transaction = MagicMock()
         transaction.amount = 1000
         transaction.status = BraintreeTransaction.Status.Settled
@@ -62,11 +66,7 @@ class TestBraintreeTransactions:
 
         self.result = result
 
-        self.search_result = MagicMock(items=[self.transaction])
-
-    def teardown_method(self):
-        BraintreeTriggered._has_been_setup = False
-        BraintreeTriggeredRecurring._has_been_setup = False
+        self.search_result = MagicMock(items=[self.transaction], ids=[self.transaction.id])
 
     @pytest.mark.django_db
     def test_update_status_transaction_settle(self):
@@ -76,7 +76,7 @@ class TestBraintreeTransactions:
             }
         )
 
-        with patch('braintree.Transaction.find') as find_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock:
             find_mock.return_value = self.transaction
             payment_processor = get_instance(transaction.payment_processor)
             payment_processor.fetch_transaction_status(transaction)
@@ -93,7 +93,7 @@ class TestBraintreeTransactions:
                 'braintree_id': 'beertrain'
             }
         )
-        with patch('braintree.Transaction.find') as find_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock:
             find_mock.return_value = self.transaction
             # fail status from braintree
             self.transaction.status = BraintreeTransaction.Status.ProcessorDeclined
@@ -115,7 +115,7 @@ class TestBraintreeTransactions:
             }
         )
 
-        with patch.multiple('braintree.Transaction',
+        with patch.multiple('braintree.transaction_gateway.TransactionGateway',
                             find=MagicMock(),
                             search=MagicMock(items=[])):
             payment_processor = get_instance(transaction.payment_processor)
@@ -132,7 +132,7 @@ class TestBraintreeTransactions:
             }
         )
 
-        with patch.multiple('braintree.Transaction',
+        with patch.multiple('braintree.transaction_gateway.TransactionGateway',
                             find=MagicMock(return_value=self.transaction),
                             search=MagicMock(return_value=self.search_result)):
             payment_processor = get_instance(transaction.payment_processor)
@@ -151,7 +151,7 @@ class TestBraintreeTransactions:
         payment_method.nonce = 'some-nonce'
         payment_method.save()
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             sale_mock.return_value = self.result
             payment_processor = get_instance(transaction.payment_processor)
             payment_processor.process_transaction(transaction)
@@ -161,6 +161,7 @@ class TestBraintreeTransactions:
                 'customer': {'first_name': payment_method.customer.first_name,
                              'last_name': payment_method.customer.last_name},
                 'amount': transaction.amount,
+                'order_id': str(transaction.uuid),
                 'billing': {'postal_code': None},
                 # don't store payment method in vault
                 'options': {'store_in_vault': False,
@@ -191,9 +192,32 @@ class TestBraintreeTransactions:
 
             customer_data = customer_data[0]
             assert customer_data.get('id') == self.transaction.customer_details.id
+            assert (customer_data.braintree_customer_id ==
+                    self.transaction.customer_details.id)
 
             assert transaction.data.get('status') == self.result.transaction.status
 
+    @pytest.mark.django_db
+    def test_process_transaction_loads_customer_data_once(self):
+        transaction = BraintreeTransactionFactory.create()
+        payment_method = transaction.payment_method
+        payment_method.nonce = 'some-nonce'
+        payment_method.save()
+
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
+            sale_mock.return_value = self.result
+            payment_processor = get_instance(transaction.payment_processor)
+
+            with CaptureQueriesContext(connection) as queries:
+                payment_processor.process_transaction(transaction)
+
+        customer_data_selects = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and
+            CustomerData._meta.db_table in query['sql']
+        ]
+        assert len(customer_data_selects) == 1
+
     @pytest.mark.django_db
     def test_process_transaction_with_token_recurring(self):
         payment_method = BraintreePaymentMethodFactory.create(
@@ -210,7 +234,7 @@ class TestBraintreeTransactions:
             customer=customer, data={'id': 'somethingelse'}
         )
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             sale_mock.return_value = self.result
 
             payment_processor = get_instance(transaction.payment_processor)
@@ -220,6 +244,7 @@ class TestBraintreeTransactions:
                 # existing customer in vault
                 'customer_id': customer_data['id'],
                 'amount': transaction.amount,
+                'order_id': str(transaction.uuid),
                 'billing': {'postal_code': None},
                 'options': {'submit_for_settlement': True},
                 # existing token
@@ -256,7 +281,7 @@ class TestBraintreeTransactions:
         payment_method.nonce = nonce
         payment_method.save()
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             sale_mock.return_value = self.result
 
             payment_processor = get_instance(transaction.payment_processor)
@@ -267,6 +292,7 @@ class TestBraintreeTransactions:
                 'customer': {'first_name': payment_method.customer.first_name,
                              'last_name': payment_method.customer.last_name},
                 'amount': transaction.amount,
+                'order_id': str(transaction.uuid),
                 'billing': {'postal_code': None},
                 # store the payment method
                 'options': {'store_in_vault': True,
@@ -313,7 +339,7 @@ class TestBraintreeTransactions:
 
         transaction = BraintreeTransactionFactory.create(payment_method=payment_method)
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             self.result.transaction.payment_instrument_type = 'credit_card'
             sale_mock.return_value = self.result
 
@@ -325,6 +351,7 @@ class TestBraintreeTransactions:
                 'customer': {'first_name': payment_method.customer.first_name,
                              'last_name': payment_method.customer.last_name},
                 'amount': transaction.amount,
+                'order_id': str(transaction.uuid),
                 'billing': {'postal_code': None},
                 # store the payment method
                 'options': {'store_in_vault': True,
@@ -373,7 +400,7 @@ class TestBraintreeTransactions:
         payment_method.canceled = True
         payment_method.save()
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             payment_processor = get_instance(transaction.payment_processor)
             assert payment_processor.process_transaction(transaction) is False
             assert sale_mock.call_count == 0
@@ -387,7 +414,7 @@ class TestBraintreeTransactions:
             payment_method=payment_method
         )
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             payment_processor = get_instance(transaction.payment_processor)
 
             assert payment_processor.process_transaction(transaction) is False
@@ -406,7 +433,7 @@ class TestBraintreeTransactions:
         payment_method.nonce = nonce
         payment_method.save()
 
-        with patch('braintree.Transaction.sale') as sale_mock:
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
             self.result.is_success = False
             sale_mock.return_value = self.result
 
@@ -415,3 +442,428 @@ class TestBraintreeTransactions:
             assert transaction.data.get('error_codes') == [
                 error.code for error in self.result.errors.deep_errors
             ]
+
+    @pytest.mark.django_db
+    def test_fetch_transactions_status_uses_a_single_search(self):
+        settled_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={
+                'braintree_id': 'beertrain'
+            }
+        )
+        missing_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={
+                'braintree_id': 'ghosttrain'
+            }
+        )
+
+        with patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock, \
+                patch_search(transactions=[self.transaction]) as (search_mock, fetch_mock):
+            payment_processor = get_instance(settled_transaction.payment_processor)
+            outcomes = payment_processor.fetch_transactions_status(
+                Transaction.objects.filter(
+                    id__in=[settled_transaction.id, missing_transaction.id]
+                )
+            )
+
+            # the transactions are fetched by id, within a single page
+            assert search_mock.call_count == 0
+            assert fetch_mock.call_count == 1
+            assert sorted(fetch_mock.call_args[0][1]) == ['beertrain', 'ghosttrain']
+            assert find_mock.call_count == 0
+
+        assert outcomes == {
+            settled_transaction.id: True,
+            missing_transaction.id: False
+        }
+
+        settled_transaction.refresh_from_db()
+        assert settled_transaction.state == Transaction.States.Settled
+        assert settled_transaction.data.get('status') == self.transaction.status
+
+        missing_transaction.refresh_from_db()
+        assert missing_transaction.state == Transaction.States.Pending
+
+    @pytest.mark.django_db
+    def test_fetch_transactions_status_writes_each_state_in_bulk(self):
+        statuses = [BraintreeTransaction.Status.Settled] * 3 + [
+            BraintreeTransaction.Status.ProcessorDeclined,
+            BraintreeTransaction.Status.Voided,
+            BraintreeTransaction.Status.SubmittedForSettlement,
+        ]
+
+        transactions = []
+        result_transactions = []
+        for index, status in enumerate(statuses):
+            transactions.append(BraintreeTransactionFactory.create(
+                state=Transaction.States.Pending, data={
+                    'braintree_id': 'train-{}'.format(index)
+                }
+            ))
+            result_transactions.append(MagicMock(id='train-{}'.format(index), status=status))
+
+        with patch_search(transactions=result_transactions):
+            payment_processor = get_instance('BraintreeTriggered')
+
+            with CaptureQueriesContext(connection) as queries:
+                outcomes = payment_processor.fetch_transactions_status(
+                    Transaction.objects.filter(id__in=[t.id for t in transactions])
+                )
+
+        transaction_updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "silver_transaction"')
+        ]
+        # one update per reached state and one for the data only changes
+        assert len(transaction_updates) == 4
+
+        assert outcomes == {
+            transaction.id: outcome
+            for transaction, outcome in zip(transactions, [True] * 3 + [False, False, True])
+        }
+
+        for transaction in transactions:
+            transaction.refresh_from_db()
+
+        assert [transaction.state for transaction in transactions] == [
+            Transaction.States.Settled
+        ] * 3 + [
+            Transaction.States.Failed, Transaction.States.Canceled, Transaction.States.Pending
+        ]
+        assert transactions[3].fail_code == 'default'
+        assert transactions[5].data['status'] == BraintreeTransaction.Status.SubmittedForSettlement
+
+        # Silver pays the documents of the settled transactions on post_save
+        for transaction in transactions[:3]:
+            assert transaction.document.state == transaction.document.STATES.PAID
+
+    @pytest.mark.django_db
+    def test_fetch_transaction_status_shares_the_transaction_cache(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={
+                'braintree_id': 'beertrain'
+            }
+        )
+
+        with patch('braintree.transaction_gateway.TransactionGateway.find',
+                   return_value=self.transaction) as find_mock, \
+                patch_search(transactions=[self.transaction]):
+            payment_processor = get_instance(transaction.payment_processor)
+            payment_processor.fetch_transactions_status([transaction])
+
+            # the searched transactions are cached
+            assert payment_processor.find_braintree_transaction('beertrain') is self.transaction
+            assert find_mock.call_count == 0
+
+            assert payment_processor.find_braintree_transaction(
+                'beertrain', use_cache=False
+            ) is self.transaction
+            assert find_mock.call_count == 1
+
+    @pytest.mark.django_db
+    def test_client_token_is_cached_per_customer(self):
+        customer = CustomerFactory.create()
+        CustomerData.objects.create(customer=customer, data={'id': 'somethingelse'})
+
+        with patch('braintree.client_token_gateway.ClientTokenGateway.generate') as generate_mock:
+            generate_mock.return_value = 'client-token'
+
+            payment_processor = get_instance('BraintreeTriggered')
+            assert payment_processor.client_token(customer) == 'client-token'
+            assert payment_processor.client_token(customer) == 'client-token'
+
+            generate_mock.assert_called_once_with({'customer_id': 'somethingelse'})
+            assert payment_processor.client_tokens.stats['hits'] == 1
+            assert payment_processor.client_tokens.stats['misses'] == 1
+
+    @pytest.mark.django_db
+    def test_shared_client_token_is_not_served_past_its_expiry(self, locmem_cache):
+        customer = CustomerFactory.create()
+
+        with patch('braintree.client_token_gateway.ClientTokenGateway.generate',
+                   side_effect=['first-token', 'second-token']):
+            payment_processor = get_instance('BraintreeTriggered')
+            ttl = payment_processor.client_tokens.timeout
+
+            assert payment_processor.client_token(customer) == 'first-token'
+
+            # another process picks up the shared token halfway through its lifetime
+            payment_processor.client_tokens.clear()
+            with patch('silver_braintree.cache.time.time',
+                       return_value=time.time() + ttl / 2):
+                assert payment_processor.client_token(customer) == 'first-token'
+
+            # its local copy expires along with the shared entry
+            with patch('silver_braintree.cache.time.monotonic',
+                       return_value=time.monotonic() + ttl / 2 + 1), \
+                    patch('silver_braintree.cache.time.time',
+                          return_value=time.time() + ttl + 1):
+                assert payment_processor.client_token(customer) == 'second-token'
+
+    @pytest.mark.django_db
+    def test_client_token_cache_is_invalidated_when_customer_is_vaulted(self):
+        customer = CustomerFactory.create()
+
+        with patch('braintree.client_token_gateway.ClientTokenGateway.generate') as generate_mock:
+            generate_mock.side_effect = ['anonymous-token', 'vaulted-token']
+
+            payment_processor = get_instance('BraintreeTriggered')
+            assert payment_processor.client_token(customer) == 'anonymous-token'
+            assert payment_processor.client_token(customer) == 'anonymous-token'
+
+            payment_processor._update_customer(customer, self.transaction.customer_details)
+
+            assert payment_processor.client_token(customer) == 'vaulted-token'
+            assert generate_mock.call_args_list[-1][0][0] == {'customer_id': 'braintree_id'}
+
+    def test_execute_transactions_keeps_payment_method_order(self):
+        transactions = [
+            MagicMock(id=index, payment_method_id=index % 3) for index in range(30)
+        ]
+        charged = []
+
+        def execute_transaction(transaction):
+            charged.append(transaction)
+            return transaction.id % 2 == 0
+
+        payment_processor = get_instance('BraintreeTriggered')
+        with patch.object(payment_processor, 'execute_transaction',
+                          side_effect=execute_transaction):
+            results = payment_processor.execute_transactions(transactions, max_workers=3)
+
+        assert results == [
+            (transaction, transaction.id % 2 == 0) for transaction in transactions
+        ]
+        for payment_method_id in range(3):
+            assert [
+                transaction for transaction in charged
+                if transaction.payment_method_id == payment_method_id
+            ] == [
+                transaction for transaction in transactions
+                if transaction.payment_method_id == payment_method_id
+            ]
+
+    def test_execute_transactions_stops_on_cancel(self):
+        transactions = [MagicMock(id=index, payment_method_id=1) for index in range(5)]
+        cancel_event = threading.Event()
+
+        def execute_transaction(transaction):
+            if transaction.id == 1:
+                cancel_event.set()
+            return True
+
+        payment_processor = get_instance('BraintreeTriggered')
+        with patch.object(payment_processor, 'execute_transaction',
+                          side_effect=execute_transaction):
+            results = payment_processor.execute_transactions(transactions,
+                                                             cancel_event=cancel_event)
+
+        assert [result for _, result in results] == [True, True, None, None, None]
+
+    @pytest.mark.django_db
+    def test_recover_lost_transaction_id_filters_tracked_matches_in_one_query(self):
+        BraintreeTransactionFactory.create(external_reference='tracked')
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={
+                'requested_at': datetime.utcnow().isoformat()
+            }
+        )
+        search_result = MagicMock(ids=['tracked', 'beertrain'])
+
+        with patch('braintree.transaction_gateway.TransactionGateway.search',
+                   return_value=search_result):
+            payment_processor = get_instance(transaction.payment_processor)
+
+            with CaptureQueriesContext(connection) as queries:
+                assert payment_processor.recover_lost_transaction_id(transaction)
+
+        assert len(queries.captured_queries) == 1
+        assert transaction.data['braintree_id'] == 'beertrain'
+
+    @pytest.mark.django_db
+    def test_recover_lost_transaction_ids_searches_once_per_merged_window_and_token(self):
+        transactions = []
+        candidates = []
+
+        for token in ('kento', 'tokenzo'):
+            payment_method = BraintreeRecurringPaymentMethodFactory.create()
+            payment_method.token = token
+            payment_method.save()
+
+            transaction = BraintreeTransactionFactory.create(
+                payment_method=payment_method, state=Transaction.States.Pending, data={
+                    'requested_at': datetime.utcnow().isoformat()
+                }
+            )
+            transactions.append(transaction)
+
+            candidate = MagicMock(id='bt-{}'.format(transaction.id),
+                                  amount=transaction.amount,
+                                  created_at=datetime.utcnow())
+            candidate.credit_card_details.token = None
+            candidate.paypal_details.token = token
+            candidates.append(candidate)
+
+        with patch_search(return_value=MagicMock(items=candidates,
+                                                 maximum_size=len(candidates))) as (search_mock, _):
+            payment_processor = get_instance('BraintreeTriggeredRecurring')
+            outcomes = payment_processor.recover_lost_transaction_ids(transactions)
+
+        window_searches = [
+            {criterion.name: criterion.to_param() for criterion in criteria}
+            for criteria, _ in search_mock.call_args_list if criteria[0].name != 'ids'
+        ]
+        # the merged window is searched once for each payment method token
+        assert [search['payment_method_token'] for search in window_searches] == [
+            {'is': 'kento'}, {'is': 'tokenzo'}
+        ]
+        assert outcomes == {transaction.id: True for transaction in transactions}
+        for transaction in transactions:
+            assert transaction.external_reference == 'bt-{}'.format(transaction.id)
+
+    @pytest.mark.django_db
+    def test_recover_lost_transaction_ids_skips_unrequested_transactions(self):
+        unrequested_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={}
+        )
+        payment_method = BraintreePaymentMethodFactory.create()
+        payment_method.token = 'kento'
+        payment_method.save()
+        transaction = BraintreeTransactionFactory.create(
+            payment_method=payment_method, state=Transaction.States.Pending, data={
+                'requested_at': datetime.utcnow().isoformat()
+            }
+        )
+        candidate = MagicMock(id='beertrain', amount=transaction.amount,
+                              created_at=datetime.utcnow())
+        candidate.credit_card_details.token = 'kento'
+
+        with patch_search(return_value=MagicMock(items=[candidate], maximum_size=1)):
+            payment_processor = get_instance('BraintreeTriggered')
+            outcomes = payment_processor.recover_lost_transaction_ids(
+                [unrequested_transaction, transaction]
+            )
+
+            assert not payment_processor.recover_lost_transaction_id(unrequested_transaction)
+
+        assert outcomes == {unrequested_transaction.id: False, transaction.id: True}
+        assert transaction.external_reference == 'beertrain'
+
+        unrequested_transaction.refresh_from_db()
+        assert unrequested_transaction.state == Transaction.States.Pending
+
+    @pytest.mark.django_db
+    def test_recover_lost_transaction_ids_splits_truncated_searches(self):
+        transactions = [
+            BraintreeTransactionFactory.create(state=Transaction.States.Pending, data={
+                'requested_at': datetime.utcnow().isoformat()
+            })
+            for _ in range(2)
+        ]
+
+        payment_processor = get_instance('BraintreeTriggered')
+        truncated_result = MagicMock(items=[],
+                                     maximum_size=payment_processor.transaction_search_limit)
+
+        with patch('braintree.transaction_gateway.TransactionGateway.search',
+                   return_value=truncated_result) as search_mock, \
+                patch.object(payment_processor, 'recover_lost_transaction_id',
+                             return_value=False) as recover_mock:
+            outcomes = payment_processor.recover_lost_transaction_ids(transactions)
+
+        # the merged window and then each transaction's window reach the limit
+        assert search_mock.call_count == 3
+        assert recover_mock.call_count == 2
+        assert outcomes == {transaction.id: False for transaction in transactions}
+
+        # no transaction is failed on a truncated search
+        for transaction in transactions:
+            transaction.refresh_from_db()
+            assert transaction.state == Transaction.States.Pending
+
+    @pytest.mark.django_db
+    def test_recover_lost_transaction_id_by_order_id(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={
+                'requested_at': datetime.utcnow().isoformat(),
+                'order_id': 'some-uuid'
+            }
+        )
+
+        with patch('braintree.transaction_gateway.TransactionGateway.search',
+                   return_value=self.search_result) as search_mock:
+            payment_processor = get_instance(transaction.payment_processor)
+            assert payment_processor.recover_lost_transaction_id(transaction)
+
+        search_mock.assert_called_once()
+        (order_id_node, ), _ = search_mock.call_args
+        assert order_id_node.name == 'order_id'
+        assert order_id_node.dict == {'is': 'some-uuid'}
+
+        assert (transaction.data['braintree_id'] ==
+                transaction.external_reference ==
+                self.transaction.id)
+
+    @pytest.mark.django_db
+    def test_process_transaction_skips_unneeded_writes(self):
+        payment_method = BraintreeRecurringPaymentMethodFactory.create(
+            verified=True, display_info=self.transaction.paypal_details.payer_email
+        )
+        payment_method.token = 'kento'
+        payment_method.update_details({
+            'type': self.transaction.payment_instrument_type,
+            'image_url': self.transaction.paypal_details.image_url,
+            'email': self.transaction.paypal_details.payer_email,
+        })
+        payment_method.save()
+
+        CustomerData.objects.create(customer=payment_method.customer,
+                                    data={'id': 'somethingelse'})
+        transaction = BraintreeTransactionFactory.create(payment_method=payment_method)
+
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock:
+            sale_mock.return_value = self.result
+            payment_processor = get_instance(transaction.payment_processor)
+
+            with CaptureQueriesContext(connection) as queries:
+                assert payment_processor.process_transaction(transaction)
+
+        def updates(model):
+            return [
+                query for query in queries.captured_queries
+                if query['sql'].startswith('UPDATE "{}"'.format(model._meta.db_table))
+            ]
+
+        # process, requested_at and the final status
+        assert len(updates(Transaction)) == 3
+        assert not updates(PaymentMethod)
+        assert not updates(CustomerData)
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Settled
+        assert transaction.external_reference == self.transaction.id
+        assert transaction.data['requested_at']
+
+    def test_payment_processors_have_their_own_gateways(self):
+        payment_processors = [
+            payment_processor_class(
+                name, environment=braintree.Environment.Sandbox, merchant_id=name,
+                public_key='public-key', private_key='private-key'
+            )
+            for payment_processor_class, name in [(BraintreeTriggered, 'first-merchant'),
+                                                  (BraintreeTriggeredRecurring, 'second-merchant')]
+        ]
+
+        with patch('braintree.util.http.Http._make_request',
+                   return_value={'client_token': {'value': 'client-token'}}) as request_mock:
+            for payment_processor in payment_processors:
+                payment_processor._call_gateway(
+                    'client_token.generate', payment_processor.gateway.client_token.generate
+                )
+
+        assert [payment_processor.gateway.config.merchant_id
+                for payment_processor in payment_processors] == ['first-merchant',
+                                                                 'second-merchant']
+        assert [call[0][1] for call in request_mock.call_args_list] == [
+            '/merchants/first-merchant/client_token',
+            '/merchants/second-merchant/client_token',
+        ]
@@ -0,0 +1,99 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from io import StringIO
+
+import pytest
+from mock import MagicMock, patch
+from braintree import Transaction as BraintreeTransaction
+
+from django.core.management import call_command
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from tests.factories import BraintreeTransactionFactory
+
+
+class TestPoller:
+    def setup_method(self):
+        self.fetched_ids = []
+
+    def fetch(self, query, braintree_ids):
+        self.fetched_ids.append(braintree_ids)
+
+        return [
+            MagicMock(id=braintree_id, status=BraintreeTransaction.Status.Settled)
+            for braintree_id in braintree_ids if braintree_id.endswith('settled')
+        ]
+
+    def create_transactions(self):
+        transactions = [
+            BraintreeTransactionFactory.create(
+                state=Transaction.States.Pending,
+                data={'braintree_id': 'train-{}-{}'.format(
+                    index, 'settled' if index % 2 else 'pending'
+                )}
+            ) for index in range(5)
+        ]
+        BraintreeTransactionFactory.create(state=Transaction.States.Settled,
+                                           data={'braintree_id': 'settledtrain'})
+
+        return transactions
+
+    @pytest.mark.django_db
+    def test_shards_split_the_pending_transactions(self):
+        transactions = self.create_transactions()
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway._TransactionGateway__fetch',
+                   side_effect=self.fetch):
+            counts = [payment_processor.poll_pending_transactions(shard, 2)
+                      for shard in range(2)]
+
+        assert len(self.fetched_ids) == 2
+        assert not set(self.fetched_ids[0]) & set(self.fetched_ids[1])
+        assert sorted(self.fetched_ids[0] + self.fetched_ids[1]) == sorted(
+            transaction.data['braintree_id'] for transaction in transactions
+        )
+
+        assert sum(shard_counts['polled'] for shard_counts in counts) == 5
+        assert sum(shard_counts['transitioned'] for shard_counts in counts) == 2
+
+    @pytest.mark.django_db
+    def test_transactions_are_polled_once_per_sweep(self):
+        transactions = self.create_transactions()
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway._TransactionGateway__fetch',
+                   side_effect=self.fetch):
+            counts = payment_processor.poll_pending_transactions(batch_size=2)
+
+        # the transactions left pending aren't polled again
+        assert [len(braintree_ids) for braintree_ids in self.fetched_ids] == [2, 2, 1]
+        assert sorted(sum(self.fetched_ids, [])) == sorted(
+            transaction.data['braintree_id'] for transaction in transactions
+        )
+        assert counts == {'polled': 5, 'transitioned': 2}
+
+    @pytest.mark.django_db
+    def test_poll_braintree_transactions_command(self):
+        self.create_transactions()
+
+        stdout = StringIO()
+        with patch('braintree.transaction_gateway.TransactionGateway._TransactionGateway__fetch',
+                   side_effect=self.fetch):
+            call_command('poll_braintree_transactions', processors=['BraintreeTriggered'],
+                         stdout=stdout)
+
+        assert stdout.getvalue().startswith('Shard 0: 5 polled, 2 transitioned in ')
@@ -0,0 +1,149 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timedelta
+from io import StringIO
+
+import pytest
+from mock import MagicMock
+from braintree import Transaction as BraintreeTransaction
+
+from django.core.management import call_command
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.reconciliation import ReconciliationReport
+from tests.factories import BraintreeTransactionFactory, patch_search
+
+
+START = datetime(2026, 10, 1)
+END = datetime(2026, 10, 1, 1)
+
+
+def get_result_transaction(braintree_id, transaction=None, **kwargs):
+    attributes = {
+        'id': braintree_id,
+        'status': BraintreeTransaction.Status.Settled,
+        'amount': transaction.amount if transaction else 10,
+        'currency_iso_code': transaction.currency if transaction else 'USD',
+        'order_id': None
+    }
+    attributes.update(kwargs)
+
+    return MagicMock(**attributes)
+
+
+class TestSettlementReconciliation:
+    @pytest.mark.django_db
+    def test_reconcile_settlements(self):
+        settled_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, external_reference='beertrain',
+            data={'braintree_id': 'beertrain'}
+        )
+        lost_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, external_reference=None, data={}
+        )
+        mismatched_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, external_reference='winetrain',
+            data={'braintree_id': 'winetrain'}
+        )
+
+        result_transactions = [
+            get_result_transaction('beertrain', settled_transaction),
+            get_result_transaction('losttrain', lost_transaction,
+                                   order_id=str(lost_transaction.uuid)),
+            get_result_transaction('winetrain', mismatched_transaction,
+                                   amount=mismatched_transaction.amount + 1),
+            get_result_transaction('ghosttrain', order_id='not-a-uuid'),
+        ]
+
+        payment_processor = get_instance('BraintreeTriggered')
+        payment_processor.reconciliation_batch_size = 3
+
+        with patch_search(return_value=MagicMock(maximum_size=4, items=result_transactions)):
+            report = payment_processor.reconcile_settlements(START, END)
+
+        assert report.counts == {
+            'searched': 4,
+            'matched': 3,
+            'updated': 2,
+            ReconciliationReport.AMOUNT_MISMATCH: 1,
+            ReconciliationReport.UNKNOWN_TRANSACTION: 1
+        }
+        assert [(mismatch.kind, mismatch.braintree_id) for mismatch in report.mismatches] == [
+            (ReconciliationReport.AMOUNT_MISMATCH, 'winetrain'),
+            (ReconciliationReport.UNKNOWN_TRANSACTION, 'ghosttrain'),
+        ]
+
+        settled_transaction.refresh_from_db()
+        assert settled_transaction.state == Transaction.States.Settled
+
+        lost_transaction.refresh_from_db()
+        assert lost_transaction.state == Transaction.States.Settled
+        assert lost_transaction.external_reference == 'losttrain'
+
+        mismatched_transaction.refresh_from_db()
+        assert mismatched_transaction.state == Transaction.States.Pending
+
+    def test_windows_reaching_the_search_limit_are_split(self):
+        payment_processor = get_instance('BraintreeTriggered')
+        payment_processor.transaction_search_limit = 2
+
+        searched_ranges = []
+
+        def search(criteria):
+            searched_ranges.append((criteria.to_param()['min'], criteria.to_param()['max']))
+            maximum_size = 2 if len(searched_ranges) == 1 else 1
+
+            return MagicMock(maximum_size=maximum_size,
+                             items=[get_result_transaction(len(searched_ranges))])
+
+        with patch_search(side_effect=search):
+            result_transactions = list(
+                payment_processor._search_transactions_between('settled_at', START, END)
+            )
+
+        assert [result_transaction.id for result_transaction in result_transactions] == [2, 3]
+        assert searched_ranges == [
+            (START, END - timedelta(seconds=1)),
+            (START, START + timedelta(minutes=30) - timedelta(seconds=1)),
+            (START + timedelta(minutes=30), END - timedelta(seconds=1)),
+        ]
+
+    def test_time_range_is_split_in_windows(self):
+        payment_processor = get_instance('BraintreeTriggered')
+        assert list(payment_processor._iter_search_windows(
+            START, END - timedelta(microseconds=1), timedelta(minutes=25)
+        )) == [
+            (START, START + timedelta(minutes=25)),
+            (START + timedelta(minutes=25), START + timedelta(minutes=50)),
+            (START + timedelta(minutes=50), END),
+        ]
+
+    @pytest.mark.django_db
+    def test_command_writes_the_mismatches(self):
+        stdout = StringIO()
+
+        with patch_search(return_value=MagicMock(maximum_size=1,
+                                                 items=[get_result_transaction('ghosttrain')])):
+            call_command('reconcile_braintree_settlements', '--processor=BraintreeTriggered',
+                         '--start=2026-10-01T00:00', '--end=2026-10-01T01:00',
+                         stdout=stdout, stderr=StringIO())
+
+        assert stdout.getvalue().splitlines() == [
+            'kind,braintree_id,transaction_id,details',
+            '{},ghosttrain,,"{{""status"": ""settled""}}"'.format(
+                ReconciliationReport.UNKNOWN_TRANSACTION
+            )
+        ]
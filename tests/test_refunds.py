@@ -0,0 +1,253 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+from io import StringIO
+
+import pytest
+from mock import MagicMock, patch
+from braintree import Transaction as BraintreeTransaction
+from braintree.error_codes import ErrorCodes
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.refunds import RefundReport
+from tests.factories import BraintreeTransactionFactory
+
+
+def create_settled_transaction(braintree_id, **data):
+    return BraintreeTransactionFactory.create(
+        state=Transaction.States.Settled, external_reference=braintree_id,
+        data=dict(data, braintree_id=braintree_id)
+    )
+
+
+def successful_result(braintree_id, status=BraintreeTransaction.Status.SubmittedForSettlement):
+    return MagicMock(is_success=True, transaction=MagicMock(id=braintree_id, status=status))
+
+
+def error_result(*codes):
+    return MagicMock(is_success=False, message='Declined', transaction=None,
+                     errors=MagicMock(deep_errors=[MagicMock(code=code) for code in codes]))
+
+
+def refund_by_id(braintree_id, amount_or_options=None):
+    return successful_result('refund-{}'.format(braintree_id))
+
+
+class TestRefunds:
+    @pytest.mark.django_db
+    def test_refund_transaction(self):
+        transaction = create_settled_transaction('beertrain')
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway.refund',
+                   side_effect=refund_by_id) as refund_mock:
+            assert payment_processor.refund_transaction(transaction)
+
+        refund_mock.assert_called_once_with('beertrain')
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Refunded
+        assert transaction.data['refund_id'] == 'refund-beertrain'
+
+    @pytest.mark.django_db
+    def test_refund_transaction_declined(self):
+        transaction = create_settled_transaction('beertrain')
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway.refund',
+                   return_value=error_result(ErrorCodes.Transaction.CannotRefundUnlessSettled)):
+            assert not payment_processor.refund_transaction(transaction)
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Settled
+        assert transaction.data['refund_error_codes'] == [
+            ErrorCodes.Transaction.CannotRefundUnlessSettled
+        ]
+
+    @pytest.mark.django_db
+    def test_refund_transaction_already_refunded_by_braintree(self):
+        transaction = create_settled_transaction('beertrain')
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch.multiple(
+            'braintree.transaction_gateway.TransactionGateway',
+            refund=MagicMock(return_value=error_result(
+                ErrorCodes.Transaction.HasAlreadyBeenRefunded
+            )),
+            find=MagicMock(return_value=MagicMock(refund_ids=['refund-beertrain']))
+        ):
+            assert payment_processor.refund_transaction(transaction)
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Refunded
+        assert transaction.data['refund_id'] == 'refund-beertrain'
+
+    @pytest.mark.django_db
+    def test_refund_transaction_checks_unanswered_refund_requests(self):
+        transaction = create_settled_transaction(
+            'beertrain', refund_requested_at='2026-10-01T00:00:00'
+        )
+        payment_processor = get_instance('BraintreeTriggered')
+
+        refund_mock = MagicMock()
+        find_mock = MagicMock(return_value=MagicMock(refund_ids=['refund-beertrain']))
+        with patch.multiple('braintree.transaction_gateway.TransactionGateway',
+                            refund=refund_mock, find=find_mock):
+            report = RefundReport()
+            assert payment_processor.refund_transaction(transaction, report=report)
+
+        find_mock.assert_called_once_with('beertrain')
+        refund_mock.assert_not_called()
+        assert report.counts == {report.ALREADY_REFUNDED: 1}
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Refunded
+
+    @pytest.mark.django_db
+    def test_refund_transaction_only_refunds_to_the_charged_payment_method(self):
+        transaction = create_settled_transaction('beertrain')
+        other_transaction = create_settled_transaction('ghosttrain')
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway.refund') as refund_mock:
+            assert not payment_processor.refund_transaction(
+                transaction, payment_method=other_transaction.payment_method
+            )
+
+        refund_mock.assert_not_called()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_refund_transactions(self):
+        transactions = [
+            create_settled_transaction('train-{}'.format(index)) for index in range(3)
+        ]
+        pending_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={'braintree_id': 'pendingtrain'}
+        )
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway.refund',
+                   side_effect=refund_by_id) as refund_mock:
+            report = payment_processor.refund_transactions(
+                transactions + [pending_transaction, transactions[0]], max_workers=1
+            )
+
+            assert refund_mock.call_count == 3
+            assert report.counts == {
+                report.REFUNDED: 3, report.ALREADY_REFUNDED: 1, report.SKIPPED: 1
+            }
+            assert {
+                result.refund_id for result in report.results
+                if result.outcome == report.REFUNDED
+            } == {'refund-train-0', 'refund-train-1', 'refund-train-2'}
+
+            # running the same refunds again doesn't refund anything
+            report = payment_processor.refund_transactions(transactions, max_workers=1)
+
+            assert refund_mock.call_count == 3
+            assert report.counts == {report.ALREADY_REFUNDED: 3}
+
+    @pytest.mark.django_db(transaction=True)
+    def test_refund_braintree_transactions_command(self, tmp_path):
+        transaction = create_settled_transaction('beertrain')
+        declined_transaction = create_settled_transaction('ghosttrain')
+
+        unknown_uuid = '00000000-0000-0000-0000-000000000000'
+        uuids_file = tmp_path / 'transactions.txt'
+        uuids_file.write_text('\n'.join([str(transaction.uuid),
+                                         str(declined_transaction.uuid), unknown_uuid]))
+
+        def refund(braintree_id, amount_or_options=None):
+            if braintree_id == 'ghosttrain':
+                return error_result(ErrorCodes.Transaction.CannotRefundUnlessSettled)
+
+            return refund_by_id(braintree_id)
+
+        stdout = StringIO()
+        with patch('braintree.transaction_gateway.TransactionGateway.refund',
+                   side_effect=refund):
+            with pytest.raises(CommandError):
+                call_command('refund_braintree_transactions', str(uuids_file),
+                             processor='BraintreeTriggered', workers=1, stdout=stdout,
+                             stderr=StringIO())
+
+        rows = {row['transaction_uuid']: row for row in csv.DictReader(StringIO(
+            stdout.getvalue()
+        ))}
+        assert rows[str(transaction.uuid)]['outcome'] == RefundReport.REFUNDED
+        assert rows[str(transaction.uuid)]['refund_id'] == 'refund-beertrain'
+        assert rows[str(declined_transaction.uuid)]['outcome'] == RefundReport.FAILED
+        assert rows[unknown_uuid]['outcome'] == RefundReport.SKIPPED
+
+
+class TestVoids:
+    @pytest.mark.django_db
+    def test_void_transaction(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={'braintree_id': 'beertrain'}
+        )
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway.void',
+                   return_value=successful_result(
+                       'beertrain', BraintreeTransaction.Status.Voided
+                   )) as void_mock:
+            assert payment_processor.void_transaction(transaction)
+
+        void_mock.assert_called_once_with('beertrain')
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Canceled
+
+    @pytest.mark.django_db
+    def test_void_transaction_already_voided(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={'braintree_id': 'beertrain'}
+        )
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch.multiple(
+            'braintree.transaction_gateway.TransactionGateway',
+            void=MagicMock(return_value=error_result(ErrorCodes.Transaction.CannotBeVoided)),
+            find=MagicMock(return_value=MagicMock(id='beertrain',
+                                                  status=BraintreeTransaction.Status.Voided))
+        ):
+            assert payment_processor.void_transaction(transaction)
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Canceled
+
+    @pytest.mark.django_db
+    def test_void_transaction_of_a_settled_braintree_transaction(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={'braintree_id': 'beertrain'}
+        )
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch.multiple(
+            'braintree.transaction_gateway.TransactionGateway',
+            void=MagicMock(return_value=error_result(ErrorCodes.Transaction.CannotBeVoided)),
+            find=MagicMock(return_value=MagicMock(id='beertrain',
+                                                  status=BraintreeTransaction.Status.Settled))
+        ):
+            assert not payment_processor.void_transaction(transaction)
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Pending
+        assert transaction.data['void_error_codes'] == [ErrorCodes.Transaction.CannotBeVoided]
@@ -0,0 +1,117 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from mock import MagicMock, patch
+
+from django.conf import settings
+from django.test import override_settings
+
+from silver.models import Transaction
+
+from silver_braintree.metrics import NullMetrics
+from silver_braintree.payment_processors import BraintreeTriggered
+from silver_braintree.registry import get_payment_processor
+from tests.factories import BraintreeTransactionFactory
+
+
+class OtherMetrics(NullMetrics):
+    pass
+
+
+def test_get_payment_processor_returns_the_same_instance():
+    payment_processor = get_payment_processor('BraintreeTriggered')
+
+    assert isinstance(payment_processor, BraintreeTriggered)
+    assert get_payment_processor('BraintreeTriggered') is payment_processor
+    assert get_payment_processor('BraintreeTriggeredRecurring') is not payment_processor
+
+
+def test_get_payment_processor_raises_for_unknown_names():
+    with pytest.raises(KeyError):
+        get_payment_processor('Unknown')
+
+
+def test_payment_processors_are_resolved_again_when_settings_change():
+    payment_processor = get_payment_processor('BraintreeTriggered')
+
+    payment_processors = dict(settings.PAYMENT_PROCESSORS)
+    payment_processors['BraintreeTriggered'] = dict(
+        payment_processors['BraintreeTriggered'], class_name='changed'
+    )
+    with override_settings(PAYMENT_PROCESSORS=payment_processors):
+        overridden_payment_processor = get_payment_processor('BraintreeTriggered')
+        assert overridden_payment_processor is not payment_processor
+
+    assert get_payment_processor('BraintreeTriggered') is not overridden_payment_processor
+
+
+@pytest.mark.django_db
+def test_processors_only_handle_their_own_transactions():
+    transactions = BraintreeTransactionFactory.create_batch(
+        3, state=Transaction.States.Pending
+    )
+
+    payment_processors = dict(settings.PAYMENT_PROCESSORS)
+    payment_processors['OtherBraintreeTriggered'] = payment_processors['BraintreeTriggered']
+    with override_settings(PAYMENT_PROCESSORS=payment_processors):
+        payment_processor = get_payment_processor('OtherBraintreeTriggered')
+
+        with patch('braintree.transaction_gateway.TransactionGateway._TransactionGateway__fetch') \
+                as fetch_mock:
+            outcomes = payment_processor.fetch_transactions_status(
+                Transaction.objects.filter(id__in=[t.id for t in transactions])
+            )
+
+        assert not payment_processor.execute_transaction(transactions[0])
+
+    assert outcomes == {transaction.id: False for transaction in transactions}
+    fetch_mock.assert_not_called()
+
+
+def test_collaborators_are_rebuilt_when_settings_change():
+    payment_processor = get_payment_processor('BraintreeTriggered')
+    assert payment_processor.http_transport.read_timeout == 60
+    assert payment_processor.circuit_breaker.threshold == 5
+    assert isinstance(payment_processor.metrics, NullMetrics)
+
+    single_flight = payment_processor.single_flight
+    payment_processor._cache_braintree_transaction(MagicMock(id='beertrain'))
+
+    payment_processors = dict(settings.PAYMENT_PROCESSORS)
+    payment_processors['BraintreeTriggered'] = dict(
+        payment_processors['BraintreeTriggered'],
+        setup_data=dict(payment_processors['BraintreeTriggered']['setup_data'],
+                        http_read_timeout=5, circuit_breaker_threshold=2,
+                        metrics_backend=OtherMetrics,
+                        read_rate_limit=10, concurrency_max_limit=4)
+    )
+    with override_settings(PAYMENT_PROCESSORS=payment_processors):
+        payment_processor = get_payment_processor('BraintreeTriggered')
+
+        assert payment_processor.http_transport.read_timeout == 5
+        assert payment_processor.circuit_breaker.threshold == 2
+        assert isinstance(payment_processor.metrics, OtherMetrics)
+        assert payment_processor.rate_limiters['read'].rate == 10
+        assert payment_processor.concurrency_limiter.max_limit == 4
+        assert payment_processor.single_flight is not single_flight
+        # the transactions cached through the old options aren't served anymore
+        assert payment_processor.braintree_transactions.get('beertrain') is None
+
+    payment_processor = get_payment_processor('BraintreeTriggered')
+    assert payment_processor.http_transport.read_timeout == 60
+    assert payment_processor.circuit_breaker.threshold == 5
+    assert isinstance(payment_processor.metrics, NullMetrics)
+    assert payment_processor.rate_limiters == {}
+    assert payment_processor.concurrency_limiter is None
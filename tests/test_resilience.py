@@ -0,0 +1,133 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from mock import patch
+from braintree.exceptions import NotFoundError, ServerError
+
+
+from silver.fixtures.factories import CustomerFactory
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from silver_braintree.throttling import RateLimiter, ThrottledError
+from tests.factories import BraintreeTransactionFactory
+
+
+class TestCircuitBreaker:
+    def get_payment_processor(self, threshold=2):
+        payment_processor = get_instance('BraintreeTriggered')
+        payment_processor.circuit_breaker = CircuitBreaker('test', threshold=threshold,
+                                                           reset_timeout=30)
+        payment_processor.retry_policy = RetryPolicy(attempts=3, base_delay=0)
+
+        return payment_processor
+
+    @pytest.mark.django_db
+    def test_idempotent_calls_are_retried(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending, data={'braintree_id': 'beertrain'}
+        )
+        payment_processor = self.get_payment_processor(threshold=5)
+
+        with patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock:
+            find_mock.side_effect = [ServerError(), ServerError(), NotFoundError()]
+
+            assert not payment_processor.fetch_transaction_status(transaction)
+
+        assert find_mock.call_count == 3
+
+    @pytest.mark.django_db
+    def test_sales_are_not_retried(self):
+        transaction = BraintreeTransactionFactory.create(state=Transaction.States.Pending)
+        transaction.payment_method.nonce = 'some-nonce'
+        transaction.payment_method.save()
+
+        payment_processor = self.get_payment_processor()
+
+        with patch('braintree.transaction_gateway.TransactionGateway.sale',
+                   side_effect=ServerError()) as sale_mock:
+            with pytest.raises(ServerError):
+                payment_processor.execute_transaction(transaction)
+
+        assert sale_mock.call_count == 1
+
+    @pytest.mark.django_db
+    def test_open_breaker_fails_fast(self, locmem_cache):
+        payment_processor = self.get_payment_processor()
+        customer = CustomerFactory.create()
+
+        with patch('braintree.client_token_gateway.ClientTokenGateway.generate',
+                   side_effect=ServerError()) as generate_mock:
+            # the retries of the first call open the breaker
+            assert payment_processor.client_token(customer) is None
+            assert generate_mock.call_count == 2
+
+            assert payment_processor.client_token(customer) is None
+            assert generate_mock.call_count == 2
+
+    def test_breaker_state_is_shared(self, locmem_cache):
+        CircuitBreaker('shared', threshold=1).record_failure()
+
+        with pytest.raises(CircuitOpenError):
+            CircuitBreaker('shared').before_call()
+
+    def test_half_open_breaker_lets_a_single_probe_through(self, locmem_cache):
+        circuit_breaker = CircuitBreaker('probe', threshold=1, reset_timeout=30)
+        circuit_breaker.record_failure()
+
+        with patch('silver_braintree.resilience.time.time',
+                   return_value=circuit_breaker.get_open_until()):
+            assert circuit_breaker.before_call()
+
+            with pytest.raises(CircuitOpenError):
+                CircuitBreaker('probe').before_call()
+
+            circuit_breaker.record_success(probe=True)
+
+        assert circuit_breaker.get_open_until() is None
+        assert not CircuitBreaker('probe').before_call()
+
+    def test_throttled_probe_is_released(self, locmem_cache):
+        payment_processor = self.get_payment_processor(threshold=1)
+        payment_processor.rate_limiters = {'read': RateLimiter('probe', rate=1, timeout=0)}
+
+        circuit_breaker = payment_processor.circuit_breaker
+        circuit_breaker.record_failure()
+
+        with patch('silver_braintree.resilience.time.time',
+                   return_value=circuit_breaker.get_open_until()), \
+                patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock:
+            # the token bucket is empty when the half-open breaker lets the probe through
+            payment_processor.rate_limiters['read'].acquire()
+
+            with pytest.raises(ThrottledError):
+                payment_processor._call_gateway('transaction.find', find_mock, 'beertrain',
+                                                idempotent=True)
+            assert not find_mock.called
+
+            # the next call probes Braintree, instead of failing fast
+            assert CircuitBreaker('test').before_call()
+
+    def test_failed_probe_opens_the_breaker_again(self):
+        circuit_breaker = CircuitBreaker('reopen', threshold=1, reset_timeout=30)
+        circuit_breaker.record_failure()
+        open_until = circuit_breaker.get_open_until()
+
+        with patch('silver_braintree.resilience.time.time', return_value=open_until):
+            assert circuit_breaker.before_call()
+            circuit_breaker.record_failure(probe=True)
+
+            with pytest.raises(CircuitOpenError):
+                circuit_breaker.before_call()
@@ -0,0 +1,94 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import subprocess
+import sys
+
+from silver_braintree.sdk import LazyModule
+
+
+# Starts Django with a Braintree payment processor, in a fresh interpreter, and reports how long
+# it took and whether the Braintree SDK got imported.
+STARTUP_SCRIPT = '''
+import json
+import sys
+import time
+
+started_at = time.perf_counter()
+
+import django
+from django.conf import settings
+
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    PAYMENT_METHOD_SECRET=b'MOW_x1k-ayes3KqnFHNZUxvKipC8iLjxiczEN76TIEA=',
+    PAYMENT_PROCESSORS={
+        'BraintreeTriggered': {
+            'setup_data': {'environment': 'sandbox', 'merchant_id': 'merchant-id',
+                           'public_key': 'public-key', 'private_key': 'private-key'},
+            'class': 'silver_braintree.payment_processors.BraintreeTriggered',
+        },
+    },
+    INSTALLED_APPS=('dal', 'dal_select2', 'django.contrib.auth',
+                    'django.contrib.contenttypes', 'django.contrib.sessions',
+                    'django.contrib.staticfiles', 'django.contrib.admin', 'silver',
+                    'silver_braintree'),
+    USE_TZ=True,
+    SECRET_KEY='dummy'
+)
+django.setup()
+
+import silver_braintree.api.views
+from silver.payment_processors import get_instance
+
+get_instance('BraintreeTriggered')
+
+startup = time.perf_counter() - started_at
+braintree_imported = 'braintree' in sys.modules
+
+started_at = time.perf_counter()
+get_instance('BraintreeTriggered').gateway
+
+print(json.dumps({
+    'startup': startup,
+    'braintree_imported': braintree_imported,
+    'sdk_import': time.perf_counter() - started_at,
+}))
+'''
+
+
+def run_startup_script():
+    """
+    :return: The seconds taken by the Django startup and by the first gateway use, and whether
+             the Braintree SDK got imported during the startup.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT], cwd=root)
+
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def test_django_startup_does_not_import_the_sdk():
+    assert not run_startup_script()['braintree_imported']
+
+
+def test_lazy_module():
+    lazy_module = LazyModule('json')
+
+    assert lazy_module._module is None
+    assert lazy_module.dumps([]) == '[]'
+    assert lazy_module._module is json
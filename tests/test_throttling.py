@@ -0,0 +1,145 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import braintree
+import pytest
+from mock import MagicMock, patch
+
+
+from silver.fixtures.factories import CustomerFactory
+from silver.payment_processors import get_instance
+from silver_braintree.throttling import (AdaptiveConcurrencyLimiter, RateLimiter,
+                                         ThrottledError)
+from tests.factories import patch_search
+
+
+class TestRateLimiter:
+    def test_budget_is_shared(self, locmem_cache):
+        with patch('silver_braintree.throttling.time.time', return_value=1000.5):
+            RateLimiter('shared', rate=2).acquire()
+            RateLimiter('shared', rate=2).acquire()
+
+            with pytest.raises(ThrottledError):
+                RateLimiter('shared', rate=2).acquire(timeout=0)
+
+    def test_budget_is_refilled(self, locmem_cache):
+        rate_limiter = RateLimiter('refilled', rate=1)
+
+        with patch('silver_braintree.throttling.time.time', return_value=2000.5):
+            rate_limiter.acquire()
+
+        with patch('silver_braintree.throttling.time.time', return_value=2001.5):
+            rate_limiter.acquire(timeout=0)
+
+    def test_local_budget_without_a_shared_cache(self):
+        rate_limiter = RateLimiter('local', rate=1)
+        rate_limiter.acquire()
+
+        with pytest.raises(ThrottledError):
+            rate_limiter.acquire(timeout=0)
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def test_limit_is_reached(self):
+        concurrency_limiter = AdaptiveConcurrencyLimiter(max_limit=1)
+        concurrency_limiter.acquire()
+
+        with pytest.raises(ThrottledError):
+            concurrency_limiter.acquire(timeout=0)
+
+        concurrency_limiter.release(latency=0.1)
+        concurrency_limiter.acquire(timeout=0)
+
+    def test_limit_is_adjusted(self):
+        concurrency_limiter = AdaptiveConcurrencyLimiter(max_limit=8, initial_limit=4,
+                                                         latency_target=1)
+
+        for _ in range(4):
+            concurrency_limiter.acquire()
+            concurrency_limiter.release(latency=0.1)
+        assert concurrency_limiter.limit == pytest.approx(5, rel=0.05)
+
+        concurrency_limiter.acquire()
+        concurrency_limiter.release(latency=2)
+        assert concurrency_limiter.limit == pytest.approx(2.5, rel=0.05)
+
+        # the limit is decreased at most once per latency target
+        concurrency_limiter.acquire()
+        concurrency_limiter.release(latency=0.1, failed=True)
+        assert concurrency_limiter.limit == pytest.approx(2.5, rel=0.05)
+
+
+class TestThrottledCalls:
+    def test_reads_and_writes_have_separate_budgets(self):
+        payment_processor = get_instance('BraintreeTriggered')
+        payment_processor.rate_limiters = {'write': RateLimiter('writes', rate=1)}
+        payment_processor.rate_limiters['write'].acquire()
+
+        with patch('braintree.transaction_gateway.TransactionGateway.find') as find_mock:
+            payment_processor._call_gateway('transaction.find', find_mock, 'beertrain',
+                                            idempotent=True)
+        assert find_mock.call_count == 1
+
+        with patch('braintree.transaction_gateway.TransactionGateway.sale') as sale_mock, \
+                patch.object(RateLimiter, 'acquire', side_effect=ThrottledError()), \
+                patch.object(payment_processor.circuit_breaker,
+                             'record_failure') as record_failure_mock:
+            with pytest.raises(ThrottledError):
+                payment_processor._call_gateway('transaction.sale', sale_mock, {})
+
+        assert not sale_mock.called
+        assert not record_failure_mock.called
+
+    def test_concurrency_limiter_is_released(self):
+        payment_processor = get_instance('BraintreeTriggered')
+        payment_processor.concurrency_limiter = AdaptiveConcurrencyLimiter(max_limit=1)
+
+        with patch('braintree.transaction_gateway.TransactionGateway.sale',
+                   side_effect=ValueError()) as sale_mock:
+            with pytest.raises(ValueError):
+                payment_processor._call_gateway('transaction.sale', sale_mock, {})
+
+        assert payment_processor.concurrency_limiter.in_flight == 0
+
+    @pytest.mark.django_db
+    def test_client_token_is_none_when_throttled(self):
+        customer = CustomerFactory.create()
+        payment_processor = get_instance('BraintreeTriggered')
+
+        with patch('braintree.client_token_gateway.ClientTokenGateway.generate') as generate_mock, \
+                patch.object(payment_processor, '_acquire_capacity',
+                             side_effect=ThrottledError()):
+            assert payment_processor.client_token(customer) is None
+
+        assert not generate_mock.called
+
+    def test_search_result_pages_are_throttled(self):
+        payment_processor = get_instance('BraintreeTriggered')
+        payment_processor.search_page_size = 2
+
+        result_transactions = [MagicMock(id='train-{}'.format(index)) for index in range(5)]
+
+        with patch_search(return_value=MagicMock(items=result_transactions)) as \
+                (search_mock, fetch_mock), \
+                patch.object(payment_processor, '_acquire_capacity') as acquire_mock:
+            search_result = payment_processor.gateway.transaction.search(
+                braintree.TransactionSearch.amount.is_equal(10)
+            )
+            assert list(payment_processor._iter_search_result(search_result)) == \
+                result_transactions
+
+        # each of the 3 pages is fetched with a single call
+        assert search_mock.call_count == 1
+        assert fetch_mock.call_count == 3
+        assert acquire_mock.call_count == 3
@@ -0,0 +1,111 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import braintree
+from braintree.exceptions.http.timeout_error import ReadTimeoutError
+
+from silver_braintree.transport import HttpTransport
+
+
+CLIENT_TOKEN_RESPONSE = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<client-token><value>stub-token</value></client-token>'
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        time.sleep(self.delay)
+
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(CLIENT_TOKEN_RESPONSE)))
+            self.end_headers()
+            self.wfile.write(CLIENT_TOKEN_RESPONSE)
+        except BrokenPipeError:
+            # the client gave up waiting
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    StubHandler.delay = 0
+
+
+def get_gateway(server, transport, **kwargs):
+    environment = braintree.Environment(
+        'development', '127.0.0.1', str(server.server_address[1]), 'http://127.0.0.1', False,
+        None
+    )
+
+    return braintree.BraintreeGateway(braintree.Configuration(
+        environment, 'merchant-id', 'public-key', 'private-key',
+        http_strategy=transport.http_strategy, **kwargs
+    ))
+
+
+def test_transport_reuses_connections(stub_server):
+    transport = HttpTransport(pool_maxsize=2)
+    gateway = get_gateway(stub_server, transport)
+
+    for _ in range(5):
+        assert gateway.client_token.generate() == 'stub-token'
+
+    assert transport.stats == {
+        'requests': 5,
+        'connections': 1,
+        'reused_connections': 4,
+    }
+
+
+def test_transport_without_keep_alive(stub_server):
+    transport = HttpTransport(keep_alive=False)
+    gateway = get_gateway(stub_server, transport)
+
+    for _ in range(3):
+        assert gateway.client_token.generate() == 'stub-token'
+
+    assert transport.stats['connections'] == 3
+
+
+def test_transport_read_timeout(stub_server):
+    StubHandler.delay = 0.5
+
+    transport = HttpTransport(read_timeout=0.1)
+    gateway = get_gateway(stub_server, transport, wrap_http_exceptions=True)
+
+    with pytest.raises(ReadTimeoutError):
+        gateway.client_token.generate()
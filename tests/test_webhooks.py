@@ -0,0 +1,154 @@
+# Copyright (c) 2017 Presslabs SRL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import braintree
+from braintree import WebhookNotification
+from mock import MagicMock
+
+from rest_framework.test import APIRequestFactory
+
+from silver.models import Transaction
+from silver.payment_processors import get_instance
+from silver_braintree.api.views import webhook
+from tests.factories import BraintreeTransactionFactory, patch_search
+
+
+class TestBraintreeWebhooks:
+    def setup_method(self):
+        # signs the sample notifications with the payment processor's credentials
+        self.webhook_testing = get_instance('BraintreeTriggered').gateway.webhook_testing
+        self.factory = APIRequestFactory()
+
+    def post_notification(self, kind, braintree_id):
+        notification = self.webhook_testing.sample_notification(kind, braintree_id)
+        request = self.factory.post('/', {
+            'bt_signature': notification['bt_signature'],
+            'bt_payload': notification['bt_payload'].decode('ascii')
+        })
+
+        return webhook(request, payment_processor_name='BraintreeTriggered')
+
+    @pytest.mark.django_db
+    def test_settled_notification_settles_transaction(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending,
+            external_reference='beertrain',
+            data={'braintree_id': 'beertrain'}
+        )
+
+        response = self.post_notification(WebhookNotification.Kind.TransactionSettled,
+                                          'beertrain')
+        assert response.status_code == 200
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Settled
+        assert transaction.data['status'] == braintree.Transaction.Status.Settled
+
+    @pytest.mark.django_db
+    def test_settlement_declined_notification_fails_transaction(self):
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending,
+            external_reference='beertrain',
+            data={'braintree_id': 'beertrain'}
+        )
+
+        self.post_notification(WebhookNotification.Kind.TransactionSettlementDeclined,
+                               'beertrain')
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Failed
+
+    @pytest.mark.django_db
+    def test_redelivered_notification_is_handled_once(self, locmem_cache):
+        BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending,
+            external_reference='beertrain',
+            data={'braintree_id': 'beertrain'}
+        )
+        notification = self.webhook_testing.sample_notification(
+            WebhookNotification.Kind.TransactionSettled, 'beertrain'
+        )
+        payment_processor = get_instance('BraintreeTriggered')
+
+        assert payment_processor.process_webhook(notification['bt_signature'],
+                                                 notification['bt_payload'])
+        assert not payment_processor.process_webhook(notification['bt_signature'],
+                                                     notification['bt_payload'])
+
+    @pytest.mark.django_db
+    def test_disbursement_notification_records_and_repolls_transactions(self):
+        # the sample disbursement covers the afv56j and kj8hjk Braintree transactions
+        pending_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Pending,
+            external_reference='afv56j',
+            data={'braintree_id': 'afv56j'}
+        )
+        settled_transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Settled,
+            external_reference='kj8hjk',
+            data={'braintree_id': 'kj8hjk'}
+        )
+
+        result_transaction = MagicMock(id='afv56j',
+                                       status=braintree.Transaction.Status.Settled)
+
+        with patch_search(transactions=[result_transaction]):
+            response = self.post_notification(WebhookNotification.Kind.Disbursement,
+                                              'disbursement-id')
+        assert response.status_code == 200
+
+        pending_transaction.refresh_from_db()
+        assert pending_transaction.state == Transaction.States.Settled
+        assert pending_transaction.data['disbursement_id'] == 'disbursement-id'
+        assert pending_transaction.data['status'] == braintree.Transaction.Status.Settled
+
+        settled_transaction.refresh_from_db()
+        assert settled_transaction.state == Transaction.States.Settled
+        assert settled_transaction.data['disbursement_id'] == 'disbursement-id'
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('kind, status', [
+        (WebhookNotification.Kind.DisputeOpened, braintree.Dispute.Status.Open),
+        (WebhookNotification.Kind.DisputeLost, braintree.Dispute.Status.Lost),
+        (WebhookNotification.Kind.DisputeWon, braintree.Dispute.Status.Won),
+    ])
+    def test_dispute_notification_records_the_dispute(self, kind, status):
+        # the sample disputes reference a Braintree transaction with the dispute's id
+        transaction = BraintreeTransactionFactory.create(
+            state=Transaction.States.Settled,
+            external_reference='beertrain',
+            data={'braintree_id': 'beertrain'}
+        )
+
+        response = self.post_notification(kind, 'beertrain')
+        assert response.status_code == 200
+
+        transaction.refresh_from_db()
+        assert transaction.state == Transaction.States.Settled
+        assert transaction.data['dispute']['id'] == 'beertrain'
+        assert transaction.data['dispute']['status'] == status
+        assert transaction.data['dispute']['reason'] == 'fraud'
+
+    def test_invalid_signature_is_rejected(self):
+        notification = self.webhook_testing.sample_notification(
+            WebhookNotification.Kind.TransactionSettled, 'beertrain'
+        )
+        request = self.factory.post('/', {
+            'bt_signature': notification['bt_signature'],
+            'bt_payload': 'dGFtcGVyZWQ='
+        })
+
+        response = webhook(request, payment_processor_name='BraintreeTriggered')
+        assert response.status_code == 400